@@ -7,55 +7,413 @@ Supports Claude, Qwen, and other AI models for analyzing and fixing test issues.
 
 import json
 import os
+import queue
 import sys
-import subprocess
+import threading
 import time
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from typing import Dict, Iterable, Iterator, List, Optional
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from ai_memory import AIMemory
+from ai_memory import get_memory
+from command_runner import CommandRunner, classify, format_result
+from memory_cache import resolve_ttl
+from ollama_client import CancelToken
+from prompt_builder import format_usage
+from rate_limit import get_limiter
+
+OLLAMA_SETUP_HELP = ("Start Ollama (ollama serve) or install it: "
+                     "curl -fsSL https://ollama.ai/install.sh | sh")
+
+# Fixers backed by a single provider; "race" runs several of them at once
+SINGLE_FIXERS = ["claude", "qwen", "deepseek"]
+
+# Race mode compares the answers that arrive within this many seconds by
+# confidence; after it, the first valid answer wins ($AI_FIX_RACE_DEADLINE,
+# 0 always takes the first)
+RACE_DEADLINE_SECONDS = 20.0
+RACE_DEADLINE_ENV = "AI_FIX_RACE_DEADLINE"
+
+# Longest a race waits for any valid answer
+RACE_TIMEOUT_SECONDS = 600.0
+
+# Comma-separated fixers entering a race (default: every available one)
+RACE_FIXERS_ENV = "AI_FIX_RACE_FIXERS"
+
+# Confidence assumed for answers that do not state one
+DEFAULT_CONFIDENCE = 0.5
+
+# Issues analyzed at once by fix_many / fix-batch ($AI_FIX_BATCH_CONCURRENCY);
+# each provider is further held to its limits in rate_limit.py
+BATCH_CONCURRENCY = 4
+BATCH_CONCURRENCY_ENV = "AI_FIX_BATCH_CONCURRENCY"
+
+# Notes recorded with each attempt, by outcome
+ATTEMPT_NOTES = {
+    "fixed": "Fix applied and verified successfully with {}",
+    "verify_failed": "Fix applied but verification failed with {}",
+    "apply_failed": "Fix application failed with {}",
+    "analysis_failed": "Analysis failed with {}",
+}
+
+
+def _metrics(fixer) -> Dict:
+    """Prompt usage and Claude call metrics of the fixer's latest analysis on this thread."""
+    return {'prompt_usage': getattr(fixer, 'last_prompt_usage', None), 'call': getattr(fixer, 'last_call', None)}
+
+
+def _confidence(fix_data: Dict) -> float:
+    try:
+        return float(fix_data.get('confidence', DEFAULT_CONFIDENCE))
+    except (TypeError, ValueError):
+        return DEFAULT_CONFIDENCE
+
+
+def _restarts_server(fix_data: Dict) -> bool:
+    """Whether a fix has a command with global effects, such as restarting Ollama."""
+    return "error" not in fix_data and any(classify(command)[0] == 'global'
+                                           for command in fix_data.get('fix_commands') or [])
+
+
+def format_race(race: Dict) -> str:
+    """One-line summary of a race: the winner first, then the other entrants."""
+    parts = []
+    for entrant in sorted(race['entrants'], key=lambda entrant: entrant['outcome'] != 'won'):
+        detail = f"{entrant['fixer_type']} {entrant['outcome']} ({entrant['latency_seconds']:.1f}s"
+        if entrant.get('confidence') is not None:
+            detail += f", confidence {entrant['confidence']:.2f}"
+        parts.append(detail + ")")
+    return "Race: " + "; ".join(parts)
 
 class AutoFixManager:
     def __init__(self, fixer_type: str = "deepseek"):
         """Initialize auto-fix manager with specified fixer type."""
         self.fixer_type = fixer_type.lower()
-        self.supported_fixers = ["claude", "qwen", "deepseek"]
+        self.supported_fixers = SINGLE_FIXERS + ["race"]
         
         if self.fixer_type not in self.supported_fixers:
             raise ValueError(f"Unsupported fixer type: {fixer_type}. Supported: {', '.join(self.supported_fixers)}")
         
-        # Initialize the appropriate fixer
-        self.fixer = self._initialize_fixer()
+        # One memory instance for the manager and its fixer; the database is
+        # only opened when a fix is analyzed or recorded
+        self.memory = get_memory()
+        
+        # Initialize the appropriate fixer; race mode initializes every
+        # available one and switches self.fixer to each race's winner
+        self.fixers = {}
+        self.last_race = None
+        self.race_winner = None
+        if self.fixer_type == "race":
+            self.fixers = self._initialize_race_fixers()
+            self.fixer = next(iter(self.fixers.values()))
+            try:
+                self.race_deadline = max(0.0, float(os.environ.get(RACE_DEADLINE_ENV, RACE_DEADLINE_SECONDS)))
+            except ValueError:
+                self.race_deadline = RACE_DEADLINE_SECONDS
+        else:
+            self.fixer = self._initialize_fixer(self.fixer_type)
         
-        # Initialize memory system
-        self.memory = AIMemory()
+        # Analyses are cached in memory for this long ($AI_FIX_CACHE_TTL; 0 disables)
+        self.cache_ttl = resolve_ttl()
+        self.last_cache_hit = False
+        self.last_prompt_usage = None
+        self.last_call = None
 
-    def _initialize_fixer(self):
+    def _initialize_fixer(self, fixer_type: str):
         """Initialize the appropriate fixer based on type."""
-        if self.fixer_type == "claude":
+        if fixer_type == "claude":
             from claude_autofix import ClaudeAutoFixer
-            return ClaudeAutoFixer()
-        elif self.fixer_type == "qwen":
+            return ClaudeAutoFixer(memory=self.memory)
+        elif fixer_type == "qwen":
             from qwen_autofix import QwenAutoFixer
-            return QwenAutoFixer()
-        elif self.fixer_type == "deepseek":
+            return QwenAutoFixer(memory=self.memory)
+        elif fixer_type == "deepseek":
             from deepseek_autofix import DeepSeekAutoFixer
-            return DeepSeekAutoFixer()
+            return DeepSeekAutoFixer(memory=self.memory)
         else:
-            raise ValueError(f"Fixer type '{self.fixer_type}' not implemented")
+            raise ValueError(f"Fixer type '{fixer_type}' not implemented")
+
+    def _initialize_race_fixers(self) -> Dict:
+        """Initialize every fixer that can enter a race, skipping unavailable ones."""
+        requested = os.environ.get(RACE_FIXERS_ENV)
+        candidates = ([name.strip().lower() for name in requested.split(',') if name.strip()]
+                      if requested else SINGLE_FIXERS)
+        fixers = {}
+        skipped = []
+        for fixer_type in candidates:
+            if fixer_type not in SINGLE_FIXERS:
+                raise ValueError(f"Unsupported race fixer: {fixer_type}. Supported: {', '.join(SINGLE_FIXERS)}")
+            try:
+                fixers[fixer_type] = self._initialize_fixer(fixer_type)
+            except ValueError as e:
+                skipped.append(f"{fixer_type}: {e}")
+        if not fixers:
+            raise ValueError(f"No fixer available for race mode ({'; '.join(skipped)})")
+        return fixers
+
+    @property
+    def fixer_model(self) -> str:
+        """Model behind the selected fixer (every entrant's, in race mode)."""
+        if self.fixers:
+            return ",".join(f"{fixer_type}:{fixer.model_name}" for fixer_type, fixer in self.fixers.items())
+        return self.fixer.model_name
+
+    @property
+    def active_fixer_type(self) -> str:
+        """Fixer type to record attempts under: the race winner in race mode."""
+        return self.race_winner or self.fixer_type
+
+    def analyze_issue(self, issue_data: Dict, use_cache: bool = True) -> Dict:
+        """Analyze issue using the selected fixer.
+        
+        An analysis this fixer and model already gave for the same issue is
+        served from the memory cache instead of calling the model again, even
+        though the historical context has grown since; numbers and ids in the
+        captured output don't count as a different issue. Failed analyses are
+        never cached, and a cached fix that fails is dropped.
+        """
+        outcome = self._analysis(issue_data, use_cache)
+        self._select(outcome)
+        return outcome['fix_data']
 
-    def analyze_issue(self, issue_data: Dict) -> Dict:
-        """Analyze issue using the selected fixer."""
-        return self.fixer.analyze_issue(issue_data)
+    def _analysis(self, issue_data: Dict, use_cache: bool = True) -> Dict:
+        """Analyze an issue without touching the manager's per-issue state.
+        
+        Safe to call from several threads at once; returns the fix data with
+        whether it came from the cache, the prompt usage and Claude call
+        metrics of the analysis that produced it and, in race mode, the race.
+        """
+        outcome = {'fix_data': None, 'cache_hit': False, 'race': None, 'prompt_usage': None, 'call': None}
+        use_cache = use_cache and self.cache_ttl > 0
+        if use_cache:
+            cache_key = self.memory.analysis_cache_key(self.fixer_type, self.fixer_model, issue_data)
+            cached = self.memory.get_cached_analysis(cache_key)
+            if cached is not None:
+                outcome.update(fix_data=cached, cache_hit=True)
+                return outcome
+        
+        if self.fixers:
+            fix_data, outcome['race'], metrics = self._race(issue_data)
+            outcome.update(metrics)
+        else:
+            with get_limiter(self.fixer_type).slot():
+                fix_data = self.fixer.analyze_issue(issue_data)
+            # The fixer keeps these per thread, so they belong to this analysis
+            outcome.update(_metrics(self.fixer))
+        if use_cache and "error" not in fix_data:
+            self.memory.cache_analysis(cache_key, self.fixer_type, self.fixer_model, issue_data,
+                                       fix_data, self.cache_ttl)
+        outcome['fix_data'] = fix_data
+        return outcome
 
-    def apply_fix(self, fix_data: Dict) -> bool:
-        """Apply fix using the selected fixer."""
-        return self.fixer.apply_fix(fix_data)
+    def _select(self, outcome: Dict):
+        """Make an analysis current: the fixer that won its race applies and verifies it."""
+        race = outcome['race']
+        self.last_cache_hit = outcome['cache_hit']
+        self.last_prompt_usage = outcome['prompt_usage']
+        self.last_call = outcome['call']
+        self.last_race = race
+        self.race_winner = race['winner'] if race else None
+        if self.race_winner:
+            self.fixer = self.fixers[self.race_winner]
+
+    def _race(self, issue_data: Dict):
+        """Send the issue to every race fixer at once and keep the best valid answer.
+        
+        Valid answers arriving before the deadline compete on confidence
+        (ties go to the faster one); after the deadline the first valid
+        answer wins. The other entrants are then cancelled: local models stop
+        generating, Claude makes no further attempts. Every entrant's outcome
+        and latency is recorded under its fixer type. Returns the winning fix
+        data (or an error), the race, and the winner's prompt usage and call
+        metrics.
+        """
+        cancel = CancelToken()
+        results = queue.Queue()
+        started = time.monotonic()
+        
+        def run(fixer_type, fixer):
+            try:
+                with get_limiter(fixer_type).slot(cancel):
+                    fix_data = fixer.analyze_issue(issue_data, cancel=cancel)
+            except Exception as e:
+                fix_data = {"error": f"{fixer_type} analysis failed: {str(e)}"}
+            results.put((fixer_type, fix_data, time.monotonic() - started, _metrics(fixer)))
+        
+        # Daemon threads: a loser stuck in a request must not keep the process alive
+        for fixer_type, fixer in self.fixers.items():
+            threading.Thread(target=run, args=(fixer_type, fixer), name=f"race-{fixer_type}", daemon=True).start()
+        
+        answers = {}
+        answer_metrics = {}
+        deadline = started + self.race_deadline
+        give_up = started + RACE_TIMEOUT_SECONDS
+        while len(answers) < len(self.fixers):
+            now = time.monotonic()
+            has_valid = any("error" not in fix_data for fix_data, _ in answers.values())
+            if now >= give_up or (has_valid and now >= deadline):
+                break
+            try:
+                fixer_type, fix_data, latency, metrics = results.get(
+                    timeout=(deadline if now < deadline else give_up) - now)
+            except queue.Empty:
+                continue
+            answers[fixer_type] = (fix_data, latency)
+            answer_metrics[fixer_type] = metrics
+        cancel.cancel()
+        ended = time.monotonic() - started
+        
+        valid = [(fixer_type, fix_data, latency) for fixer_type, (fix_data, latency) in answers.items()
+                 if "error" not in fix_data]
+        winner = max(valid, key=lambda answer: (_confidence(answer[1]), -answer[2]))[0] if valid else None
+        
+        entrants = []
+        for fixer_type in self.fixers:
+            if fixer_type not in answers:
+                entrants.append({'fixer_type': fixer_type, 'outcome': 'cancelled', 'latency_seconds': ended})
+                continue
+            fix_data, latency = answers[fixer_type]
+            failed = "error" in fix_data
+            entrants.append({
+                'fixer_type': fixer_type,
+                'outcome': 'won' if fixer_type == winner else 'error' if failed else 'lost',
+                'latency_seconds': latency,
+                'confidence': None if failed else _confidence(fix_data),
+            })
+        race = {'winner': winner, 'entrants': entrants}
+        self.memory.record_race(issue_data, entrants)
+        
+        if winner is None:
+            errors = [f"{fixer_type}: {fix_data['error']}" for fixer_type, (fix_data, _) in answers.items()]
+            return ({"error": f"No fixer returned a valid fix ({'; '.join(errors) or 'timed out'})"}, race,
+                    {'prompt_usage': None, 'call': None})
+        return answers[winner][0], race, answer_metrics[winner]
+
+    def apply_fix(self, fix_data: Dict, issue_data: Optional[Dict] = None) -> bool:
+        """Apply fix using the selected fixer.
+        
+        With the issue given, a fix that fails to apply is dropped from the
+        analysis cache.
+        """
+        success = self.fixer.apply_fix(fix_data)
+        if not success and issue_data is not None:
+            self.memory.invalidate_cached_analysis(self.fixer_type, self.fixer_model, issue_data, fix_data)
+        return success
 
     def verify_fix(self, issue_data: Dict, fix_data: Dict) -> bool:
-        """Verify fix using the selected fixer."""
-        return self.fixer.verify_fix(issue_data, fix_data)
+        """Verify fix using the selected fixer; a fix that fails is dropped from the analysis cache."""
+        success = self.fixer.verify_fix(issue_data, fix_data)
+        if not success:
+            self.memory.invalidate_cached_analysis(self.fixer_type, self.fixer_model, issue_data, fix_data)
+        return success
+
+    def fix_many(self, issues: Iterable[Dict], concurrency: Optional[int] = None,
+                 use_cache: bool = True) -> Iterator[Dict]:
+        """Fix a batch of issues, yielding one result per issue as soon as it is done.
+        
+        Issues are analyzed on up to `concurrency` worker threads (default
+        $AI_FIX_BATCH_CONCURRENCY), each provider held to its rate limits.
+        Each fix is applied and verified as soon as its analysis is in, so
+        results come in completion order; their 'index' is the issue's
+        position in the input. A fix with a global command (restarting
+        Ollama, say) waits until the analyses still running are in, since it
+        would pull the server out from under them. Fixes go through one
+        CommandRunner, so a command an earlier fix in the batch already ran
+        is not run again. The attempts are recorded in one transaction when
+        the batch ends, also when the caller stops early.
+        """
+        if concurrency is None:
+            try:
+                concurrency = int(os.environ.get(BATCH_CONCURRENCY_ENV, BATCH_CONCURRENCY))
+            except ValueError:
+                concurrency = BATCH_CONCURRENCY
+        issues = list(issues)
+        runner = CommandRunner(self.memory)
+        printed = set()
+        
+        def analyze(issue_data):
+            started = time.monotonic()
+            try:
+                outcome = self._analysis(issue_data, use_cache)
+            except Exception as e:
+                outcome = {'fix_data': {"error": f"Analysis failed: {str(e)}"}, 'cache_hit': False, 'race': None,
+                           'prompt_usage': None, 'call': None}
+            outcome['seconds'] = time.monotonic() - started
+            return outcome
+        
+        def finish(index, outcome):
+            issue_data = issues[index]
+            self._select(outcome)
+            fix_data = outcome['fix_data']
+            fix_success = verification_success = False
+            fix_seconds = 0.0
+            if "error" in fix_data:
+                status = "analysis_failed"
+            else:
+                if "fix_commands" in fix_data:
+                    applied = runner.run([fix_data['fix_commands']])[0]
+                    # A shared command's result is the same object in every fix that ran it
+                    for result in applied['results']:
+                        if id(result) not in printed:
+                            printed.add(id(result))
+                            print(f"🔨 {format_result(result)}")
+                    fix_seconds = sum(result['duration_seconds'] for result in applied['results'])
+                    fix_success = applied['success']
+                if not fix_success:
+                    self.memory.invalidate_cached_analysis(self.fixer_type, self.fixer_model,
+                                                           issue_data, fix_data)
+                started = time.monotonic()
+                verification_success = fix_success and self.verify_fix(issue_data, fix_data)
+                fix_seconds += time.monotonic() - started
+                status = ("fixed" if verification_success else
+                          "verify_failed" if fix_success else "apply_failed")
+            attempts.append({
+                'issue_data': issue_data,
+                'ai_response': fix_data,
+                'fix_success': fix_success,
+                'verification_success': verification_success,
+                'execution_time': outcome['seconds'] + fix_seconds,
+                'notes': ATTEMPT_NOTES[status].format(self.active_fixer_type),
+                'fixer_type': self.active_fixer_type,
+            })
+            return {
+                'index': index,
+                'status': status,
+                'model': issue_data.get('model', ''),
+                'issue_type': issue_data.get('issue_type', ''),
+                'fixer_type': self.active_fixer_type,
+                'cache_hit': outcome['cache_hit'],
+                'race': outcome['race'],
+                'prompt_usage': outcome['prompt_usage'],
+                'confidence': fix_data.get('confidence'),
+                'analysis': fix_data.get('analysis'),
+                'error': fix_data.get('error'),
+                'analysis_seconds': round(outcome['seconds'], 3),
+                'fix_seconds': round(fix_seconds, 3),
+            }
+        
+        attempts = []
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="fix-batch")
+        futures = {pool.submit(analyze, issue_data): index for index, issue_data in enumerate(issues)}
+        try:
+            held = []
+            for done, future in enumerate(as_completed(futures), 1):
+                index, outcome = futures[future], future.result()
+                if done < len(futures) and _restarts_server(outcome['fix_data']):
+                    held.append((index, outcome))
+                    continue
+                yield finish(index, outcome)
+            for index, outcome in held:
+                yield finish(index, outcome)
+        finally:
+            # Stopping early drops the analyses that have not started
+            for future in futures:
+                future.cancel()
+            pool.shutdown()
+            if attempts:
+                self.memory.record_fix_attempts_bulk(attempts)
 
     def get_fixer_info(self) -> Dict:
         """Get information about the current fixer."""
@@ -80,6 +438,13 @@ class AutoFixManager:
                 "provider": "DeepSeek",
                 "description": "Local code-specialized model with strong debugging capabilities"
             }
+        elif self.fixer_type == "race":
+            return {
+                "name": f"Race of {', '.join(self.fixers)}",
+                "type": "hedged",
+                "provider": "Multiple",
+                "description": "Sends each issue to every available fixer and keeps the best valid answer"
+            }
         else:
             return {"name": "Unknown", "type": "unknown", "provider": "Unknown", "description": "Unknown fixer"}
 
@@ -108,16 +473,20 @@ class AutoFixManager:
             "setup_help": claude_setup_help
         })
         
+        # Local models all come from one cached /api/tags inventory
+        from model_inventory import get_inventory
+        inventory = get_inventory()
+        has_ollama = inventory.server_available()
+        
         # Check DeepSeek availability
-        has_deepseek_33b = cls._check_ollama_model("deepseek-coder:33b")
-        has_deepseek_6b = cls._check_ollama_model("deepseek-coder:6.7b")
-        has_deepseek_1b = cls._check_ollama_model("deepseek-coder:1.3b")
-        has_ollama = cls._check_ollama_available()
+        has_deepseek_33b = inventory.has("deepseek-coder:33b")
+        has_deepseek_6b = inventory.has("deepseek-coder:6.7b")
+        has_deepseek_1b = inventory.has("deepseek-coder:1.3b")
         deepseek_available = has_deepseek_33b or has_deepseek_6b or has_deepseek_1b
         
         deepseek_setup_help = []
         if not has_ollama:
-            deepseek_setup_help.append("Install Ollama: curl -fsSL https://ollama.ai/install.sh | sh")
+            deepseek_setup_help.append(OLLAMA_SETUP_HELP)
         elif not deepseek_available:
             deepseek_setup_help.append("Install model: ollama pull deepseek-coder:6.7b")
         
@@ -131,13 +500,13 @@ class AutoFixManager:
         })
         
         # Check Qwen availability
-        has_qwen_32b = cls._check_ollama_model("qwen2.5-coder:32b")
-        has_qwen_7b = cls._check_ollama_model("qwen2.5-coder:7b")
+        has_qwen_32b = inventory.has("qwen2.5-coder:32b")
+        has_qwen_7b = inventory.has("qwen2.5-coder:7b")
         qwen_available = has_qwen_32b or has_qwen_7b
         
         qwen_setup_help = []
         if not has_ollama:
-            qwen_setup_help.append("Install Ollama: curl -fsSL https://ollama.ai/install.sh | sh")
+            qwen_setup_help.append(OLLAMA_SETUP_HELP)
         elif not qwen_available:
             qwen_setup_help.append("Install model: ollama pull qwen2.5-coder:7b")
         
@@ -161,23 +530,29 @@ class AutoFixManager:
         except ImportError:
             return False
 
-    @staticmethod
-    def _check_ollama_available() -> bool:
-        """Check if Ollama is installed and available."""
-        try:
-            result = subprocess.run(['ollama', '--version'], capture_output=True, text=True)
-            return result.returncode == 0
-        except Exception:
-            return False
 
-    @staticmethod
-    def _check_ollama_model(model_name: str) -> bool:
-        """Check if an Ollama model is available."""
-        try:
-            result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-            return model_name in result.stdout
-        except Exception:
-            return False
+def load_issues(paths: Iterable[str]) -> List:
+    """Read (id, issue) pairs from issue JSON files, directories of them and JSONL files.
+    
+    A file's id is its path; a JSONL line's id is its "id" field, or the
+    file path and line number.
+    """
+    issues = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.json'):
+                    issues.extend(load_issues([os.path.join(path, name)]))
+        elif path.endswith('.jsonl'):
+            with open(path) as f:
+                for number, line in enumerate(f, 1):
+                    if line.strip():
+                        issue_data = json.loads(line)
+                        issues.append((issue_data.pop('id', f"{path}:{number}"), issue_data))
+        else:
+            with open(path) as f:
+                issues.append((path, json.load(f)))
+    return issues
 
 
 def main():
@@ -187,10 +562,11 @@ def main():
         print()
         print("Commands:")
         print("  fix <issue_json_file> [fixer_type] - Fix an issue using specified fixer")
+        print("  fix-batch <dir|jsonl|json>... [--fixer TYPE] [--concurrency N] - Fix many issues, one JSON result line each")
         print("  list - List available fixers and their status")
         print("  info <fixer_type> - Get information about a specific fixer")
         print()
-        print("Available fixer types: claude, qwen (default: qwen)")
+        print("Available fixer types: claude, qwen, deepseek, race (default: qwen)")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -266,12 +642,22 @@ def main():
         # Analyze issue
         print(f"🔍 Analyzing issue with {fixer_info['name']}...")
         fix_data = manager.analyze_issue(issue_data)
+        if manager.last_cache_hit:
+            cache_stats = manager.memory.get_analysis_cache_stats()
+            print(f"♻️ Reusing cached analysis ({cache_stats['hits']} hits, {cache_stats['misses']} misses so far)")
+        elif manager.last_prompt_usage:
+            print(f"🧮 {format_usage(manager.last_prompt_usage)}")
+        if manager.last_race:
+            print(f"🏁 {format_race(manager.last_race)}")
+        if manager.last_call:
+            from claude_client import format_call
+            print(f"📈 {format_call(manager.last_call)}")
         
         if "error" in fix_data:
             print(f"❌ Analysis failed: {fix_data['error']}")
             manager.memory.record_fix_attempt(
                 issue_data, fix_data, False, False, 
-                time.time() - start_time, f"Analysis failed with {fixer_type}", fixer_type
+                time.time() - start_time, f"Analysis failed with {manager.active_fixer_type}", manager.active_fixer_type
             )
             sys.exit(1)
         
@@ -279,7 +665,7 @@ def main():
         print(f"🎯 Confidence: {fix_data.get('confidence', 'Unknown')}")
         
         # Apply the fix
-        fix_success = manager.apply_fix(fix_data)
+        fix_success = manager.apply_fix(fix_data, issue_data)
         
         if fix_success:
             print("✅ Fix applied successfully")
@@ -292,7 +678,7 @@ def main():
                 # Record successful fix
                 fix_id = manager.memory.record_fix_attempt(
                     issue_data, fix_data, True, True,
-                    time.time() - start_time, f"Fix applied and verified successfully with {fixer_type}", fixer_type
+                    time.time() - start_time, f"Fix applied and verified successfully with {manager.active_fixer_type}", manager.active_fixer_type
                 )
                 print(f"💾 Success recorded in memory (ID: {fix_id})")
                 sys.exit(0)
@@ -300,17 +686,61 @@ def main():
                 print("❌ Fix verification failed")
                 manager.memory.record_fix_attempt(
                     issue_data, fix_data, True, False,
-                    time.time() - start_time, f"Fix applied but verification failed with {fixer_type}", fixer_type
+                    time.time() - start_time, f"Fix applied but verification failed with {manager.active_fixer_type}", manager.active_fixer_type
                 )
                 sys.exit(1)
         else:
             print("❌ Fix application failed")
             manager.memory.record_fix_attempt(
                 issue_data, fix_data, False, False,
-                time.time() - start_time, f"Fix application failed with {fixer_type}", fixer_type
+                time.time() - start_time, f"Fix application failed with {manager.active_fixer_type}", manager.active_fixer_type
             )
             sys.exit(1)
     
+    elif command == "fix-batch":
+        args = sys.argv[2:]
+        options = {"--fixer": "qwen", "--concurrency": None}
+        paths = []
+        missing_value = False
+        while args:
+            arg = args.pop(0)
+            if arg in options:
+                if not args or args[0] in options:
+                    missing_value = True
+                    break
+                options[arg] = args.pop(0)
+            else:
+                paths.append(arg)
+        if missing_value or not paths:
+            print("Usage: autofix_manager.py fix-batch <dir|jsonl|json>... [--fixer TYPE] [--concurrency N]")
+            sys.exit(1)
+        
+        try:
+            issues = load_issues(paths)
+            concurrency = int(options["--concurrency"]) if options["--concurrency"] else None
+        except (OSError, ValueError) as e:
+            print(f"❌ Error reading issues: {e}", file=sys.stderr)
+            sys.exit(1)
+        
+        try:
+            manager = AutoFixManager(options["--fixer"])
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+        
+        # Result lines own stdout; progress and the fixers' output go to stderr
+        results = sys.stdout
+        fixed = 0
+        with redirect_stdout(sys.stderr):
+            print(f"🤖 Fixing {len(issues)} issues with {manager.get_fixer_info()['name']}")
+            for result in manager.fix_many([issue_data for _, issue_data in issues], concurrency):
+                result = dict(id=issues[result['index']][0], **result)
+                results.write(json.dumps(result, ensure_ascii=False) + "\n")
+                results.flush()
+                fixed += result['status'] == "fixed"
+            print(f"🏁 Fixed {fixed} of {len(issues)} issues")
+        sys.exit(0 if fixed == len(issues) else 1)
+    
     else:
         print(f"Unknown command: {command}")
         sys.exit(1)
@@ -7,165 +7,97 @@ Integrates with Claude API to intelligently analyze and fix test issues.
 import json
 import os
 import sys
-import subprocess
-import requests
+import threading
 import time
 from typing import Dict, List, Optional
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from ai_memory import AIMemory
+from ai_memory import AIMemory, get_memory
+from claude_client import ClaudeClient, format_call
+from command_runner import apply_fix_commands
+from fix_response import FixResponseError, parse_fix_response
+from fix_verifier import verify_issue
+from prompt_builder import PromptBuilder
+
+# Fixer-specific part of the analysis prompt; see prompt_builder for the rest
+ANALYSIS_INSTRUCTIONS = """Based on the historical context and current issue, please analyze and provide:
+1. Root cause analysis
+2. Specific fix recommendations
+3. Bash commands to implement the fix (if applicable)
+4. How to verify the fix worked
+
+Respond in JSON format:
+{
+    "analysis": "detailed analysis of the root cause",
+    "fix_type": "model_config|prompt_adjustment|system_fix|model_reinstall|other",
+    "fix_commands": ["array", "of", "bash", "commands"],
+    "verification_steps": ["array", "of", "verification", "steps"],
+    "confidence": 0.95,
+    "expected_outcome": "what should happen after applying the fix"
+}"""
+
 
 class ClaudeAutoFixer:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, memory: Optional[AIMemory] = None,
+                 prompt_tokens: Optional[int] = None, client: Optional[ClaudeClient] = None):
         """Initialize Claude auto-fixer with API key and memory system."""
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable required")
         
-        self.api_url = "https://api.anthropic.com/v1/messages"
-        self.headers = {
-            "Content-Type": "application/json",
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01"
-        }
+        # Pooled, retrying API client ($ANTHROPIC_BASE_URL overrides the endpoint)
+        self.client = client or ClaudeClient(self.api_key)
+        self.model_name = self.client.model
         
-        # Initialize memory system
-        self.memory = AIMemory()
+        # Shared memory system, opened on first use
+        self.memory = memory or get_memory()
+
+        # Prompt assembly under the token budget ($AI_FIX_PROMPT_TOKENS by default)
+        self.prompt_builder = PromptBuilder(prompt_tokens)
+        # Per-thread results of the latest analysis, as batches analyze concurrently
+        self._local = threading.local()
+
+    @property
+    def last_prompt_usage(self) -> Optional[Dict]:
+        """Token usage of the prompt behind this thread's latest analysis."""
+        return getattr(self._local, 'prompt_usage', None)
+
+    @property
+    def last_call(self) -> Optional[Dict]:
+        """Metrics of this thread's latest Claude call."""
+        return getattr(self._local, 'call', None)
 
-    def analyze_issue(self, issue_data: Dict) -> Dict:
+    def analyze_issue(self, issue_data: Dict, cancel=None) -> Dict:
         """Send issue to Claude for analysis and fix recommendation with historical context."""
         
         # Get historical context from memory
         historical_context = self.memory.build_context_for_ai(issue_data)
         
-        prompt = f"""
-You are an AI model testing expert with access to comprehensive historical data about previous fixes.
-
-{historical_context}
-
-Current Issue Details:
-- Model: {issue_data['model']}
-- Issue Type: {issue_data['issue_type']}
-- Description: {issue_data['description']}
-- Error Output: {issue_data.get('error_output', 'N/A')}
-- Test Prompt: {issue_data.get('test_prompt', 'N/A')}
-- Expected Pattern: {issue_data.get('expected_pattern', 'N/A')}
-- Actual Response: {issue_data.get('actual_response', 'N/A')}
-
-Context:
-- This is part of an automated testing framework for AI models
-- Models are run via Ollama
-- Tests check if models respond correctly to prompts
-- You have access to historical data about similar issues and their solutions
-- Learn from past successes and failures shown in the historical context above
-
-Based on the historical context and current issue, please analyze and provide:
-1. Root cause analysis
-2. Specific fix recommendations
-3. Bash commands to implement the fix (if applicable)
-4. How to verify the fix worked
-
-Respond in JSON format:
-{{
-    "analysis": "detailed analysis of the root cause",
-    "fix_type": "model_config|prompt_adjustment|system_fix|model_reinstall|other",
-    "fix_commands": ["array", "of", "bash", "commands"],
-    "verification_steps": ["array", "of", "verification", "steps"],
-    "confidence": 0.95,
-    "expected_outcome": "what should happen after applying the fix"
-}}
-"""
-
-        payload = {
-            "model": "claude-3-5-sonnet-20241022",
-            "max_tokens": 2000,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        }
+        parts, self._local.prompt_usage = self.prompt_builder.build_parts(
+            issue_data, historical_context, ANALYSIS_INSTRUCTIONS)
 
         try:
-            response = requests.post(self.api_url, headers=self.headers, json=payload)
-            response.raise_for_status()
+            # Static instructions and history are sent as cacheable prefix blocks
+            content = self.client.analyze(parts['static'], parts['history'], parts['issue'], cancel=cancel)
             
-            result = response.json()
-            content = result['content'][0]['text']
-            
-            # Extract JSON from Claude's response
-            import re
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return {"error": "Could not parse Claude's response", "raw_response": content}
+            # Extract and validate the fix JSON from Claude's response
+            return parse_fix_response(content)
                 
+        except FixResponseError as e:
+            return {"error": f"Could not parse Claude's response: {str(e)}", "raw_response": e.raw_response}
         except Exception as e:
             return {"error": f"API call failed: {str(e)}"}
+        finally:
+            self._local.call = self.client.last_call
 
     def apply_fix(self, fix_data: Dict) -> bool:
         """Apply the fix recommended by Claude."""
-        if "fix_commands" not in fix_data:
-            print("❌ No fix commands provided")
-            return False
-
-        print(f"🔧 Applying fix: {fix_data.get('analysis', 'Unknown fix')}")
-        
-        for command in fix_data["fix_commands"]:
-            print(f"🔨 Executing: {command}")
-            try:
-                result = subprocess.run(['bash', '-c', command], capture_output=True, text=True)
-                if result.returncode != 0:
-                    print(f"❌ Command failed: {result.stderr}")
-                    return False
-                else:
-                    print(f"✅ Command succeeded: {result.stdout}")
-            except Exception as e:
-                print(f"❌ Error executing command: {e}")
-                return False
-        
-        return True
+        return apply_fix_commands(fix_data, self.memory)
 
     def verify_fix(self, issue_data: Dict, fix_data: Dict) -> bool:
         """Verify that the fix actually resolved the issue."""
-        print("🔍 Verifying fix...")
-        
-        # Re-run the specific test that failed
-        model_name = issue_data['model']
-        test_prompt = issue_data.get('test_prompt', 'What is 2+2? Answer briefly.')
-        expected_pattern = issue_data.get('expected_pattern', '.*4.*')
-        
-        try:
-            # Test the model with the same prompt
-            test_cmd = f'echo "{test_prompt}" | ollama run {model_name}'
-            result = subprocess.run(['bash', '-c', test_cmd], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode != 0:
-                print(f"❌ Model test failed: {result.stderr}")
-                return False
-            
-            response = result.stdout.strip()
-            
-            # Check if response matches expected pattern
-            import re
-            if re.search(expected_pattern, response):
-                print(f"✅ Fix verified: Model responded correctly")
-                print(f"📝 Response: {response[:100]}...")
-                return True
-            else:
-                print(f"❌ Fix verification failed: Response doesn't match pattern")
-                print(f"📝 Response: {response[:100]}...")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            print("❌ Fix verification timed out")
-            return False
-        except Exception as e:
-            print(f"❌ Error during verification: {e}")
-            return False
+        return verify_issue(issue_data, self.memory)
 
 
 def main():
@@ -210,6 +142,8 @@ def main():
         )
         sys.exit(1)
     
+    if fixer.last_call:
+        print(f"📈 {format_call(fixer.last_call)}")
     print(f"📋 Claude's analysis: {fix_data['analysis']}")
     print(f"🎯 Confidence: {fix_data.get('confidence', 'Unknown')}")
     
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Claude API Client
+Pooled client for the Anthropic Messages API used by the Claude fixer.
+Connections are reused through one requests.Session, every call has connect
+and read timeouts, overloads and rate limits are retried with jittered
+backoff that honors retry-after, and the cacheable prompt prefix carries a
+prompt caching marker. Latency and token usage are recorded per call.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from prompt_builder import estimate_tokens
+
+DEFAULT_BASE_URL = "https://api.anthropic.com"
+BASE_URL_ENV = "ANTHROPIC_BASE_URL"
+API_VERSION = "2023-06-01"
+DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
+DEFAULT_MAX_TOKENS = 2000
+
+# (connect, read) seconds; a hung socket fails the call instead of the test loop
+TIMEOUT_SECONDS = (5.0, 120.0)
+
+# Retries after the first attempt, and the backoff between them
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+# Longest server-requested wait honored before giving up on retry-after
+RETRY_AFTER_MAX_SECONDS = 60.0
+
+# Responses worth retrying: timeout, conflict, rate limit, server errors, overloaded
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+POOL_SIZE = 4
+
+# Per-call metrics kept in memory
+CALL_HISTORY = 256
+
+# Shortest prefix the API caches; a breakpoint on a shorter one is ignored
+CACHE_MIN_TOKENS = 1024
+
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+
+
+class ClaudeAPIError(Exception):
+    """The API call failed after all retries, or with an error not worth retrying."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get('retry-after')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        return response.json()['error']['message']
+    except (ValueError, KeyError, TypeError):
+        return response.text[:200]
+
+
+class ClaudeClient:
+    """Thread-safe Messages API client with retries and per-call metrics."""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, model: str = DEFAULT_MODEL,
+                 timeout=TIMEOUT_SECONDS, max_retries: int = MAX_RETRIES):
+        self.base_url = (base_url or os.environ.get(BASE_URL_ENV) or DEFAULT_BASE_URL).rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "x-api-key": api_key,
+            "anthropic-version": API_VERSION,
+        })
+        self.calls = deque(maxlen=CALL_HISTORY)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def close(self):
+        self.session.close()
+
+    def create_message(self, payload: Dict, cancel=None) -> Dict:
+        """POST /v1/messages, retrying transient failures; returns the response body.
+
+        A cancel token (ollama_client.CancelToken) stops further attempts and
+        cuts backoff short; a request already in flight runs to completion.
+        """
+        self._local.last_call = None
+        url = f"{self.base_url}/v1/messages"
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            if cancel is not None and cancel.cancelled:
+                self._record(payload, started, attempt, None, error="cancelled")
+                raise ClaudeAPIError("Claude request cancelled")
+            attempt += 1
+            delay = None
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt > self.max_retries:
+                    self._record(payload, started, attempt, None, error=str(e))
+                    raise ClaudeAPIError(f"Claude API unreachable after {attempt} attempts: {e}") from e
+            else:
+                if response.status_code == 200:
+                    body = response.json()
+                    self._record(payload, started, attempt, 200, body.get('usage') or {})
+                    return body
+                if response.status_code not in RETRY_STATUSES or attempt > self.max_retries:
+                    message = _error_message(response)
+                    self._record(payload, started, attempt, response.status_code, error=message)
+                    raise ClaudeAPIError(f"Claude API returned HTTP {response.status_code}: {message}",
+                                         response.status_code)
+                delay = _retry_after(response)
+            if delay is None:
+                # Full jitter keeps parallel fixers from retrying in lockstep
+                delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+            else:
+                delay = min(delay, RETRY_AFTER_MAX_SECONDS) + random.uniform(0, BACKOFF_BASE_SECONDS / 4)
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def analyze(self, static: str, history: str, issue: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                cancel=None) -> str:
+        """Send a prompt split into its cacheable parts and return the reply text.
+
+        The static instructions go in the system prompt and the history
+        opens the user turn. One cache breakpoint closes the history, so
+        repeated analyses only pay full price for the issue details; without
+        history the instructions alone are marked only when they are long
+        enough for the API to cache them.
+        """
+        system = {"type": "text", "text": static}
+        content = []
+        if history:
+            content.append({"type": "text", "text": history, "cache_control": {"type": "ephemeral"}})
+        elif estimate_tokens(static) >= CACHE_MIN_TOKENS:
+            system["cache_control"] = {"type": "ephemeral"}
+        content.append({"type": "text", "text": issue})
+        body = self.create_message({
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "system": [system],
+            "messages": [{"role": "user", "content": content}],
+        }, cancel)
+        return ''.join(block.get('text', '') for block in body.get('content', []) if block.get('type') == 'text')
+
+    def _record(self, payload: Dict, started: float, attempts: int, status: Optional[int],
+                usage: Optional[Dict] = None, error: Optional[str] = None):
+        call = {
+            'model': payload.get('model'),
+            'status': status,
+            'attempts': attempts,
+            'latency_seconds': time.monotonic() - started,
+            'error': error,
+        }
+        call.update({field: (usage or {}).get(field) or 0 for field in USAGE_FIELDS})
+        with self._lock:
+            self.calls.append(call)
+        self._local.last_call = call
+
+    @property
+    def last_call(self) -> Optional[Dict]:
+        """The latest call made from this thread; other threads' calls don't replace it."""
+        return getattr(self._local, 'last_call', None)
+
+    def stats(self) -> Dict:
+        """Totals over the recorded calls."""
+        with self._lock:
+            calls = list(self.calls)
+        totals = {field: sum(call[field] for call in calls) for field in USAGE_FIELDS}
+        prompt_tokens = (totals['input_tokens'] + totals['cache_creation_input_tokens']
+                         + totals['cache_read_input_tokens'])
+        return dict(totals, **{
+            'calls': len(calls),
+            'errors': sum(1 for call in calls if call['error']),
+            'retries': sum(call['attempts'] - 1 for call in calls),
+            'latency_seconds': sum(call['latency_seconds'] for call in calls),
+            'cache_hit_rate': totals['cache_read_input_tokens'] / prompt_tokens if prompt_tokens else 0.0,
+        })
+
+
+def format_call(call: Dict) -> str:
+    """One-line summary of a recorded call."""
+    retries = f", {call['attempts'] - 1} retries" if call['attempts'] > 1 else ''
+    return (f"Claude call {call['latency_seconds']:.1f}s{retries}: {call['input_tokens']} in "
+            f"(+{call['cache_read_input_tokens']} cached, +{call['cache_creation_input_tokens']} written), "
+            f"{call['output_tokens']} out")
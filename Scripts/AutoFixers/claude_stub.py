@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Claude API Stub Server
+Local stand-in for the Anthropic Messages API, for exercising ClaudeClient and
+the Claude fixer without network access or API costs. It answers
+POST /v1/messages with a canned reply, can fail the next requests with
+scripted statuses and retry-after headers, and reports usage the way prompt
+caching would: prefixes ending at a cache_control breakpoint are written on
+first sight and read afterwards, unless they are too short to cache.
+
+    python3 claude_stub.py --port 8099
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8099 ANTHROPIC_API_KEY=test python3 claude_autofix.py issue.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from claude_client import CACHE_MIN_TOKENS
+from ollama_stub import DEFAULT_REPLY
+
+
+def _tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out and went away while the stub was delaying
+            self.close_connection = True
+
+    def _error(self, status: int, kind: str, message: str, headers: Optional[Dict] = None):
+        self._send(status, {'type': 'error', 'error': {'type': kind, 'message': message}}, headers)
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        with stub.lock:
+            stub.requests.append({'path': self.path, 'headers': dict(self.headers), 'body': raw})
+            failure = stub.failures.pop(0) if stub.failures else None
+        if self.path != '/v1/messages':
+            self._error(404, 'not_found_error', 'Not found')
+            return
+        if not self.headers.get('x-api-key') or not self.headers.get('anthropic-version'):
+            self._error(401, 'authentication_error', 'x-api-key and anthropic-version are required')
+            return
+        if failure is not None:
+            status, retry_after = failure
+            headers = {'retry-after': str(retry_after)} if retry_after is not None else None
+            kind = 'overloaded_error' if status == 529 else 'rate_limit_error' if status == 429 else 'api_error'
+            self._error(status, kind, f"Scripted failure {status}", headers)
+            return
+        try:
+            body = json.loads(raw)
+        except json.JSONDecodeError:
+            self._error(400, 'invalid_request_error', 'Body is not JSON')
+            return
+
+        if stub.delay:
+            time.sleep(stub.delay)
+        usage = stub.usage(body)
+        self._send(200, {
+            'id': f"msg_stub_{len(stub.requests)}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model'),
+            'content': [{'type': 'text', 'text': stub.reply}],
+            'stop_reason': 'end_turn',
+            'usage': usage,
+        })
+
+
+class ClaudeStub:
+    """In-process Messages API stand-in; start() serves it from a background thread."""
+
+    def __init__(self, reply: str = DEFAULT_REPLY, delay: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.reply = reply
+        self.delay = delay
+        self.failures: List[Tuple[int, Optional[float]]] = []
+        self.lock = threading.Lock()
+        self.requests = []
+        self._cached = set()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail_next(self, status: int, count: int = 1, retry_after: Optional[float] = None):
+        """Answer the next count requests with status (and a retry-after header)."""
+        with self.lock:
+            self.failures.extend([(status, retry_after)] * count)
+
+    def usage(self, body: Dict) -> Dict:
+        """Token usage, splitting the prompt at cache_control breakpoints."""
+        blocks = []
+        system = body.get('system') or []
+        if isinstance(system, str):
+            system = [{'type': 'text', 'text': system}]
+        blocks.extend(system)
+        for message in body.get('messages', []):
+            content = message.get('content')
+            blocks.extend([{'type': 'text', 'text': content}] if isinstance(content, str) else content)
+
+        digest = hashlib.sha256()
+        cached_upto = written_upto = 0
+        position = 0
+        for block in blocks:
+            text = block.get('text', '')
+            digest.update(text.encode('utf-8') + b'\0')
+            position += _tokens(text)
+            if block.get('cache_control') and position >= CACHE_MIN_TOKENS:
+                key = digest.hexdigest()
+                with self.lock:
+                    if key in self._cached:
+                        cached_upto = position
+                    else:
+                        self._cached.add(key)
+                        written_upto = position
+        total = position
+        written = max(0, written_upto - cached_upto)
+        return {
+            'input_tokens': total - max(cached_upto, written_upto),
+            'cache_creation_input_tokens': written,
+            'cache_read_input_tokens': cached_upto,
+            'output_tokens': _tokens(self.reply),
+        }
+
+    def start(self) -> 'ClaudeStub':
+        threading.Thread(target=self._server.serve_forever, name='claude-stub', daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claude Messages API stub server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--reply', default=DEFAULT_REPLY, help="Text every request is answered with")
+    parser.add_argument('--reply-file', help="Read the reply from a file instead")
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds before each answer")
+    parser.add_argument('--fail', type=int, default=0, help="Answer the first N requests with --fail-status")
+    parser.add_argument('--fail-status', type=int, default=529)
+    parser.add_argument('--retry-after', type=float, help="retry-after header sent with scripted failures")
+    args = parser.parse_args()
+
+    reply = args.reply
+    if args.reply_file:
+        with open(args.reply_file) as f:
+            reply = f.read()
+    stub = ClaudeStub(reply, args.delay, args.host, args.port)
+    if args.fail:
+        stub.fail_next(args.fail_status, args.fail, args.retry_after)
+    print(f"🧪 Claude API stub listening on {stub.url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
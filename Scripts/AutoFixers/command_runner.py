@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Fix Command Runner
+Executes the fix_commands of one or many fixes. Commands repeated across
+fixes run once when every state-changing step before them is the same, every command has a timeout that kills its whole process
+group, each fix's commands run in order while separate fixes run in
+parallel, anything with global side effects (restarting Ollama, installing
+packages, editing files) runs alone, and every run is recorded in
+ai_memory.db with its duration and exit status.
+
+    python3 command_runner.py "ollama pull llama3" "systemctl restart ollama"
+"""
+
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+from model_inventory import normalize_name
+
+# Seconds a command may run ($AI_FIX_COMMAND_TIMEOUT); pulls download
+# gigabytes and get longer
+DEFAULT_TIMEOUT_SECONDS = 300.0
+TIMEOUT_ENV = "AI_FIX_COMMAND_TIMEOUT"
+PULL_TIMEOUT_SECONDS = 3600.0
+
+# Grace period between SIGTERM and SIGKILL for a timed-out command
+KILL_GRACE_SECONDS = 5.0
+
+# Fixes whose commands run at once
+MAX_PARALLEL = 4
+
+# Output kept per command
+OUTPUT_TAIL_CHARS = 2000
+
+# Anything beyond a single simple command may have arbitrary effects
+_SHELL_SYNTAX = re.compile(r'[|&;<>()$`\n]')
+
+READ_ONLY_PROGRAMS = {'echo', 'true', 'cat', 'ls', 'df', 'free', 'ps', 'uptime', 'nvidia-smi', 'which'}
+OLLAMA_READ_ONLY = {'list', 'ls', 'ps', '--version', '-v', 'show'}
+OLLAMA_MODEL_COMMANDS = {'pull', 'rm', 'create', 'cp', 'run', 'stop', 'push'}
+
+
+def classify(command: str) -> Tuple[str, Optional[str]]:
+    """Scope of a command and the resource it touches.
+
+    read_only commands run alongside anything, model commands only
+    alongside commands on other models, and global ones alone.
+    """
+    if _SHELL_SYNTAX.search(command):
+        return 'global', None
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return 'global', None
+    if words and words[0] == 'sudo':
+        words = words[1:]
+    if not words:
+        return 'read_only', None
+    if words[0] in READ_ONLY_PROGRAMS:
+        return 'read_only', None
+    if words[0] == 'ollama' and len(words) > 1:
+        if words[1] in OLLAMA_READ_ONLY:
+            return 'read_only', None
+        if words[1] in OLLAMA_MODEL_COMMANDS and len(words) > 2:
+            return 'model', normalize_name(words[2])
+    return 'global', None
+
+
+def command_key(command: str) -> str:
+    """Identity used to coalesce commands: whitespace and untagged model names don't matter."""
+    scope, resource = classify(command)
+    if scope != 'model':
+        return ' '.join(command.split())
+    words = shlex.split(command)
+    words[words.index('ollama') + 2] = resource
+    return ' '.join(words)
+
+
+def chain_keys(commands: List[str]) -> List[Tuple[str, ...]]:
+    """Identity of each command within its fix: the command after the state-changing steps before it.
+
+    Two fixes only share a command when it would run in the same state: a
+    pull after a restart is not the pull another fix ran before one.
+    """
+    keys = []
+    prefix = ()
+    for command in commands:
+        key = command_key(command)
+        keys.append(prefix + (key,))
+        if classify(command)[0] != 'read_only':
+            prefix += (key,)
+    return keys
+
+
+def resolve_timeout(command: str, timeout: Optional[float] = None) -> float:
+    if timeout is None:
+        try:
+            timeout = float(os.environ.get(TIMEOUT_ENV, DEFAULT_TIMEOUT_SECONDS))
+        except ValueError:
+            timeout = DEFAULT_TIMEOUT_SECONDS
+    if re.search(r'\bollama\s+pull\b', command):
+        timeout = max(timeout, PULL_TIMEOUT_SECONDS)
+    return timeout
+
+
+def run_command(command: str, timeout: Optional[float] = None) -> Dict:
+    """Run one command through bash, killing its process group if it times out."""
+    timeout = resolve_timeout(command, timeout)
+    started = time.monotonic()
+    result = {'command': command, 'status': 'error', 'exit_code': None, 'stdout': '', 'stderr': ''}
+    try:
+        process = subprocess.Popen(['bash', '-c', command], stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                   start_new_session=True)
+    except OSError as e:
+        result.update(stderr=str(e), duration_seconds=time.monotonic() - started)
+        return result
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+        result.update(status='ok' if process.returncode == 0 else 'failed', exit_code=process.returncode)
+    except subprocess.TimeoutExpired:
+        stdout, stderr = _kill(process)
+        stderr = (f"{stderr}\n" if stderr else '') + f"Timed out after {timeout:.0f}s"
+        result['status'] = 'timeout'
+    result.update(stdout=(stdout or '')[-OUTPUT_TAIL_CHARS:], stderr=(stderr or '')[-OUTPUT_TAIL_CHARS:],
+                  duration_seconds=time.monotonic() - started)
+    return result
+
+
+def _kill(process: subprocess.Popen):
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+        try:
+            return process.communicate(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            continue
+    return process.communicate()
+
+
+class _ScopeLock:
+    """Shared/exclusive lock: ordinary commands share it, global commands hold it alone.
+
+    A waiting global command keeps new commands from starting, so it is not
+    starved by a steady stream of parallel ones.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def hold(self, exclusive: bool):
+        with self._cond:
+            if exclusive:
+                self._waiting += 1
+                self._cond.wait_for(lambda: not self._exclusive and not self._shared)
+                self._waiting -= 1
+                self._exclusive = True
+            else:
+                self._cond.wait_for(lambda: not self._exclusive and not self._waiting)
+                self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                if exclusive:
+                    self._exclusive = False
+                else:
+                    self._shared -= 1
+                self._cond.notify_all()
+
+
+class CommandRunner:
+    """Run the commands of a batch of fixes, coalesced and scheduled by scope.
+
+    Results carry over between run() calls on the same runner, so fixes
+    applied one at a time as their analyses arrive still share commands.
+    """
+
+    def __init__(self, memory=None, timeout: Optional[float] = None, max_parallel: int = MAX_PARALLEL):
+        self.memory = memory
+        self.timeout = timeout
+        self.max_parallel = max(1, max_parallel)
+        self._results = {}  # chain key -> result of an earlier run()
+
+    def plan(self, command_lists: List[List[str]]) -> List[Dict]:
+        """Unique steps in first-seen order, each with its chain key and the fixes that asked for it."""
+        steps = {}
+        for fix_index, commands in enumerate(command_lists):
+            for command, key in zip(commands, chain_keys(commands)):
+                step = steps.get(key)
+                if step is None:
+                    scope, resource = classify(command)
+                    step = steps[key] = {'key': key, 'command': command, 'scope': scope, 'resource': resource,
+                                         'fixes': []}
+                if fix_index not in step['fixes']:
+                    step['fixes'].append(fix_index)
+        return list(steps.values())
+
+    def run(self, command_lists: List[List[str]]) -> List[Dict]:
+        """Run every fix's commands; returns {'success', 'results'} per fix, in order.
+
+        Each fix's commands run one after another, in the order given, and
+        stop at its first failure; separate fixes run in parallel. A command
+        repeated after the same state-changing steps runs once, in whichever
+        fix reaches it first, and the other fixes wait for its result instead
+        of running it again, also when an earlier run() already ran it. Global commands run alone, and
+        commands on the same model never overlap.
+        """
+        steps = {step['key']: step for step in self.plan(command_lists)}
+        claim_lock = threading.Lock()
+        scope_lock = _ScopeLock()
+        model_locks = {step['resource']: threading.Lock() for step in steps.values() if step['scope'] == 'model'}
+        earlier = {key for key in steps if key in self._results}
+        for key, step in steps.items():
+            step['done'] = threading.Event()
+            if key in earlier:
+                step['result'] = self._results[key]
+                step['done'].set()
+
+        def execute(commands):
+            for key in dict.fromkeys(chain_keys(commands)):
+                step = steps[key]
+                with claim_lock:
+                    claimed = 'result' not in step
+                    if claimed:
+                        step['result'] = None
+                if claimed:
+                    try:
+                        model_lock = model_locks.get(step['resource'], nullcontext())
+                        with scope_lock.hold(step['scope'] == 'global'), model_lock:
+                            step['result'] = run_command(step['command'], self.timeout)
+                    finally:
+                        step['done'].set()
+                else:
+                    step['done'].wait()
+                if step['result']['status'] != 'ok':
+                    return
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="fix-command") as pool:
+            list(pool.map(execute, command_lists))
+
+        for key, step in steps.items():
+            if key in earlier:
+                step['result']['shared_by'] += len(step['fixes'])
+                continue
+            if step.get('result') is None:
+                step['result'] = {'command': step['command'], 'status': 'skipped', 'exit_code': None,
+                                  'stdout': '', 'stderr': '', 'duration_seconds': 0.0}
+            step['result'].update(scope=step['scope'], shared_by=len(step['fixes']))
+            if step['result']['status'] != 'skipped':
+                self._results[key] = step['result']
+        if self.memory is not None:
+            self.memory.record_command_runs([step['result'] for key, step in steps.items() if key not in earlier])
+
+        outcomes = []
+        for commands in command_lists:
+            outcome = {'success': True, 'results': []}
+            for key in dict.fromkeys(chain_keys(commands)):
+                result = steps[key]['result']
+                outcome['results'].append(result)
+                if result['status'] != 'ok':
+                    outcome['success'] = False
+            outcomes.append(outcome)
+        return outcomes
+
+
+def apply_fix_commands(fix_data: Dict, memory=None) -> bool:
+    """Run a single fix's commands, printing each result; True if all succeeded."""
+    if "fix_commands" not in fix_data:
+        print("❌ No fix commands provided")
+        return False
+
+    print(f"🔧 Applying fix: {fix_data.get('analysis', 'Unknown fix')}")
+    outcome = CommandRunner(memory).run([fix_data["fix_commands"]])[0]
+    for result in outcome['results']:
+        print(f"🔨 Executed: {format_result(result)}")
+        if result['status'] == 'ok':
+            print(f"✅ Command succeeded: {result['stdout']}")
+        elif result['status'] != 'skipped':
+            print(f"❌ Command failed: {result['stderr']}")
+    return outcome['success']
+
+
+def format_result(result: Dict) -> str:
+    """One-line summary of a command run."""
+    exit_code = f", exit {result['exit_code']}" if result['exit_code'] is not None else ''
+    return f"{result['command']} ({result['status']}{exit_code}, {result['duration_seconds']:.1f}s)"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    commands = sys.argv[1:] if argv is None else argv
+    if not commands:
+        print("Usage: command_runner.py <command>...")
+        return 1
+    outcome = CommandRunner().run([commands])[0]
+    for result in outcome['results']:
+        print(format_result(result))
+    return 0 if outcome['success'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,73 +7,22 @@ Integrates with local DeepSeek Coder model to intelligently analyze and fix test
 import json
 import os
 import sys
-import subprocess
+import threading
 import time
 from typing import Dict, List, Optional
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from ai_memory import AIMemory
-
-class DeepSeekAutoFixer:
-    def __init__(self, model_name: str = None):
-        """Initialize DeepSeek auto-fixer with local model."""
-        # Try to find available DeepSeek model if none specified
-        if model_name is None:
-            available_models = ["deepseek-coder:33b", "deepseek-coder:6.7b", "deepseek-coder:1.3b", "deepseek-coder:latest"]
-            for model in available_models:
-                if self._check_model_availability(model):
-                    model_name = model
-                    break
-            
-            if model_name is None:
-                raise ValueError("No DeepSeek coder model available. Please install one: ollama pull deepseek-coder:6.7b")
-        
-        self.model_name = model_name
-        
-        # Check if specified model is available
-        if not self._check_model_availability(self.model_name):
-            raise ValueError(f"DeepSeek model '{model_name}' is not available. Please install it first.")
-        
-        # Initialize memory system (shared with other AI providers)
-        self.memory = AIMemory()
-
-    def _check_model_availability(self, model_name: str = None) -> bool:
-        """Check if a DeepSeek model is available in Ollama."""
-        check_model = model_name or self.model_name
-        try:
-            result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-            return check_model in result.stdout
-        except Exception:
-            return False
-
-    def analyze_issue(self, issue_data: Dict) -> Dict:
-        """Send issue to DeepSeek for analysis and fix recommendation with historical context."""
-        
-        # Get historical context from memory
-        historical_context = self.memory.build_context_for_ai(issue_data)
-        
-        prompt = f"""You are an AI model testing expert with access to comprehensive historical data about previous fixes.
-
-{historical_context}
-
-Current Issue Details:
-- Model: {issue_data['model']}
-- Issue Type: {issue_data['issue_type']}
-- Description: {issue_data['description']}
-- Error Output: {issue_data.get('error_output', 'N/A')}
-- Test Prompt: {issue_data.get('test_prompt', 'N/A')}
-- Expected Pattern: {issue_data.get('expected_pattern', 'N/A')}
-- Actual Response: {issue_data.get('actual_response', 'N/A')}
-
-Context:
-- This is part of an automated testing framework for AI models
-- Models are run via Ollama
-- Tests check if models respond correctly to prompts
-- You have access to historical data about similar issues and their solutions
-- Learn from past successes and failures shown in the historical context above
-
-Based on the historical context and current issue, please analyze and provide:
+from ai_memory import AIMemory, get_memory
+from command_runner import apply_fix_commands
+from fix_response import FixResponseError, generate_fix_response
+from fix_verifier import verify_issue
+from model_inventory import ModelInventory, get_inventory
+from ollama_client import CancelToken, OllamaClient, OllamaError, get_client
+from prompt_builder import RESPONSE_TOKENS, PromptBuilder
+
+# Fixer-specific part of the analysis prompt; see prompt_builder for the rest
+ANALYSIS_INSTRUCTIONS = """Based on the historical context and current issue, please analyze and provide:
 1. Root cause analysis
 2. Specific fix recommendations  
 3. Executable bash commands to implement the fix
@@ -92,116 +41,94 @@ Examples of BAD fix_commands (never do this):
 - ["Fix the model configuration"]         <- This is not executable
 
 Respond ONLY with valid JSON in this exact format:
-{{
+{
     "analysis": "The model is giving verbose responses instead of the expected simple answer",
     "fix_type": "prompt_adjustment",
     "fix_commands": ["echo 'Model behavior noted - using alternative prompt strategy'"],
     "verification_steps": ["Re-test with adjusted timeout"],
     "confidence": 0.8,
     "expected_outcome": "Model should respond more appropriately or timeout will be adjusted"
-}}
+}
 
 Important: Use only one of these fix_type values: prompt_adjustment, system_fix, model_config, other
 Do not use pipe symbols or multiple values. Respond only with the JSON above."""
 
+
+class DeepSeekAutoFixer:
+    def __init__(self, model_name: str = None, memory: Optional[AIMemory] = None,
+                 prompt_tokens: Optional[int] = None, ollama: Optional[OllamaClient] = None,
+                 inventory: Optional[ModelInventory] = None):
+        """Initialize DeepSeek auto-fixer with local model."""
+        # Shared pooled Ollama API client ($OLLAMA_HOST by default), and the
+        # installed models it reports, fetched once and cached
+        self.ollama = ollama or get_client()
+        self.inventory = inventory or get_inventory(self.ollama)
+        
+        # Try to find available DeepSeek model if none specified
+        if model_name is None:
+            available_models = ["deepseek-coder:33b", "deepseek-coder:6.7b", "deepseek-coder:1.3b", "deepseek-coder:latest"]
+            model_name = self.inventory.first_available(available_models)
+            if model_name is None:
+                raise ValueError("No DeepSeek coder model available. Please install one: ollama pull deepseek-coder:6.7b")
+        
+        self.model_name = model_name
+        
+        # Check if specified model is available
+        if not self._check_model_availability(self.model_name):
+            raise ValueError(f"DeepSeek model '{model_name}' is not available. Please install it first.")
+        
+        # Shared memory system (shared with other AI providers), opened on first use
+        self.memory = memory or get_memory()
+
+        # Prompt assembly under the token budget ($AI_FIX_PROMPT_TOKENS by default)
+        self.prompt_builder = PromptBuilder(prompt_tokens)
+        # Per-thread results of the latest analysis, as batches analyze concurrently
+        self._local = threading.local()
+
+        # The context window fits the prompt budget plus the answer
+        self.options = {'num_ctx': self.prompt_builder.token_budget + RESPONSE_TOKENS}
+
+    def _check_model_availability(self, model_name: str = None) -> bool:
+        """Check if a DeepSeek model is installed in Ollama (exact name match)."""
+        return self.inventory.has(model_name or self.model_name)
+
+    @property
+    def last_prompt_usage(self) -> Optional[Dict]:
+        """Token usage of the prompt behind this thread's latest analysis."""
+        return getattr(self._local, 'prompt_usage', None)
+
+    def analyze_issue(self, issue_data: Dict, cancel: Optional[CancelToken] = None) -> Dict:
+        """Send issue to DeepSeek for analysis and fix recommendation with historical context.
+
+        Cancelling the token abandons the generation on the server.
+        """
+        
+        # Get historical context from memory
+        historical_context = self.memory.build_context_for_ai(issue_data)
+        
+        prompt, self._local.prompt_usage = self.prompt_builder.build(
+            issue_data, historical_context, ANALYSIS_INSTRUCTIONS)
+
         try:
-            # Create a temporary file for the prompt
-            temp_prompt_file = f"/tmp/deepseek_prompt_{int(time.time())}.txt"
-            with open(temp_prompt_file, 'w') as f:
-                f.write(prompt)
-            
-            # Call DeepSeek model via Ollama
-            cmd = f'ollama run {self.model_name} < "{temp_prompt_file}"'
-            result = subprocess.run(['bash', '-c', cmd], capture_output=True, text=True, timeout=120)
-            
-            # Clean up temp file
-            os.unlink(temp_prompt_file)
-            
-            if result.returncode != 0:
-                return {"error": f"DeepSeek model call failed: {result.stderr}"}
-            
-            response_text = result.stdout.strip()
-            
-            # Extract JSON from DeepSeek's response
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except json.JSONDecodeError as e:
-                    return {
-                        "error": f"DeepSeek returned invalid JSON: {str(e)}", 
-                        "raw_response": response_text,
-                        "extracted_json": json_match.group()
-                    }
-            else:
-                return {"error": "Could not parse DeepSeek's response", "raw_response": response_text}
-                
-        except subprocess.TimeoutExpired:
-            return {"error": "DeepSeek model call timed out"}
+            # Call DeepSeek through the Ollama API, keeping the model loaded between
+            # analyses; the reply is constrained to the fix schema and generation
+            # stops as soon as the JSON object is complete
+            return generate_fix_response(self.ollama, self.model_name, prompt, options=self.options,
+                                         cancel=cancel)
+        except FixResponseError as e:
+            return {"error": f"DeepSeek returned invalid JSON: {str(e)}", "raw_response": e.raw_response}
+        except OllamaError as e:
+            return {"error": f"DeepSeek model call failed: {str(e)}"}
         except Exception as e:
             return {"error": f"DeepSeek analysis failed: {str(e)}"}
 
     def apply_fix(self, fix_data: Dict) -> bool:
         """Apply the fix recommended by DeepSeek."""
-        if "fix_commands" not in fix_data:
-            print("❌ No fix commands provided")
-            return False
-
-        print(f"🔧 Applying fix: {fix_data.get('analysis', 'Unknown fix')}")
-        
-        for command in fix_data["fix_commands"]:
-            print(f"🔨 Executing: {command}")
-            try:
-                result = subprocess.run(['bash', '-c', command], capture_output=True, text=True)
-                if result.returncode != 0:
-                    print(f"❌ Command failed: {result.stderr}")
-                    return False
-                else:
-                    print(f"✅ Command succeeded: {result.stdout}")
-            except Exception as e:
-                print(f"❌ Error executing command: {e}")
-                return False
-        
-        return True
+        return apply_fix_commands(fix_data, self.memory)
 
     def verify_fix(self, issue_data: Dict, fix_data: Dict) -> bool:
         """Verify that the fix actually resolved the issue."""
-        print("🔍 Verifying fix...")
-        
-        # Re-run the specific test that failed
-        model_name = issue_data['model']
-        test_prompt = issue_data.get('test_prompt', 'What is 2+2? Answer briefly.')
-        expected_pattern = issue_data.get('expected_pattern', '.*4.*')
-        
-        try:
-            # Test the model with the same prompt
-            test_cmd = f'echo "{test_prompt}" | ollama run {model_name}'
-            result = subprocess.run(['bash', '-c', test_cmd], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode != 0:
-                print(f"❌ Model test failed: {result.stderr}")
-                return False
-            
-            response = result.stdout.strip()
-            
-            # Check if response matches expected pattern
-            import re
-            if re.search(expected_pattern, response):
-                print(f"✅ Fix verified: Model responded correctly")
-                print(f"📝 Response: {response[:100]}...")
-                return True
-            else:
-                print(f"❌ Fix verification failed: Response doesn't match pattern")
-                print(f"📝 Response: {response[:100]}...")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            print("❌ Fix verification timed out")
-            return False
-        except Exception as e:
-            print(f"❌ Error during verification: {e}")
-            return False
+        return verify_issue(issue_data, self.memory)
 
 
 def main():
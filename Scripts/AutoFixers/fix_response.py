@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Fix Response Parsing
+Schema and parser for the JSON fix recommendation every fixer asks for.
+Local models are constrained to the schema through Ollama's `format` and
+their stream is scanned incrementally, so generation stops as soon as the
+top-level object closes instead of running on into prose or whitespace.
+Responses from any provider are validated against the same schema.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional
+
+from ollama_client import OllamaError
+
+FIX_TYPES = ["model_config", "prompt_adjustment", "system_fix", "model_reinstall", "other"]
+
+FIX_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis": {"type": "string"},
+        "fix_type": {"type": "string", "enum": FIX_TYPES},
+        "fix_commands": {"type": "array", "items": {"type": "string"}},
+        "verification_steps": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        "expected_outcome": {"type": "string"},
+    },
+    "required": ["analysis", "fix_type", "fix_commands"],
+}
+
+# Balanced-object candidates tried when a reply has prose around the JSON
+MAX_EXTRACT_ATTEMPTS = 8
+
+_JSON_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "number": (int, float), "integer": int,
+}
+
+
+class FixResponseError(ValueError):
+    """The model's reply holds no valid fix recommendation."""
+
+    def __init__(self, message: str, raw_response: str):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+
+class JsonObjectScanner:
+    """Find where the first top-level JSON object in a stream of text ends.
+
+    Text before the opening brace is skipped; braces inside strings are
+    ignored. feed() returns the end offset (exclusive, counted over
+    everything fed) once the object closes.
+    """
+
+    _OUTSIDE = re.compile(r'[{}"]')
+    _INSIDE = re.compile(r'["\\]')
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> Optional[int]:
+        if self.end is not None:
+            return self.end
+        i = 0
+        if self._escape and text:
+            self._escape = False
+            i = 1
+        while i < len(text):
+            if self._in_string:
+                match = self._INSIDE.search(text, i)
+                if not match:
+                    break
+                i = match.end()
+                if match.group() == '\\':
+                    if i >= len(text):
+                        self._escape = True
+                        break
+                    i += 1
+                else:
+                    self._in_string = False
+                continue
+
+            match = self._OUTSIDE.search(text, i)
+            if not match:
+                break
+            i = match.end()
+            char = match.group()
+            if char == '{':
+                if self._depth == 0:
+                    self.start = self._offset + i - 1
+                self._depth += 1
+            elif self._depth == 0:
+                continue   # quotes and braces in prose before the object
+            elif char == '"':
+                self._in_string = True
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = self._offset + i
+                    return self.end
+        self._offset += len(text)
+        return None
+
+
+def extract_json_object(text: str) -> Optional[Dict]:
+    """Return the first balanced JSON object in text that parses, or None."""
+    position = 0
+    for _ in range(MAX_EXTRACT_ATTEMPTS):
+        start = text.find('{', position)
+        if start < 0:
+            return None
+        scanner = JsonObjectScanner()
+        end = scanner.feed(text[start:])
+        if end is None:
+            return None
+        try:
+            value = json.loads(text[start:start + end])
+        except json.JSONDecodeError:
+            position = start + 1
+            continue
+        if isinstance(value, dict):
+            return value
+        position = start + 1
+    return None
+
+
+def validate(value, schema: Dict, path: str = "$") -> List[str]:
+    """Check value against the JSON Schema subset used here; returns error messages."""
+    expected = schema.get("type")
+    if expected:
+        types = _JSON_TYPES[expected]
+        if not isinstance(value, types) or (expected in ("number", "integer") and isinstance(value, bool)):
+            return [f"{path}: expected {expected}, got {type(value).__name__}"]
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {', '.join(schema['enum'])}")
+    if "minimum" in schema and value < schema["minimum"]:
+        errors.append(f"{path}: {value} is below {schema['minimum']}")
+    if "maximum" in schema and value > schema["maximum"]:
+        errors.append(f"{path}: {value} is above {schema['maximum']}")
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: missing required '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(validate(value[key], subschema, f"{path}.{key}"))
+    elif expected == "array" and "items" in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+
+def _normalize(fix_data: Dict) -> Dict:
+    """Repair the slips models commonly make before validating."""
+    fix_type = fix_data.get("fix_type")
+    if isinstance(fix_type, str) and fix_type not in FIX_TYPES:
+        # Templates listing the choices as "a|b|c" get echoed back verbatim
+        choices = [choice.strip().lower() for choice in fix_type.split('|')]
+        fix_data["fix_type"] = next((choice for choice in choices if choice in FIX_TYPES), fix_type)
+    if isinstance(fix_data.get("fix_commands"), str):
+        fix_data["fix_commands"] = [fix_data["fix_commands"]]
+    confidence = fix_data.get("confidence")
+    if isinstance(confidence, str):
+        try:
+            fix_data["confidence"] = float(confidence.strip().rstrip('%')) / (100 if '%' in confidence else 1)
+        except ValueError:
+            pass
+    return fix_data
+
+
+def parse_fix_response(text: str) -> Dict:
+    """Extract, normalize and validate the fix recommendation in a model reply."""
+    fix_data = extract_json_object(text)
+    if fix_data is None:
+        raise FixResponseError("No JSON object found in the response", text)
+    errors = validate(_normalize(fix_data), FIX_RESPONSE_SCHEMA)
+    if errors:
+        raise FixResponseError(f"Response does not match the fix schema: {'; '.join(errors)}", text)
+    return fix_data
+
+
+def generate_fix_response(client, model: str, prompt: str, options: Optional[Dict] = None,
+                          cancel=None) -> Dict:
+    """Ask a local model for a schema-constrained fix and stop once its object is complete.
+
+    Closing the stream as soon as the top-level object closes drops the
+    connection, which makes Ollama stop generating. Servers too old for
+    JSON schemas in `format` get plain JSON mode instead.
+    """
+    try:
+        return _stream_fix_response(client, model, prompt, options, cancel, FIX_RESPONSE_SCHEMA)
+    except OllamaError as e:
+        if e.status != 400 or 'format' not in str(e):
+            raise
+    return _stream_fix_response(client, model, prompt, options, cancel, "json")
+
+
+def _stream_fix_response(client, model, prompt, options, cancel, format) -> Dict:
+    text = ''
+    base = 0    # offset in text the scanner started at
+    scanner = JsonObjectScanner()
+    stream = client.stream_generate(model, prompt, options=options, format=format, cancel=cancel)
+    try:
+        for chunk in stream:
+            piece = chunk.get('response', '')
+            text += piece
+            end = scanner.feed(piece)
+            while end is not None:
+                candidate = text[base + scanner.start:base + end]
+                try:
+                    if isinstance(json.loads(candidate), dict):
+                        return parse_fix_response(text[:base + end])
+                except json.JSONDecodeError:
+                    pass
+                # Braces in prose, not the object: rescan after its opening brace
+                base += scanner.start + 1
+                scanner = JsonObjectScanner()
+                end = scanner.feed(text[base:])
+    finally:
+        stream.close()
+    return parse_fix_response(text)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Fix Verification
+Checks that a fixed model answers its test again, through the Ollama HTTP
+API instead of `echo prompt | ollama run`. The model is loaded once with
+keep_alive and stays resident for the test run that follows, the prompt
+and pattern are the ones the category's test used, and several checks are
+sent to the loaded model at once, each streamed through the response
+evaluator so it stops as soon as its pattern matches. Every verification
+is recorded with its load time and latency.
+
+    python3 fix_verifier.py Tests/2025-01-01/General_llama3:8b/ai_issue.json
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from ollama_client import CancelToken, OllamaClient, OllamaError, get_client
+from response_evaluator import evaluate
+
+# Check used when an issue does not say which test failed
+DEFAULT_PROMPT = "What is 2+2? Answer briefly."
+DEFAULT_PATTERN = ".*4.*"
+
+# Seconds the checks may take once the model is loaded ($AI_FIX_VERIFY_TIMEOUT)
+VERIFY_TIMEOUT_SECONDS = 30.0
+TIMEOUT_ENV = "AI_FIX_VERIFY_TIMEOUT"
+
+# Tokens generated per check when the pattern never matches; the tests only
+# look at the start of a reply
+MAX_RESPONSE_TOKENS = 256
+
+
+def checks_for(issue_data: Dict) -> List[Dict]:
+    """Prompt/pattern pairs to verify: the issue's verification_checks, else its failed test."""
+    checks = issue_data.get('verification_checks')
+    if checks:
+        return [{'prompt': check['prompt'], 'pattern': check['pattern']} for check in checks]
+    return [{'prompt': issue_data.get('test_prompt') or DEFAULT_PROMPT,
+             'pattern': issue_data.get('expected_pattern') or DEFAULT_PATTERN}]
+
+
+def _resolve_timeout(timeout: Optional[float]) -> float:
+    if timeout is None:
+        try:
+            timeout = float(os.environ.get(TIMEOUT_ENV, VERIFY_TIMEOUT_SECONDS))
+        except ValueError:
+            timeout = VERIFY_TIMEOUT_SECONDS
+    return max(1.0, timeout)
+
+
+def verify_model(model: str, checks: List[Dict], client: Optional[OllamaClient] = None,
+                 timeout: Optional[float] = None) -> Dict:
+    """Load the model, send every check to it at once and match each reply.
+
+    Returns passed, the per-check outcomes, and the seconds spent loading
+    and in total; loading is not held to the timeout, since a cold load of
+    a large model legitimately takes longer than answering.
+    """
+    client = client or get_client()
+    timeout = _resolve_timeout(timeout)
+    started = time.monotonic()
+    result = {'model': model, 'passed': False, 'checks': [], 'load_seconds': None,
+              'latency_seconds': None, 'error': None}
+    try:
+        client.load(model)
+    except OllamaError as e:
+        result.update(error=f"Could not load {model}: {e}", latency_seconds=time.monotonic() - started)
+        return result
+    result['load_seconds'] = time.monotonic() - started
+
+    cancel = CancelToken()
+    timer = threading.Timer(timeout, cancel.cancel)
+    timer.daemon = True
+    timer.start()
+
+    def run(check):
+        outcome = dict(check, passed=False, response='', error=None, latency_seconds=0.0)
+        try:
+            reply = evaluate(model, check['prompt'], check['pattern'], client, timeout,
+                             MAX_RESPONSE_TOKENS, cancel=cancel)
+        except re.error as e:
+            outcome['error'] = f"Invalid pattern {check['pattern']!r}: {e}"
+            return outcome
+        outcome.update(passed=reply['status'] == 'matched', response=reply['response'],
+                       latency_seconds=reply['seconds'])
+        if reply['status'] == 'timeout':
+            outcome['error'] = f"No answer within {timeout:.0f}s"
+        elif reply['status'] == 'error':
+            outcome['error'] = reply['error']
+        return outcome
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(checks)), thread_name_prefix="verify") as pool:
+            result['checks'] = list(pool.map(run, checks))
+    finally:
+        timer.cancel()
+    result['passed'] = bool(checks) and all(check['passed'] for check in result['checks'])
+    result['latency_seconds'] = time.monotonic() - started
+    return result
+
+
+def verify_issue(issue_data: Dict, memory=None, client: Optional[OllamaClient] = None) -> bool:
+    """Verify a fixed issue against its model, printing and recording the outcome."""
+    print("🔍 Verifying fix...")
+    result = verify_model(issue_data['model'], checks_for(issue_data), client)
+    if memory is not None:
+        memory.record_verification(issue_data, result)
+
+    if result['error']:
+        print(f"❌ Model test failed: {result['error']}")
+        return False
+    for check in result['checks']:
+        if check['passed']:
+            print(f"✅ Fix verified: Model responded correctly ({check['latency_seconds']:.1f}s)")
+        elif check['error']:
+            print(f"❌ Model test failed: {check['error']}")
+        else:
+            print(f"❌ Fix verification failed: Response doesn't match pattern {check['pattern']!r}")
+        print(f"📝 Response: {check['response'][:100]}...")
+    print(f"⏱️ Verification took {result['latency_seconds']:.1f}s (model load {result['load_seconds']:.1f}s)")
+    return result['passed']
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 1:
+        print("Usage: fix_verifier.py <issue_json_file>")
+        return 1
+    with open(args[0]) as f:
+        issue_data = json.load(f)
+    return 0 if verify_issue(issue_data) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
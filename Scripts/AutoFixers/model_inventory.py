@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Ollama Model Inventory
+Installed models from a single /api/tags call, cached for a few seconds in
+process and in a small on-disk cache the bash harness reads too, instead of
+running `ollama list` for every model checked. Names are matched exactly,
+with an untagged name meaning its :latest tag.
+
+    python3 model_inventory.py has deepseek-coder:6.7b   # exit 0 if installed
+    python3 model_inventory.py list --json
+    python3 model_inventory.py path                      # names file for bash
+"""
+
+import argparse
+import getpass
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from ollama_client import OllamaClient, OllamaError, get_client
+
+# Seconds an inventory is trusted before /api/tags is asked again
+DEFAULT_TTL_SECONDS = 30.0
+TTL_ENV = "OLLAMA_INVENTORY_TTL"
+
+# JSON cache file; the names file for bash sits next to it with a .txt suffix
+CACHE_FILE_ENV = "OLLAMA_INVENTORY_FILE"
+
+MODEL_FIELDS = ('name', 'digest', 'size', 'modified_at')
+
+
+def normalize_name(name: str) -> str:
+    """Model name as /api/tags reports it: an untagged name means :latest."""
+    name = name.strip()
+    return name if ':' in name.rsplit('/', 1)[-1] else f"{name}:latest"
+
+
+def default_cache_path(host: str) -> str:
+    """Per-user, per-host cache file in the temp directory ($OLLAMA_INVENTORY_FILE overrides)."""
+    if os.environ.get(CACHE_FILE_ENV):
+        return os.environ[CACHE_FILE_ENV]
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', host.split('://', 1)[-1]).strip('_')
+    return os.path.join(tempfile.gettempdir(), f"ollama-inventory-{getpass.getuser()}", f"{slug}.json")
+
+
+def _resolve_ttl(ttl: Optional[float]) -> float:
+    if ttl is None:
+        try:
+            ttl = float(os.environ.get(TTL_ENV, DEFAULT_TTL_SECONDS))
+        except ValueError:
+            ttl = DEFAULT_TTL_SECONDS
+    return max(0.0, ttl)
+
+
+class ModelInventory:
+    """Installed Ollama models, fetched at most once per TTL across processes."""
+
+    def __init__(self, client: Optional[OllamaClient] = None, ttl: Optional[float] = None,
+                 cache_path: Optional[str] = None):
+        self.client = client or get_client()
+        self.ttl = _resolve_ttl(ttl)
+        self.cache_path = cache_path or default_cache_path(self.client.host)
+        self.names_path = os.path.splitext(self.cache_path)[0] + '.txt'
+        self._models = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def models(self, refresh: bool = False) -> List[Dict]:
+        """Installed models with name, digest, size and modified_at.
+
+        Raises OllamaError when the server cannot be asked and nothing fresh
+        is cached.
+        """
+        with self._lock:
+            now = time.time()
+            if not refresh and self._models is not None and now < self._expires_at:
+                return self._models
+            cached = None if refresh else self._read_cache(now)
+            if cached is not None:
+                self._models, self._expires_at = cached
+                return self._models
+            models = [{field: model.get(field) for field in MODEL_FIELDS}
+                      for model in self.client.tags()]
+            self._models, self._expires_at = models, now + self.ttl
+            self._write_cache(models, now)
+            return models
+
+    def names(self) -> List[str]:
+        return [model['name'] for model in self.models()]
+
+    def get(self, name: str) -> Optional[Dict]:
+        """The installed model with exactly this name, or None (also when Ollama is down)."""
+        wanted = normalize_name(name)
+        try:
+            return next((model for model in self.models() if model['name'] == wanted), None)
+        except OllamaError:
+            return None
+
+    def has(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def first_available(self, candidates: Iterable[str]) -> Optional[str]:
+        """First candidate that is installed, from one inventory fetch."""
+        return next((name for name in candidates if self.has(name)), None)
+
+    def server_available(self) -> bool:
+        """Whether the Ollama server answers (from the cache when it is fresh)."""
+        try:
+            self.models()
+            return True
+        except OllamaError:
+            return False
+
+    def invalidate(self):
+        """Forget the inventory, e.g. after pulling or removing a model."""
+        with self._lock:
+            self._models = None
+            self._expires_at = 0.0
+            for path in (self.cache_path, self.names_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _read_cache(self, now: float):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('host') != self.client.host or not now < data.get('expires_at', 0):
+            return None
+        return data.get('models', []), data['expires_at']
+
+    def _write_cache(self, models: List[Dict], now: float):
+        """Write the JSON cache and the bash names file, each replaced atomically.
+
+        The names file starts with a header carrying the expiry, so the shell
+        can check freshness without parsing JSON or stat-ing the file.
+        """
+        expires_at = now + self.ttl
+        data = {'host': self.client.host, 'fetched_at': now, 'expires_at': expires_at, 'models': models}
+        names = f"# expires_at={int(expires_at)} host={self.client.host}\n"
+        names += ''.join(f"{model['name']}\n" for model in models)
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            _replace(self.names_path, names)
+            _replace(self.cache_path, json.dumps(data))
+        except OSError:
+            pass   # the cache is an optimization; the inventory still works without it
+
+
+def _replace(path: str, text: str):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.inventory-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(client: Optional[OllamaClient] = None) -> ModelInventory:
+    """Return the process-wide inventory for a client's Ollama host."""
+    client = client or get_client()
+    with _inventories_lock:
+        inventory = _inventories.get(client.host)
+        if inventory is None:
+            inventory = _inventories[client.host] = ModelInventory(client)
+        return inventory
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Installed Ollama models, cached for a few seconds")
+    parser.add_argument('--host', help="Ollama URL (default: $OLLAMA_HOST)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    sub = commands.add_parser('list', help="List installed models")
+    sub.add_argument('--json', action='store_true', help="Print names, digests and sizes as JSON")
+    sub.add_argument('--refresh', action='store_true', help="Ignore the cache")
+    sub = commands.add_parser('has', help="Exit 0 if every model is installed")
+    sub.add_argument('models', nargs='+')
+    commands.add_parser('refresh', help="Fetch the inventory and rewrite the cache")
+    commands.add_parser('invalidate', help="Delete the cache")
+    commands.add_parser('path', help="Print the names file the bash harness reads")
+    args = parser.parse_args(argv)
+
+    inventory = get_inventory(get_client(args.host))
+    if args.command == 'path':
+        print(inventory.names_path)
+        return 0
+    if args.command == 'invalidate':
+        inventory.invalidate()
+        return 0
+    if args.command == 'has':
+        return 0 if all(inventory.has(name) for name in args.models) else 1
+    try:
+        models = inventory.models(refresh=args.command == 'refresh' or args.refresh)
+    except OllamaError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    if args.command == 'list':
+        if args.json:
+            print(json.dumps(models, indent=2))
+        else:
+            for model in models:
+                print(f"{model['name']:40} {(model['digest'] or '')[:12]:12} "
+                      f"{(model['size'] or 0) / 1e9:6.1f} GB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Ollama HTTP Client
+Pooled client for the Ollama REST API used by the local fixers. Requests go
+over persistent HTTP/1.1 connections instead of spawning `ollama run`, so a
+model can be kept resident with keep_alive, responses are read as they are
+streamed, per-request options reach the model, and a generation can be
+cancelled from another thread by closing its connection.
+"""
+
+import http.client
+import json
+import os
+import queue
+import socket
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+HOST_ENV = "OLLAMA_HOST"
+
+# How long the server keeps a model loaded after a request
+DEFAULT_KEEP_ALIVE = "30m"
+
+# Seconds to connect, and to wait for each streamed chunk; a cold model load
+# happens before the first chunk, so the read timeout covers it
+CONNECT_TIMEOUT_SECONDS = 5.0
+READ_TIMEOUT_SECONDS = 120.0
+
+# Idle connections kept per client
+POOL_SIZE = 4
+
+
+class OllamaError(Exception):
+    """The Ollama server returned an error or an unreadable response."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class OllamaUnavailable(OllamaError):
+    """No Ollama server is reachable."""
+
+
+class OllamaCancelled(OllamaError):
+    """The request was cancelled before it completed."""
+
+
+def default_host() -> str:
+    """Base URL from $OLLAMA_HOST (host[:port] or URL), as the ollama CLI reads it."""
+    host = os.environ.get(HOST_ENV) or DEFAULT_HOST
+    if '://' not in host:
+        host = 'http://' + host
+    parts = urlsplit(host)
+    hostname = parts.hostname or '127.0.0.1'
+    if hostname in ('0.0.0.0', '::'):
+        hostname = '127.0.0.1'
+    return f"{parts.scheme}://{hostname}:{parts.port or 11434}"
+
+
+class CancelToken:
+    """Cancel in-flight requests from any thread.
+
+    Cancelling shuts down the sockets of the requests using the token, which
+    unblocks their reads immediately and tells the server to stop generating.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleep up to timeout seconds, returning True as soon as the token is cancelled."""
+        return self._event.wait(timeout)
+
+    def cancel(self):
+        self._event.set()
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            _shutdown(conn)
+
+    def _attach(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+        if self.cancelled:
+            _shutdown(conn)
+
+    def _detach(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+
+
+def _shutdown(conn: http.client.HTTPConnection):
+    sock = conn.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class OllamaClient:
+    """Thread-safe Ollama API client with a pool of keep-alive connections."""
+
+    def __init__(self, host: Optional[str] = None, pool_size: int = POOL_SIZE,
+                 keep_alive: str = DEFAULT_KEEP_ALIVE, timeout: float = READ_TIMEOUT_SECONDS):
+        self.host = (host or default_host()).rstrip('/')
+        parts = urlsplit(self.host if '://' in self.host else 'http://' + self.host)
+        self._address = (parts.hostname, parts.port or 11434)
+        self._https = parts.scheme == 'https'
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        conn = cls(*self._address, timeout=CONNECT_TIMEOUT_SECONDS)
+        try:
+            conn.connect()
+        except OSError as e:
+            raise OllamaUnavailable(f"Cannot reach Ollama at {self.host}: {e}") from e
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _acquire(self):
+        """Return (connection, reused)."""
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Close idle pooled connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _request(self, method: str, path: str, body: Optional[Dict] = None,
+                 timeout: Optional[float] = None, cancel: Optional[CancelToken] = None) -> Iterator[Dict]:
+        """Send a request and yield each JSON object of the (possibly streamed) response.
+
+        The connection goes back to the pool only when the response was read
+        to the end; stopping the iteration early closes it, which also makes
+        the server abandon the generation.
+        """
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            if cancel is not None:
+                cancel._attach(conn)
+            try:
+                conn.sock.settimeout(timeout or self.timeout)
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                break
+            except Exception as e:
+                conn.close()
+                if cancel is not None:
+                    cancel._detach(conn)
+                    if cancel.cancelled:
+                        raise OllamaCancelled(f"Ollama {path} request cancelled") from e
+                # The server dropped an idle pooled connection before reading
+                # the request, so it is safe to send it again on a fresh one;
+                # the other idle connections are likely just as stale
+                if reused and attempt == 0 and isinstance(e, (ConnectionError, http.client.BadStatusLine)):
+                    self.close()
+                    continue
+                if isinstance(e, socket.timeout):
+                    raise OllamaError(f"Ollama {path} sent nothing for {timeout or self.timeout:.0f}s") from e
+                if isinstance(e, (OSError, http.client.HTTPException)):
+                    raise OllamaUnavailable(f"Request to Ollama at {self.host} failed: {e}") from e
+                raise
+
+        complete = False
+        try:
+            if response.status != 200:
+                raise OllamaError(f"Ollama {path} failed with HTTP {response.status}: "
+                                  f"{_error_message(response.read())}", response.status)
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise OllamaError(f"Unreadable response from Ollama {path}: {line[:200]!r}") from e
+                if 'error' in chunk:
+                    raise OllamaError(f"Ollama {path} failed: {chunk['error']}")
+                yield chunk
+            if cancel is not None and cancel.cancelled:
+                raise OllamaCancelled(f"Ollama {path} request cancelled")
+            complete = True
+        except (OSError, http.client.HTTPException) as e:
+            if cancel is not None and cancel.cancelled:
+                raise OllamaCancelled(f"Ollama {path} request cancelled") from e
+            if isinstance(e, socket.timeout):
+                raise OllamaError(f"Ollama {path} sent nothing for {timeout or self.timeout:.0f}s") from e
+            raise OllamaError(f"Ollama {path} response interrupted: {e}") from e
+        finally:
+            if cancel is not None:
+                cancel._detach(conn)
+            if complete and not response.will_close:
+                response.close()
+                self._release(conn)
+            else:
+                conn.close()
+
+    def _body(self, model: str, options: Optional[Dict], keep_alive: Optional[str], extra: Dict) -> Dict:
+        body = {'model': model, 'keep_alive': self.keep_alive if keep_alive is None else keep_alive}
+        if options:
+            body['options'] = options
+        body.update({key: value for key, value in extra.items() if value is not None})
+        return body
+
+    def stream_generate(self, model: str, prompt: str, options: Optional[Dict] = None,
+                        system: Optional[str] = None, format=None, keep_alive: Optional[str] = None,
+                        timeout: Optional[float] = None, cancel: Optional[CancelToken] = None) -> Iterator[Dict]:
+        """Yield /api/generate chunks as the model produces them; the last one has done=True."""
+        body = self._body(model, options, keep_alive,
+                          {'prompt': prompt, 'system': system, 'format': format, 'stream': True})
+        return self._request('POST', '/api/generate', body, timeout, cancel)
+
+    def stream_chat(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                    format=None, keep_alive: Optional[str] = None,
+                    timeout: Optional[float] = None, cancel: Optional[CancelToken] = None) -> Iterator[Dict]:
+        """Yield /api/chat chunks as the model produces them; the last one has done=True."""
+        body = self._body(model, options, keep_alive,
+                          {'messages': messages, 'format': format, 'stream': True})
+        return self._request('POST', '/api/chat', body, timeout, cancel)
+
+    def generate(self, model: str, prompt: str, on_chunk: Optional[Callable[[str], None]] = None,
+                 **kwargs) -> Dict:
+        """Run /api/generate to completion and return the final chunk with the full 'response'.
+
+        Takes the same keyword arguments as stream_generate; on_chunk is
+        called with each piece of text as it arrives.
+        """
+        return _collect(self.stream_generate(model, prompt, **kwargs), on_chunk,
+                        lambda chunk: chunk.get('response', ''), 'response')
+
+    def chat(self, model: str, messages: List[Dict], on_chunk: Optional[Callable[[str], None]] = None,
+             **kwargs) -> Dict:
+        """Run /api/chat to completion and return the final chunk with the full 'message'."""
+        final = _collect(self.stream_chat(model, messages, **kwargs), on_chunk,
+                         lambda chunk: chunk.get('message', {}).get('content', ''), 'content')
+        final['message'] = {'role': 'assistant', 'content': final.pop('content')}
+        return final
+
+    def load(self, model: str, keep_alive: Optional[str] = None):
+        """Load a model into memory without generating anything."""
+        for _ in self._request('POST', '/api/generate', self._body(model, None, keep_alive, {'stream': False})):
+            pass
+
+    def unload(self, model: str):
+        """Evict a model from memory now."""
+        self.load(model, keep_alive=0)
+
+    def _get(self, path: str) -> Dict:
+        # Read to the end so the connection goes back to the pool
+        chunks = list(self._request('GET', path))
+        return chunks[0] if chunks else {}
+
+    def tags(self) -> List[Dict]:
+        """Installed models (/api/tags)."""
+        return self._get('/api/tags').get('models', [])
+
+    def running(self) -> List[Dict]:
+        """Models currently loaded in memory (/api/ps)."""
+        return self._get('/api/ps').get('models', [])
+
+    def version(self) -> str:
+        return self._get('/api/version').get('version', '')
+
+
+def _collect(chunks: Iterator[Dict], on_chunk, text_of, key: str) -> Dict:
+    parts = []
+    final = {}
+    for chunk in chunks:
+        text = text_of(chunk)
+        if text:
+            parts.append(text)
+            if on_chunk is not None:
+                on_chunk(text)
+        if chunk.get('done'):
+            final = chunk
+    if not final:
+        raise OllamaError("Ollama stream ended before the model finished")
+    final = dict(final)
+    final[key] = ''.join(parts)
+    return final
+
+
+def _error_message(body: bytes) -> str:
+    try:
+        return json.loads(body).get('error') or body.decode('utf-8', 'replace')
+    except (ValueError, AttributeError):
+        return body.decode('utf-8', 'replace')[:200]
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host: Optional[str] = None) -> OllamaClient:
+    """Return the process-wide client for an Ollama host ($OLLAMA_HOST by default)."""
+    host = (host or default_host()).rstrip('/')
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = _clients[host] = OllamaClient(host)
+        return client
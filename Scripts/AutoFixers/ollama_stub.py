@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Ollama Stub Server
+Minimal stand-in for the Ollama REST API, for exercising the fixers and the
+HTTP client without a GPU or real models. It serves /api/generate, /api/chat,
+/api/tags, /api/ps and /api/version, streams canned replies word by word over
+keep-alive connections, simulates cold loads and keep_alive residency, and
+counts requests the client cancelled by disconnecting.
+
+    python3 ollama_stub.py --port 11435 --model deepseek-coder:6.7b --reply-file reply.json
+
+    with OllamaStub(chunk_delay=0.01) as stub:
+        OllamaClient(stub.url).generate('deepseek-coder:6.7b', 'hi')
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Union
+
+DEFAULT_REPLY = json.dumps({
+    "analysis": "Stub analysis",
+    "fix_type": "other",
+    "fix_commands": ["echo 'stub fix'"],
+    "verification_steps": ["Re-run the test"],
+    "confidence": 0.5,
+    "expected_outcome": "Nothing changes; this is the Ollama stub"
+})
+
+Reply = Union[str, Callable[[Dict], str]]
+
+
+def _parse_keep_alive(value) -> float:
+    """Seconds a model stays loaded: numbers are seconds, strings like 5m/1h/30s."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'(-?\d+(?:\.\d+)?)(ms|s|m|h)?', str(value).strip())
+    if not match:
+        return 300.0
+    scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, None: 1}[match.group(2)]
+    return float(match.group(1)) * scale
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, chunks: Iterable[Dict]) -> bool:
+        """Write chunks as NDJSON with chunked encoding; False if the client went away."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                data = json.dumps(chunk).encode('utf-8') + b'\n'
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return False
+        return True
+
+    def do_GET(self):
+        stub = self.server.stub
+        if self.path == '/api/tags':
+            self._send_json(200, {'models': [stub.model_info(name) for name in stub.models]})
+        elif self.path == '/api/ps':
+            self._send_json(200, {'models': stub.loaded_models()})
+        elif self.path == '/api/version':
+            self._send_json(200, {'version': 'stub'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': 'invalid JSON body'})
+            return
+        if self.path not in ('/api/generate', '/api/chat'):
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        with stub.lock:
+            stub.requests.append({'path': self.path, 'body': body})
+        model = body.get('model', '')
+        if model not in stub.models:
+            self._send_json(404, {'error': f"model '{model}' not found, try pulling it first"})
+            return
+
+        load_seconds = stub.load(model, body.get('keep_alive'))
+        chat = self.path == '/api/chat'
+        prompt = body.get('prompt') if not chat else (body.get('messages') or [{}])[-1].get('content')
+        if not prompt:
+            # An empty request only loads (or with keep_alive 0, unloads) the model
+            done = {'model': model, 'created_at': _now(), 'done': True,
+                    'done_reason': 'unload' if model not in stub.resident else 'load'}
+            done.update({'message': {'role': 'assistant', 'content': ''}} if chat else {'response': ''})
+            self._send_json(200, done)
+            return
+
+        reply = stub.reply_for(model, body)
+        if body.get('stream', True) is False:
+            time.sleep(stub.chunk_delay * len(_pieces(reply)))
+            self._send_json(200, stub.final_chunk(model, chat, reply, load_seconds, content=reply))
+            return
+
+        def chunks():
+            for piece in _pieces(reply):
+                if stub.chunk_delay:
+                    time.sleep(stub.chunk_delay)
+                chunk = {'model': model, 'created_at': _now(), 'done': False}
+                chunk.update({'message': {'role': 'assistant', 'content': piece}} if chat else {'response': piece})
+                yield chunk
+            yield stub.final_chunk(model, chat, reply, load_seconds)
+
+        if not self._send_stream(chunks()):
+            with stub.lock:
+                stub.cancelled += 1
+
+
+def _pieces(text: str):
+    return re.findall(r'\s*\S+|\s+$', text) or ['']
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class OllamaStub:
+    """In-process Ollama stand-in; start() serves it from a background thread."""
+
+    def __init__(self, models: Optional[Dict[str, Reply]] = None, reply: Reply = DEFAULT_REPLY,
+                 chunk_delay: float = 0.0, load_delay: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.models = dict(models) if models else {'deepseek-coder:6.7b': reply, 'qwen2.5-coder:7b': reply}
+        self.chunk_delay = chunk_delay
+        self.load_delay = load_delay
+        self.lock = threading.Lock()
+        self.requests = []
+        self.cancelled = 0
+        self.loads = 0
+        self.resident = {}     # model -> expiry time
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_for(self, model: str, body: Dict) -> str:
+        reply = self.models[model]
+        return reply(body) if callable(reply) else reply
+
+    def load(self, model: str, keep_alive) -> float:
+        """Mark a model resident, sleeping load_delay on a cold load; returns load seconds."""
+        keep = _parse_keep_alive(keep_alive)
+        with self.lock:
+            cold = self.resident.get(model, 0) < time.time()
+            if keep == 0:
+                self.resident.pop(model, None)
+                return 0.0
+        if cold and self.load_delay:
+            time.sleep(self.load_delay)
+        with self.lock:
+            if cold:
+                self.loads += 1
+            self.resident[model] = float('inf') if keep < 0 else time.time() + keep
+        return self.load_delay if cold else 0.0
+
+    def loaded_models(self):
+        now = time.time()
+        with self.lock:
+            resident = {model: expiry for model, expiry in self.resident.items() if expiry >= now}
+        return [dict(self.model_info(model), expires_at=(
+            datetime.now(timezone.utc) + timedelta(seconds=min(expiry - now, 10 ** 8))).isoformat())
+            for model, expiry in resident.items()]
+
+    def model_info(self, name: str) -> Dict:
+        return {'name': name, 'model': name, 'size': 0, 'digest': 'stub',
+                'modified_at': _now(), 'details': {'family': name.split(':')[0]}}
+
+    def final_chunk(self, model: str, chat: bool, reply: str, load_seconds: float,
+                    content: str = '') -> Dict:
+        eval_count = len(_pieces(reply))
+        chunk = {
+            'model': model, 'created_at': _now(), 'done': True, 'done_reason': 'stop',
+            'load_duration': int(load_seconds * 1e9),
+            'prompt_eval_count': 1, 'eval_count': eval_count,
+            'eval_duration': int(eval_count * self.chunk_delay * 1e9),
+            'total_duration': int((load_seconds + eval_count * self.chunk_delay) * 1e9),
+        }
+        chunk.update({'message': {'role': 'assistant', 'content': content}} if chat else {'response': content})
+        return chunk
+
+    def start(self) -> 'OllamaStub':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='ollama-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama API stub server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--model', action='append', dest='models',
+                        help="Model to advertise (repeatable; default: deepseek-coder:6.7b, qwen2.5-coder:7b)")
+    parser.add_argument('--reply', default=DEFAULT_REPLY, help="Text every model replies with")
+    parser.add_argument('--reply-file', help="Read the reply from a file instead")
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument('--load-delay', type=float, default=0.0, help="Seconds a cold model load takes")
+    args = parser.parse_args()
+
+    reply = args.reply
+    if args.reply_file:
+        with open(args.reply_file) as f:
+            reply = f.read()
+    models = {name: reply for name in args.models} if args.models else None
+    stub = OllamaStub(models, reply, args.chunk_delay, args.load_delay, args.host, args.port)
+    print(f"🧪 Ollama stub listening on {stub.url} ({', '.join(stub.models)})")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
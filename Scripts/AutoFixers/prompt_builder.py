@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Prompt Builder
+Assembles the analysis prompt shared by all auto-fixers under a token budget.
+Error logs and model responses are deduplicated and cut down to their head
+and tail, historical context snippets are ranked by relevance to the current
+issue, and the tokens spent on each section are reported with the prompt.
+"""
+
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Approximate prompt size in tokens, overridable with $AI_FIX_PROMPT_TOKENS
+DEFAULT_TOKEN_BUDGET = 4000
+TOKEN_BUDGET_ENV = "AI_FIX_PROMPT_TOKENS"
+
+# Rough characters per token for English text and logs
+CHARS_PER_TOKEN = 4
+
+# Tokens reserved for the answer when sizing a local model's context window
+RESPONSE_TOKENS = 2048
+
+# Tokens of each log kept in the issue JSON written by test.sh; the prompt
+# builder trims further to fit the prompt budget
+ISSUE_LOG_TOKENS = 8000
+
+# Share of a truncated log kept from its start; the rest comes from its end
+LOG_HEAD_SHARE = 0.4
+
+# Longest single log line kept, in characters
+MAX_LOG_LINE_CHARS = 400
+
+# Lines shorter than this are only collapsed when repeated back to back;
+# longer ones are also dropped when they reappear later in the log
+MIN_DEDUPE_CHARS = 16
+
+# Relative claim of each variable section on the budget left after the fixed parts
+SECTION_WEIGHTS = {'history': 3.0, 'error_output': 2.0, 'actual_response': 1.0}
+
+# Prior relevance of historical context sections, keyed by their marker
+HISTORY_SECTION_PRIORS = {'🧩': 3.0, '🎯': 3.0, '🔎': 2.0, '💡': 2.0, '📊': 1.0, '🔧': 1.0}
+
+PREAMBLE = "You are an AI model testing expert with access to comprehensive historical data about previous fixes."
+
+FRAMEWORK_CONTEXT = """Context:
+- This is part of an automated testing framework for AI models
+- Models are run via Ollama
+- Tests check if models respond correctly to prompts
+- You have access to historical data about similar issues and their solutions
+- Learn from past successes and failures shown in the historical context"""
+
+_DIGITS = re.compile(r'\d+')
+_WORDS = re.compile(r'[a-z][a-z0-9_.:-]{2,}')
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def resolve_token_budget(budget: Optional[int] = None) -> int:
+    """Resolve the prompt budget from the argument, the environment or the default."""
+    if budget:
+        return int(budget)
+    try:
+        return int(os.environ.get(TOKEN_BUDGET_ENV) or DEFAULT_TOKEN_BUDGET)
+    except ValueError:
+        return DEFAULT_TOKEN_BUDGET
+
+
+def compact_log(text: str, max_tokens: Optional[int] = None, dedupe_all: bool = True) -> str:
+    """Deduplicate repeated log lines and keep the head and tail within max_tokens.
+
+    Runs of lines that only differ in their numbers (progress bars, retries
+    with timestamps) collapse to their last line with a repeat count. With
+    dedupe_all, longer lines seen verbatim earlier in the log are dropped as
+    well and counted on their first occurrence.
+    """
+    if not text:
+        return ''
+
+    entries = []    # [line, repeats]
+    seen = {}       # line -> index into entries
+    previous = None
+    for line in re.split(r'\r\n|\r|\n', text):
+        line = line.rstrip()
+        if len(line) > MAX_LOG_LINE_CHARS:
+            line = line[:MAX_LOG_LINE_CHARS] + ' …'
+        key = _DIGITS.sub('#', line.strip())
+        if entries and key == previous:
+            entries[-1][0] = line
+            entries[-1][1] += 1
+        elif dedupe_all and len(line) >= MIN_DEDUPE_CHARS and line in seen:
+            entries[seen[line]][1] += 1
+        else:
+            if len(line) >= MIN_DEDUPE_CHARS:
+                seen[line] = len(entries)
+            entries.append([line, 1])
+        previous = key
+
+    lines = [line if repeats == 1 or not line.strip() else f"{line}  [repeated {repeats} times]"
+             for line, repeats in entries]
+    while lines and not lines[-1].strip():
+        lines.pop()
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    compacted = '\n'.join(lines)
+    if max_tokens is None or estimate_tokens(compacted) <= max_tokens:
+        return compacted
+    return _head_and_tail(lines, max_tokens)
+
+
+def _head_and_tail(lines: List[str], max_tokens: int) -> str:
+    """Keep lines from both ends of a log, marking how many were left out."""
+    budget = max_tokens * CHARS_PER_TOKEN
+    marker_room = 40
+    head_budget = int((budget - marker_room) * LOG_HEAD_SHARE)
+    tail_budget = budget - marker_room - head_budget
+
+    head = []
+    used = 0
+    for line in lines:
+        if used + len(line) + 1 > head_budget:
+            break
+        head.append(line)
+        used += len(line) + 1
+
+    tail = []
+    used = 0
+    for line in reversed(lines[len(head):]):
+        if used + len(line) + 1 > tail_budget:
+            break
+        tail.append(line)
+        used += len(line) + 1
+    tail.reverse()
+
+    omitted = len(lines) - len(head) - len(tail)
+    if not head and not tail and lines:
+        # A single line larger than the whole budget: keep its end
+        return '… ' + lines[-1][-max(budget - 2, 0):]
+    return '\n'.join(head + [f"... [{omitted} lines omitted] ..."] + tail)
+
+
+def _terms(text: str) -> set:
+    return set(_WORDS.findall(text.lower()))
+
+
+def _allocate(budget: int, demands: Dict[str, int]) -> Dict[str, int]:
+    """Split budget by SECTION_WEIGHTS, handing what small sections leave over to the rest."""
+    allocation = {name: 0 for name in demands}
+    pending = {name for name, demand in demands.items() if demand > 0}
+    remaining = max(budget, 0)
+    while pending:
+        total_weight = sum(SECTION_WEIGHTS[name] for name in pending)
+        satisfied = [name for name in pending
+                     if demands[name] <= remaining * SECTION_WEIGHTS[name] / total_weight]
+        if not satisfied:
+            for name in pending:
+                allocation[name] = int(remaining * SECTION_WEIGHTS[name] / total_weight)
+            break
+        for name in satisfied:
+            allocation[name] = demands[name]
+            remaining -= demands[name]
+            pending.remove(name)
+    return allocation
+
+
+def select_history(context: str, issue_data: Dict, max_tokens: int) -> str:
+    """Fit build_context_for_ai output into max_tokens, keeping its most relevant snippets.
+
+    The context is split into sections and each section into its bullet
+    snippets. Snippets are scored by the prior of their section, their word
+    overlap with the current issue and whether they record a verified fix;
+    the best ones that fit are kept in their original order.
+    """
+    if estimate_tokens(context) <= max_tokens:
+        return context
+
+    blocks = [block for block in context.strip().split('\n\n') if block.strip()]
+    if blocks and blocks[0].startswith('==='):
+        header = blocks.pop(0)
+    else:
+        header = ''
+    footer = blocks.pop() if blocks and blocks[-1].startswith('===') else ''
+
+    query = _terms(' '.join(str(issue_data.get(field, '')) for field in
+                            ('model', 'issue_type', 'description', 'error_output')))
+    snippets = []   # (score, section index, snippet index, text)
+    sections = []   # (title, [snippets])
+    for section_index, block in enumerate(blocks):
+        title, *body = block.split('\n')
+        items = []
+        for line in body:
+            if line.startswith('  ') and items:
+                items[-1] += '\n' + line
+            else:
+                items.append(line)
+        sections.append((title, items))
+        prior = HISTORY_SECTION_PRIORS.get(title.strip()[:1], 1.0)
+        for item_index, item in enumerate(items):
+            terms = _terms(item)
+            overlap = len(terms & query) / len(terms) if terms else 0.0
+            verified = 0.5 if '✅' in item else 0.0
+            snippets.append((prior + overlap + verified, section_index, item_index, item))
+
+    used = estimate_tokens(header) + estimate_tokens(footer)
+    chosen = {}
+    for score, section_index, item_index, item in sorted(snippets, key=lambda s: (-s[0], s[1], s[2])):
+        cost = estimate_tokens(item) + 1
+        if section_index not in chosen:
+            cost += estimate_tokens(sections[section_index][0]) + 1
+        if used + cost > max_tokens:
+            continue
+        chosen.setdefault(section_index, set()).add(item_index)
+        used += cost
+
+    if not chosen:
+        return ''
+    parts = [header] if header else []
+    for section_index, (title, items) in enumerate(sections):
+        if section_index in chosen:
+            parts.append('\n'.join([title] + [item for i, item in enumerate(items)
+                                              if i in chosen[section_index]]))
+    if footer:
+        parts.append(footer)
+    return '\n\n'.join(parts)
+
+
+class PromptBuilder:
+    """Build fixer prompts within a token budget."""
+
+    def __init__(self, token_budget: Optional[int] = None):
+        self.token_budget = resolve_token_budget(token_budget)
+
+    def build(self, issue_data: Dict, historical_context: str, instructions: str) -> Tuple[str, Dict]:
+        """Return the prompt and its token usage; see build_parts().
+
+        For models without prompt caching: the instructions come last, right
+        after the issue they apply to.
+        """
+        parts, usage = self.build_parts(issue_data, historical_context, instructions)
+        ordered = [PREAMBLE, parts['history'], parts['issue'], FRAMEWORK_CONTEXT, instructions]
+        return '\n\n'.join(text for text in ordered if text), usage
+
+    def build_parts(self, issue_data: Dict, historical_context: str,
+                    instructions: str) -> Tuple[Dict[str, str], Dict]:
+        """Return the prompt as its 'static', 'history' and 'issue' parts, and its token usage.
+
+        The parts are ordered from most to least reusable so providers can
+        cache the prefix: the preamble and fixer instructions never change,
+        the history repeats for the same kind of issue. The static part and
+        the issue summary are always kept; the historical context, error
+        output and actual response share what is left of the budget. Usage
+        holds the budget, the total and the tokens of each section, plus the
+        sections that had to be cut.
+        """
+        static = '\n\n'.join([PREAMBLE, FRAMEWORK_CONTEXT, instructions])
+        summary = '\n'.join([
+            "Current Issue Details:",
+            f"- Model: {issue_data['model']}",
+            f"- Issue Type: {issue_data['issue_type']}",
+            f"- Description: {issue_data['description']}",
+            f"- Test Prompt: {issue_data.get('test_prompt', 'N/A')}",
+            f"- Expected Pattern: {issue_data.get('expected_pattern', 'N/A')}",
+        ])
+        fixed = {
+            'instructions': estimate_tokens(static),
+            'issue': estimate_tokens(summary),
+        }
+
+        error_output = compact_log(str(issue_data.get('error_output') or ''))
+        actual_response = compact_log(str(issue_data.get('actual_response') or ''), dedupe_all=False)
+        demands = {
+            'history': estimate_tokens(historical_context),
+            'error_output': estimate_tokens(error_output),
+            'actual_response': estimate_tokens(actual_response),
+        }
+        allocation = _allocate(self.token_budget - sum(fixed.values()), demands)
+
+        sections = {
+            'history': select_history(historical_context, issue_data, allocation['history']),
+            'error_output': compact_log(error_output, allocation['error_output']),
+            'actual_response': compact_log(actual_response, allocation['actual_response'], dedupe_all=False),
+        }
+        truncated = [name for name, text in sections.items()
+                     if estimate_tokens(text) < demands[name]]
+
+        parts = {
+            'static': static,
+            'history': sections['history'].strip(),
+            'issue': f"""{summary}
+- Error Output: {sections['error_output'] or 'N/A'}
+- Actual Response: {sections['actual_response'] or 'N/A'}""",
+        }
+
+        usage = dict(fixed)
+        usage.update({name: estimate_tokens(text) for name, text in sections.items()})
+        return parts, {
+            'budget': self.token_budget,
+            'total': estimate_tokens('\n\n'.join(text for text in parts.values() if text)),
+            'sections': usage,
+            'truncated': truncated,
+        }
+
+
+def format_usage(usage: Dict) -> str:
+    """One-line summary of a prompt's token usage."""
+    sections = ', '.join(f"{name} {tokens}" for name, tokens in usage['sections'].items())
+    cut = f"; trimmed {', '.join(usage['truncated'])}" if usage['truncated'] else ''
+    return f"Prompt ~{usage['total']}/{usage['budget']} tokens ({sections}{cut})"
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Provider Rate Limits
+Process-wide limits on how many analyses each fixer provider runs at once
+and how quickly they start, shared by batch fixing and race mode so that
+concurrent analyses cannot overrun the Claude API's rate limits or queue
+more generations on a local Ollama server than it runs in parallel.
+
+    AI_FIX_PROVIDER_LIMITS="claude=4/50,qwen=2"   # concurrency[/requests per minute]
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# provider -> (concurrent analyses, analyses started per minute; None is unlimited).
+# Local models default to the generations Ollama runs in parallel.
+DEFAULT_LIMITS = {
+    "claude": (4, 50),
+    "qwen": (None, None),
+    "deepseek": (None, None),
+}
+LIMITS_ENV = "AI_FIX_PROVIDER_LIMITS"
+
+# How often a waiting caller checks its cancel token
+CANCEL_POLL_SECONDS = 0.1
+
+
+def _ollama_parallel() -> int:
+    try:
+        return max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", 1)))
+    except ValueError:
+        return 1
+
+
+def parse_limits(spec: Optional[str]) -> Dict[str, Tuple[Optional[int], Optional[float]]]:
+    """Parse "provider=concurrency[/per_minute],..." into {provider: (concurrency, per_minute)}."""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        provider, value = item.split('=', 1)
+        concurrency, _, per_minute = value.partition('/')
+        try:
+            limits[provider.strip().lower()] = (int(concurrency) if concurrency.strip() else None,
+                                                float(per_minute) if per_minute.strip() else None)
+        except ValueError:
+            continue
+    return limits
+
+
+class ProviderLimiter:
+    """Bound the analyses in flight for one provider and space out their starts."""
+
+    def __init__(self, concurrency: int = 1, per_minute: Optional[float] = None):
+        self.concurrency = max(1, concurrency)
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    @contextmanager
+    def slot(self, cancel=None):
+        """Hold one of the provider's slots for the duration of a call.
+
+        Waiting stops early once the cancel token (ollama_client.CancelToken)
+        is cancelled; the call then runs with the cancelled token and
+        returns straight away.
+        """
+        acquired = False
+        while not acquired:
+            acquired = self._slots.acquire(timeout=CANCEL_POLL_SECONDS if cancel is not None else None)
+            if not acquired and cancel.cancelled:
+                break
+        try:
+            if acquired and self.interval:
+                with self._lock:
+                    now = time.monotonic()
+                    start = max(now, self._next_start)
+                    self._next_start = start + self.interval
+                if start > now:
+                    if cancel is not None:
+                        cancel.wait(start - now)
+                    else:
+                        time.sleep(start - now)
+            yield
+        finally:
+            if acquired:
+                self._slots.release()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    """Return the process-wide limiter for a provider ($AI_FIX_PROVIDER_LIMITS overrides the defaults)."""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            concurrency, per_minute = DEFAULT_LIMITS.get(provider, (None, None))
+            override = parse_limits(os.environ.get(LIMITS_ENV)).get(provider)
+            if override:
+                concurrency = override[0] or concurrency
+                per_minute = override[1] if override[1] is not None else per_minute
+            limiter = _limiters[provider] = ProviderLimiter(concurrency or _ollama_parallel(), per_minute)
+        return limiter
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Streaming Response Evaluator
+Runs a model test through the Ollama HTTP API and judges the reply while it
+streams: control sequences are stripped as chunks arrive, the reply is
+cleaned the way test.sh always cleaned `ollama run` output (the first ten
+non-empty lines, joined, whitespace collapsed), and the expected pattern is
+checked after every chunk. The request is cancelled on the server as soon
+as the pattern matches or a line, byte or token cap is reached, so a passing
+test takes time-to-match rather than time-to-end-of-generation.
+
+    python3 response_evaluator.py llama3:8b --prompt "What is 2+2?" --pattern ".*4.*" \\
+        --output Generated/test_response.txt --raw-output Generated/test_response_raw.txt
+
+Exit status: 0 matched, 1 did not match, 2 no output, 3 timed out or failed.
+"""
+
+import argparse
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ollama_client import CancelToken, OllamaCancelled, OllamaClient, OllamaError, get_client
+
+# Caps matching what the harness ever looked at (head -10), plus a bound on
+# runaway replies that never break a line
+MAX_LINES = 10
+MAX_BYTES = 16384
+MAX_TOKENS = 512
+
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+EXIT_CODES = {'matched': 0, 'mismatch': 1, 'no_output': 2, 'timeout': 3, 'error': 3}
+
+# Terminal control sequences: CSI (colors, cursor, spinner), OSC, and other
+# two-byte escapes; then the remaining C0 controls except tab and newline
+_ESCAPE = re.compile(r'\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])')
+_CONTROL = re.compile(r'[\x00-\x08\x0b-\x1f\x7f]')
+# An escape sequence cut off at the end of a chunk
+_PARTIAL_ESCAPE = re.compile(r'\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*)?$')
+# A $ outside a character class anchors the pattern to the end of the reply
+_END_ANCHOR = re.compile(r'(?<!\\)\$(?![^\[]*\])')
+
+
+class ControlStripper:
+    """Remove control sequences from streamed text, including ones split across chunks."""
+
+    def __init__(self):
+        self._pending = ''
+
+    def feed(self, text: str) -> str:
+        text = self._pending + text
+        partial = _PARTIAL_ESCAPE.search(text)
+        if partial:
+            text, self._pending = text[:partial.start()], text[partial.start():]
+        else:
+            self._pending = ''
+        return _CONTROL.sub('', _ESCAPE.sub('', text))
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ''
+        return _CONTROL.sub('', _ESCAPE.sub('', text))
+
+
+class StreamEvaluator:
+    """Match a pattern against a reply as it streams in.
+
+    feed() returns True once the outcome is settled: the pattern matched,
+    or a cap was reached. Patterns anchored at the end ($) can only be
+    judged on the complete reply, so they never settle early on a match.
+    """
+
+    def __init__(self, pattern: str, max_lines: int = MAX_LINES, max_bytes: int = MAX_BYTES):
+        self.regex = re.compile(pattern)
+        self.match_early = not _END_ANCHOR.search(pattern)
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.raw = []
+        self.raw_bytes = 0
+        self.lines: List[str] = []
+        self.partial = ''
+        self.matched = False
+        self.capped = False
+        self._stripper = ControlStripper()
+
+    @property
+    def cleaned(self) -> str:
+        """The judged text: kept lines joined without separators, whitespace collapsed."""
+        return re.sub(r'\s+', ' ', ''.join(self.lines) + self.partial)
+
+    def feed(self, text: str) -> bool:
+        self.raw.append(text)
+        self.raw_bytes += len(text.encode('utf-8'))
+        self._add(self._stripper.feed(text))
+        if self.match_early and self.regex.search(self.cleaned):
+            self.matched = True
+            return True
+        if len(self.lines) >= self.max_lines or self.raw_bytes >= self.max_bytes:
+            self.capped = True
+            return True
+        return False
+
+    def finish(self) -> bool:
+        """Judge the reply as it stands; returns whether the pattern matched."""
+        self._add(self._stripper.flush())
+        if self.partial and len(self.lines) < self.max_lines:
+            if self.partial.strip('\r'):
+                self.lines.append(self.partial)
+        self.partial = ''
+        self.matched = self.matched or self.regex.search(self.cleaned) is not None
+        return self.matched
+
+    def _add(self, text: str):
+        if len(self.lines) >= self.max_lines:
+            return
+        pieces = (self.partial + text.replace('\r', '')).split('\n')
+        self.partial = pieces.pop()
+        for line in pieces:
+            if line and len(self.lines) < self.max_lines:
+                self.lines.append(line)
+        if len(self.lines) >= self.max_lines:
+            self.partial = ''
+
+
+def evaluate(model: str, prompt: str, pattern: str, client: Optional[OllamaClient] = None,
+             timeout: float = DEFAULT_TIMEOUT_SECONDS, max_tokens: int = MAX_TOKENS,
+             max_lines: int = MAX_LINES, max_bytes: int = MAX_BYTES,
+             cancel: Optional[CancelToken] = None) -> Dict:
+    """Stream the model's reply to prompt and judge it against pattern.
+
+    Returns status (matched, mismatch, no_output, timeout or error), the
+    cleaned response and its kept lines, the raw text, whether generation
+    was stopped early, and timings. Closing the stream on a match or cap
+    drops the connection, which makes Ollama stop generating; a timeout
+    cancels the request the same way.
+    """
+    client = client or get_client()
+    cancel = cancel or CancelToken()
+    evaluator = StreamEvaluator(pattern, max_lines, max_bytes)
+    timer = threading.Timer(timeout, cancel.cancel)
+    timer.daemon = True
+    started = time.monotonic()
+    result = {'model': model, 'status': 'error', 'stopped_early': False, 'chunks': 0,
+              'first_chunk_seconds': None, 'error': None}
+    timer.start()
+    stream = client.stream_generate(model, prompt, options={'num_predict': max_tokens}, cancel=cancel)
+    try:
+        for chunk in stream:
+            piece = chunk.get('response', '')
+            if not piece:
+                continue
+            result['chunks'] += 1
+            if result['first_chunk_seconds'] is None:
+                result['first_chunk_seconds'] = time.monotonic() - started
+            if evaluator.feed(piece):
+                result['stopped_early'] = not chunk.get('done', False)
+                break
+        evaluator.finish()
+        result['status'] = ('matched' if evaluator.matched else
+                            'mismatch' if evaluator.cleaned.strip() else 'no_output')
+    except OllamaCancelled:
+        evaluator.finish()
+        result.update(status='timeout', error=f"No match within {timeout:g}s")
+    except OllamaError as e:
+        evaluator.finish()
+        result['error'] = str(e)
+    finally:
+        timer.cancel()
+        stream.close()
+    result.update(response=evaluator.cleaned.strip(), lines=evaluator.lines, raw=''.join(evaluator.raw),
+                  seconds=time.monotonic() - started)
+    return result
+
+
+def format_result(result: Dict) -> str:
+    """One-line summary of an evaluation."""
+    first = (f", first chunk {result['first_chunk_seconds']:.1f}s"
+             if result['first_chunk_seconds'] is not None else '')
+    early = ", stopped early" if result['stopped_early'] else ''
+    return f"{result['status']} in {result['seconds']:.1f}s ({result['chunks']} chunks{first}{early})"
+
+
+def _write(path: Optional[str], text: str):
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream a model test and match its reply as it arrives")
+    parser.add_argument('model')
+    parser.add_argument('--prompt', required=True)
+    parser.add_argument('--pattern', required=True, help="Regular expression the cleaned reply must contain")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS)
+    parser.add_argument('--max-tokens', type=int, default=MAX_TOKENS)
+    parser.add_argument('--max-lines', type=int, default=MAX_LINES)
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES)
+    parser.add_argument('--output', help="Write the kept, cleaned lines here")
+    parser.add_argument('--raw-output', help="Write the reply exactly as streamed here")
+    parser.add_argument('--error-file', help="Write errors here (emptied when there are none) instead of stderr")
+    parser.add_argument('--host', help="Ollama URL (default: $OLLAMA_HOST)")
+    args = parser.parse_args(argv)
+
+    try:
+        result = evaluate(args.model, args.prompt, args.pattern, get_client(args.host), args.timeout,
+                          args.max_tokens, args.max_lines, args.max_bytes)
+    except re.error as e:
+        result = {'status': 'error', 'error': f"Invalid pattern {args.pattern!r}: {e}", 'lines': [], 'raw': ''}
+    _write(args.output, ''.join(f"{line}\n" for line in result['lines']))
+    _write(args.raw_output, result['raw'])
+    if args.error_file:
+        _write(args.error_file, f"{result['error']}\n" if result['error'] else '')
+    elif result['error']:
+        print(result['error'], file=sys.stderr)
+    if 'seconds' in result:
+        print(format_result(result))
+    return EXIT_CODES[result['status']]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
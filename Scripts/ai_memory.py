@@ -5,115 +5,525 @@ Maintains persistent history of all fixes and builds institutional knowledge.
 Supports all AI providers (Claude, Qwen, etc.) with shared memory.
 """
 
+import argparse
+import atexit
+import functools
+import gzip
 import json
 import os
+import queue
 import sqlite3
+import tempfile
+import threading
 import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
 import hashlib
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import memory_aggregates
+import memory_cache
+import memory_retention
+from memory_schema import LATEST_VERSION, check_query_plans, get_schema_version, migrate
+
+# Columns selected for fix history rows (explicit so older databases that still
+# carry the legacy claude_analysis column map correctly)
+FIX_HISTORY_COLUMNS = ['id', 'timestamp', 'model_name', 'issue_type', 'issue_signature',
+                       'description', 'fixer_type', 'ai_analysis', 'fix_commands', 'fix_success',
+                       'verification_success', 'execution_time_seconds', 'system_info', 'notes',
+                       'error_output']
+FIX_HISTORY_SELECT = f"SELECT {', '.join(FIX_HISTORY_COLUMNS)} FROM fix_history"
+
+# Seconds a connection waits on a locked database before giving up
+BUSY_TIMEOUT_SECONDS = 30.0
+
+# Prepared statements kept per connection by the sqlite3 statement cache
+STATEMENT_CACHE_SIZE = 256
+
+# Rendered AI contexts kept in the in-process LRU cache
+CONTEXT_CACHE_SIZE = 256
+
+# Exact signature, same model + type and same type matches in one ranked pass.
+# Each branch keeps its own index-backed ORDER BY ... LIMIT; the outer sort only
+# touches at most three times the limit rows.
+_SIMILAR_BRANCH_COLUMNS = ', '.join(FIX_HISTORY_COLUMNS)
+SIMILAR_ISSUES_QUERY = f'''
+    SELECT match_rank, {_SIMILAR_BRANCH_COLUMNS} FROM (
+        SELECT 0 AS match_rank, 0 AS success_rank, {_SIMILAR_BRANCH_COLUMNS} FROM (
+            SELECT * FROM fix_history WHERE issue_signature = ?
+            ORDER BY timestamp DESC LIMIT ?)
+        UNION ALL
+        SELECT 1, fix_success, {_SIMILAR_BRANCH_COLUMNS} FROM (
+            SELECT * FROM fix_history WHERE model_name = ? AND issue_type = ?
+            ORDER BY fix_success DESC, timestamp DESC LIMIT ?)
+        UNION ALL
+        SELECT 2, fix_success, {_SIMILAR_BRANCH_COLUMNS} FROM (
+            SELECT * FROM fix_history WHERE issue_type = ?
+            ORDER BY fix_success DESC, timestamp DESC LIMIT ?)
+    )
+    ORDER BY match_rank, success_rank DESC, timestamp DESC
+'''
+MODEL_CHARACTERISTICS_COLUMNS = ['model_name', 'total_tests', 'success_rate', 'common_issues',
+                                 'effective_fixes', 'last_updated', 'performance_notes']
+MODEL_CHARACTERISTICS_QUERY = (f"SELECT {', '.join(MODEL_CHARACTERISTICS_COLUMNS)} FROM model_characteristics "
+                               "WHERE model_name = ?")
+EXPORT_MODELS_QUERY = (f"SELECT {', '.join(MODEL_CHARACTERISTICS_COLUMNS)} FROM model_characteristics "
+                       "ORDER BY model_name")
+
+ISSUE_PATTERN_COLUMNS = ['pattern_name', 'issue_signature', 'success_count', 'failure_count',
+                         'best_fix', 'last_seen', 'confidence_score']
+ISSUE_PATTERN_QUERY = f'''
+    SELECT {', '.join(ISSUE_PATTERN_COLUMNS)}
+    FROM issue_patterns WHERE issue_signature = ?
+    ORDER BY success_count + failure_count DESC LIMIT 1
+'''
+
+KB_STRATEGIES_QUERY = 'SELECT strategy FROM kb_strategies WHERE issue_type = ? ORDER BY id LIMIT 3'
+KB_TIP_CUTOFF_QUERY = '''
+    SELECT id FROM kb_model_tips WHERE model_name = ?
+    ORDER BY id DESC LIMIT 1 OFFSET ?
+'''
+KB_TRIM_TIPS_QUERY = 'DELETE FROM kb_model_tips WHERE model_name = ? AND id < ?'
+
+VECTOR_SYNC_QUERY = '''
+    SELECT id, description, error_output, ai_analysis FROM fix_history
+    WHERE id > ? ORDER BY id LIMIT ?
+'''
+
+STATS_SUMMARY_QUERY = '''
+    SELECT total_fixes, successful_fixes, models_seen, issue_types_seen
+    FROM memory_stats WHERE id = 1
+'''
+# Bumped by triggers on every history change, from any process
+GENERATION_QUERY = 'SELECT generation FROM memory_stats WHERE id = 1'
+STATS_RECENT_QUERY = 'SELECT COALESCE(SUM(attempts), 0) FROM stats_daily WHERE day >= ?'
+DAILY_ACTIVITY_QUERY = '''
+    SELECT day, attempts, successful FROM stats_daily
+    WHERE day >= ? ORDER BY day DESC
+'''
+
+RACE_STATS_QUERY = '''
+    SELECT fixer_type, outcome, latency_seconds FROM provider_races WHERE timestamp >= ?
+'''
+COMMAND_STATS_QUERY = '''
+    SELECT command, status, duration_seconds FROM command_runs WHERE timestamp >= ?
+'''
+VERIFICATION_STATS_QUERY = '''
+    SELECT model_name, passed, load_seconds, latency_seconds FROM fix_verifications
+    WHERE timestamp >= ?
+'''
+
+# Rows past their retention tier, oldest first
+PRUNE_BATCH_QUERY = f'''
+    {FIX_HISTORY_SELECT}
+    WHERE timestamp < ? AND (timestamp < ? OR NOT (fix_success = 1 AND verification_success = 1))
+    ORDER BY timestamp LIMIT ?
+'''
+EXPORT_FIXES_QUERY = f"{FIX_HISTORY_SELECT} WHERE id > ? ORDER BY id"
+
+RECENT_FIXES_QUERY = '''
+    SELECT timestamp, model_name, issue_type, fix_success, verification_success, ai_analysis
+    FROM fix_history WHERE timestamp > ? ORDER BY timestamp DESC
+'''
+# The reports rank the aggregate counters, which also cover pruned history;
+# pattern_name is "<issue_type>:<issue_signature>"
+SUCCESSFUL_STRATEGIES_QUERY = '''
+    SELECT p.pattern_name, f.successes, f.analysis
+    FROM pattern_fixes f JOIN issue_patterns p ON p.issue_signature = f.issue_signature
+    WHERE f.successes > 0
+    ORDER BY f.successes DESC
+    LIMIT ?
+'''
+RECURRING_ISSUES_QUERY = '''
+    SELECT issue_type, model_name, attempts, CAST(successes AS REAL) / attempts AS success_rate
+    FROM model_issue_counts
+    WHERE attempts > 1
+    ORDER BY attempts DESC, success_rate ASC
+'''
+
+# fix_history columns holding JSON, decoded in exports
+FIX_HISTORY_JSON_COLUMNS = ('fix_commands', 'system_info')
+
+# Bumped when the JSON Lines export layout changes
+EXPORT_FORMAT_VERSION = 1
+# Faster than gzip's default of 9 for a few percent larger files
+EXPORT_GZIP_LEVEL = 6
+
+SIMILAR_MATCH_KINDS = ('exact_matches', 'model_matches', 'type_matches')
+
+# Knowledge base limits and the free-form sections stored in kb_entries
+KB_VERSION = "1.0"
+KB_TIPS_PER_MODEL = 10
+KB_ENTRY_SECTIONS = ('general_patterns', 'failure_patterns')
+
+# Similar past fixes shown in the AI context, and the cosine similarity they need
+SIMILAR_FIXES_IN_CONTEXT = 3
+SIMILAR_FIX_MIN_SCORE = 0.3
+
+# fix_history rows embedded per batch while catching the vector index up
+VECTOR_SYNC_BATCH = 5000
+
+# Full-text search: BM25 column weights (description, ai_analysis, notes,
+# fix_commands) and the fix_history filters accepted by AIMemory.search
+SEARCH_WEIGHTS = (2.0, 1.0, 0.5, 1.0)
+SEARCH_FILTERS = {
+    'model_name': 'f.model_name = ?',
+    'issue_type': 'f.issue_type = ?',
+    'fixer_type': 'f.fixer_type = ?',
+    'fix_success': 'f.fix_success = ?',
+    'verification_success': 'f.verification_success = ?',
+    'since': 'f.timestamp >= ?',
+    'until': 'f.timestamp < ?',
+}
+
+
+def _search_query(conditions: List[str]) -> str:
+    """Full-text search over fix_history narrowed by the given WHERE conditions."""
+    columns = ', '.join(f'f.{column}' for column in FIX_HISTORY_COLUMNS)
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    return f'''
+        SELECT {columns}, bm25(fix_history_fts, {weights}) AS score,
+               snippet(fix_history_fts, -1, '[', ']', '...', 12)
+        FROM fix_history_fts JOIN fix_history f ON f.id = fix_history_fts.rowid
+        WHERE {' AND '.join(conditions)}
+        ORDER BY score LIMIT ?
+    '''
+
+
+# Every query the fix loop, the memory service and memory_cli.sh run, with
+# sample parameters; `ai_memory.py check-plans` runs EXPLAIN QUERY PLAN on
+# each, so the statements checked are the ones shipped
+HOT_QUERIES: Dict[str, Tuple[str, tuple]] = {
+    'similar_issues': (SIMILAR_ISSUES_QUERY, ('sig', 5, 'm', 't', 5, 't', 5)),
+    'model_characteristics': (MODEL_CHARACTERISTICS_QUERY, ('m',)),
+    'issue_pattern': (ISSUE_PATTERN_QUERY, ('sig',)),
+    'kb_strategies': (KB_STRATEGIES_QUERY, ('t',)),
+    'kb_tip_cutoff': (KB_TIP_CUTOFF_QUERY, ('m', 9)),
+    'kb_trim_tips': (KB_TRIM_TIPS_QUERY, ('m', 0)),
+    'vector_sync': (VECTOR_SYNC_QUERY, (0, 5000)),
+    'fts_search': (_search_query(['fix_history_fts MATCH ?', SEARCH_FILTERS['model_name']]),
+                   ('"timeout"', 'm', 20)),
+    'stats_summary': (STATS_SUMMARY_QUERY, ()),
+    'memory_generation': (GENERATION_QUERY, ()),
+    'stats_daily_recent': (STATS_RECENT_QUERY, ('2000-01-01',)),
+    'daily_activity': (DAILY_ACTIVITY_QUERY, ('2000-01-01',)),
+    'pattern_best_fix': (memory_aggregates.BEST_FIX_QUERY, ('sig',)),
+    'pattern_rows': (memory_aggregates.SIGNATURE_PATTERNS_QUERY, ('sig',)),
+    'model_issue_counts': (memory_aggregates.MODEL_ISSUES_QUERY, ('m',)),
+    'model_fix_counts': (memory_aggregates.MODEL_FIXES_QUERY, ('m', 3)),
+    'retention_expired': (PRUNE_BATCH_QUERY, ('2000-01-01', '1999-01-01', 5000)),
+    'export_models': (EXPORT_MODELS_QUERY, ()),
+    'export_fixes': (EXPORT_FIXES_QUERY, (0,)),
+    'cli_recent': (RECENT_FIXES_QUERY, ('2000-01-01',)),
+    'cli_successful': (SUCCESSFUL_STRATEGIES_QUERY, (10,)),
+    'cli_patterns': (RECURRING_ISSUES_QUERY, ()),
+    'race_stats': (RACE_STATS_QUERY, ('2000-01-01',)),
+    'command_stats': (COMMAND_STATS_QUERY, ('2000-01-01',)),
+    'verification_stats': (VERIFICATION_STATS_QUERY, ('2000-01-01',)),
+    'cache_lookup': (memory_cache.LOOKUP_QUERY, ('k',)),
+    'cache_expired': (memory_cache.EXPIRE_QUERY, ('2000-01-01',)),
+    'cache_evict': (memory_cache.EVICT_QUERY, (1000,)),
+    'cache_invalidate': (memory_cache.INVALIDATE_QUERY, ('sig', 'f', 'm', 'h')),
+}
+
+# Hot queries that read a whole table or index by design. Their cost grows
+# with the table, so each is listed here with the reason it is acceptable
+# rather than passing the check unnoticed.
+FULL_SCANS_ALLOWED: Dict[str, str] = {
+    # The export writes every model; the table holds one row per model
+    'export_models': 'export streams all of model_characteristics',
+    # Walks the last_used_at index up to the cache size to find the cutoff
+    'cache_evict': 'bounded by the analysis cache size',
+}
+
+
+def _percentile(values: List[float], share: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values, or None when there are none."""
+    return values[min(len(values) - 1, int(share * len(values)))] if values else None
+
+
+def _served(method):
+    """Route a public method through the memory service when one is running.
+    
+    Falls back to direct SQLite access when no service answers.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        client = self._service_client()
+        if client is not None:
+            from memory_service import ServiceUnavailable
+            try:
+                return client.call(method.__name__, *args, **kwargs)
+            except ServiceUnavailable:
+                self._service = None
+        return method(self, *args, **kwargs)
+    return wrapper
+
 
 class AIMemory:
-    def __init__(self, memory_dir: str = None):
-        """Initialize AI memory system."""
+    def __init__(self, memory_dir: str = None, reader_pool_size: int = 4, read_only: bool = False,
+                 use_service: bool = True):
+        """Initialize AI memory system.
+        
+        Nothing is opened until the first query: migrations and the knowledge
+        base import run then. A ``read_only`` handle skips both when the
+        database is already current, and refuses writes. Use get_memory() to
+        share one instance per memory directory.
+        
+        While a memory service (memory_service.py) listens on its socket,
+        the fix loop's writes and context queries go through it instead of
+        SQLite (see memory_service for the maintenance writes that don't); pass
+        ``use_service=False`` to always access the database directly.
+        """
         self.memory_dir = memory_dir or os.path.join(os.path.dirname(__file__), "..", "AIMemory")
-        os.makedirs(self.memory_dir, exist_ok=True)
         
         self.db_path = os.path.join(self.memory_dir, "ai_memory.db")
         self.knowledge_base_path = os.path.join(self.memory_dir, "knowledge_base.json")
         
-        self._init_database()
-        self._load_knowledge_base()
+        # Long-lived connections: one WAL writer guarded by a lock, plus a
+        # bounded pool of read-only readers handed out per query
+        self.reader_pool_size = max(1, reader_pool_size)
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._readers_opened = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        
+        # Rendered contexts keyed by issue identity plus the memory generation
+        # stored in the database, so a write from any process retires them
+        self._context_cache = OrderedDict()
+        self._context_cache_lock = threading.Lock()
+        
+        # Similarity index over past fixes, opened on first use
+        self._vector_index = None
+        self._vector_lock = threading.Lock()
+        self._partition_thread = None
+        
+        self.read_only = read_only
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._init_thread = None
+        
+        # Read-only handles always read the database directly
+        self.use_service = use_service and not read_only
+        self._service = None
 
-    def _init_database(self):
-        """Initialize SQLite database for fix history."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create tables
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS fix_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                model_name TEXT NOT NULL,
-                issue_type TEXT NOT NULL,
-                issue_signature TEXT NOT NULL,  -- Hash of issue characteristics
-                description TEXT NOT NULL,
-                fixer_type TEXT NOT NULL,       -- Type of AI fixer used (claude, qwen, etc.)
-                ai_analysis TEXT NOT NULL,      -- AI analysis from any provider
-                fix_commands TEXT NOT NULL,     -- JSON array
-                fix_success BOOLEAN NOT NULL,
-                verification_success BOOLEAN NOT NULL,
-                execution_time_seconds REAL,
-                system_info TEXT NOT NULL,     -- JSON
-                notes TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS issue_patterns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pattern_name TEXT UNIQUE NOT NULL,
-                issue_signature TEXT NOT NULL,
-                success_count INTEGER DEFAULT 0,
-                failure_count INTEGER DEFAULT 0,
-                best_fix TEXT,              -- JSON of most successful fix
-                last_seen TEXT,
-                confidence_score REAL DEFAULT 0.0
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS model_characteristics (
-                model_name TEXT PRIMARY KEY,
-                total_tests INTEGER DEFAULT 0,
-                success_rate REAL DEFAULT 0.0,
-                common_issues TEXT,         -- JSON array
-                effective_fixes TEXT,       -- JSON array  
-                last_updated TEXT,
-                performance_notes TEXT
-            )
-        ''')
-        
-        # Add migration for existing databases to add fixer_type column
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
         try:
-            cursor.execute('ALTER TABLE fix_history ADD COLUMN fixer_type TEXT NOT NULL DEFAULT "claude"')
-        except sqlite3.OperationalError:
-            # Column already exists
+            self.close()
+        except Exception:
             pass
-        
-        # Migrate claude_analysis column to ai_analysis
+
+    def close(self):
+        """Close the writer and every pooled reader connection."""
+        if not hasattr(self, '_write_lock'):
+            return
+        with self._write_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._writer is not None:
+                # Refresh planner statistics for the indexes before closing
+                self._writer.execute('PRAGMA optimize')
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        # Let a running partition build finish swapping its files in
+        partition_thread = self._partition_thread
+        if partition_thread is not None:
+            partition_thread.join()
+
+    def _service_client(self):
+        """Client for the memory service, or None when no socket exists."""
+        if not self.use_service:
+            return None
+        if self._service is None:
+            from memory_service import MemoryClient, default_socket_path
+            socket_path = default_socket_path(self.memory_dir)
+            if not os.path.exists(socket_path):
+                return None
+            self._service = MemoryClient(socket_path)
+        return self._service
+
+    def _ensure_initialized(self):
+        """Bring the database up to date the first time a connection is needed."""
+        if self._initialized or self._init_thread == threading.get_ident():
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            self._init_thread = threading.get_ident()
+            try:
+                os.makedirs(self.memory_dir, exist_ok=True)
+                # Read-only handles still bring a missing or outdated database
+                # up to date, which happens once after an upgrade
+                if not self.read_only or self._schema_outdated():
+                    self._init_database()
+                    self._load_knowledge_base()
+                self._initialized = True
+            finally:
+                self._init_thread = None
+
+    def _open_connection(self, read_only: bool = False) -> sqlite3.Connection:
+        """Open a connection tuned for concurrent access."""
+        if read_only:
+            uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_SECONDS,
+                                   check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+            conn.execute('PRAGMA query_only = ON')
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS,
+                                   check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    @contextmanager
+    def _write_connection(self):
+        """Yield the shared writer connection inside a transaction."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("AIMemory has been closed")
+        # Initialization takes _init_lock and then _write_lock, so it has to
+        # happen before this thread holds _write_lock
+        self._ensure_initialized()
+        with self._write_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("AIMemory has been closed")
+            if self.read_only and self._init_thread != threading.get_ident():
+                raise sqlite3.OperationalError("AIMemory was opened read-only")
+            if self._writer is None:
+                self._writer = self._open_connection()
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def _read_connection(self):
+        """Borrow a read-only connection from the pool."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("AIMemory has been closed")
+        self._ensure_initialized()
         try:
-            cursor.execute('ALTER TABLE fix_history ADD COLUMN ai_analysis TEXT')
-            cursor.execute('UPDATE fix_history SET ai_analysis = claude_analysis WHERE ai_analysis IS NULL')
-            # Note: We keep claude_analysis for backward compatibility
-        except sqlite3.OperationalError:
-            # Column already exists or migration already done
-            pass
-        
-        conn.commit()
-        conn.close()
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._readers_opened < self.reader_pool_size
+                if can_open:
+                    self._readers_opened += 1
+            if can_open:
+                try:
+                    conn = self._open_connection(read_only=True)
+                except sqlite3.Error:
+                    with self._pool_lock:
+                        self._readers_opened -= 1
+                    raise
+            else:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def _schema_outdated(self) -> bool:
+        """Whether the database is missing or has migrations pending."""
+        if not os.path.exists(self.db_path):
+            return True
+        with self._read_connection() as conn:
+            return get_schema_version(conn) < LATEST_VERSION
+
+    def _init_database(self):
+        """Initialize SQLite database for fix history, applying pending migrations."""
+        with self._write_connection() as conn:
+            migrate(conn)
+
+    def find_table_scans(self) -> Dict[str, List[str]]:
+        """Return hot queries whose query plan falls back to a full table scan."""
+        with self._read_connection() as conn:
+            return check_query_plans(conn, HOT_QUERIES, FULL_SCANS_ALLOWED)
 
     def _load_knowledge_base(self):
-        """Load accumulated knowledge base."""
+        """Import a legacy knowledge_base.json into the knowledge base tables once."""
+        with self._read_connection() as conn:
+            imported = conn.execute("SELECT 1 FROM kb_meta WHERE key = 'json_imported_at'").fetchone()
+        if imported:
+            return
+        
+        legacy = {}
         if os.path.exists(self.knowledge_base_path):
             with open(self.knowledge_base_path, 'r') as f:
-                self.knowledge_base = json.load(f)
-        else:
-            self.knowledge_base = {
-                "general_patterns": {},
-                "model_specific_tips": {},
-                "successful_strategies": {},
-                "failure_patterns": {},
-                "version": "1.0",
-                "last_updated": datetime.now().isoformat()
-            }
+                legacy = json.load(f)
+        
+        with self._write_connection() as conn:
+            # Another process may have imported while we were reading
+            if conn.execute("SELECT 1 FROM kb_meta WHERE key = 'json_imported_at'").fetchone():
+                return
+            now = datetime.now().isoformat()
+            for issue_type, strategies in legacy.get('successful_strategies', {}).items():
+                conn.executemany(
+                    'INSERT OR IGNORE INTO kb_strategies (issue_type, strategy, created_at) VALUES (?, ?, ?)',
+                    [(issue_type, strategy, now) for strategy in strategies])
+            for model_name, tips in legacy.get('model_specific_tips', {}).items():
+                conn.executemany(
+                    'INSERT OR IGNORE INTO kb_model_tips (model_name, tip, created_at) VALUES (?, ?, ?)',
+                    [(model_name, tip, now) for tip in tips[-KB_TIPS_PER_MODEL:]])
+            for section in KB_ENTRY_SECTIONS:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO kb_entries (section, entry_key, value) VALUES (?, ?, ?)',
+                    [(section, key, json.dumps(value)) for key, value in legacy.get(section, {}).items()])
+            conn.executemany('INSERT OR REPLACE INTO kb_meta (key, value) VALUES (?, ?)', [
+                ('version', legacy.get('version', KB_VERSION)),
+                ('last_updated', legacy.get('last_updated', now)),
+                ('json_imported_at', now),
+            ])
 
-    def _save_knowledge_base(self):
-        """Save knowledge base to disk."""
-        self.knowledge_base["last_updated"] = datetime.now().isoformat()
-        with open(self.knowledge_base_path, 'w') as f:
-            json.dump(self.knowledge_base, f, indent=2)
+    @property
+    def knowledge_base(self) -> Dict:
+        """Materialize the knowledge base in its historical JSON layout."""
+        with self._read_connection() as conn:
+            strategies = conn.execute(
+                'SELECT issue_type, strategy FROM kb_strategies ORDER BY issue_type, id').fetchall()
+            tips = conn.execute(
+                'SELECT model_name, tip FROM kb_model_tips ORDER BY model_name, id').fetchall()
+            entries = conn.execute('SELECT section, entry_key, value FROM kb_entries').fetchall()
+            meta = dict(conn.execute('SELECT key, value FROM kb_meta').fetchall())
+        
+        knowledge_base = {
+            "general_patterns": {},
+            "model_specific_tips": {},
+            "successful_strategies": {},
+            "failure_patterns": {},
+            "version": meta.get('version', KB_VERSION),
+            "last_updated": meta.get('last_updated')
+        }
+        for issue_type, strategy in strategies:
+            knowledge_base['successful_strategies'].setdefault(issue_type, []).append(strategy)
+        for model_name, tip in tips:
+            knowledge_base['model_specific_tips'].setdefault(model_name, []).append(tip)
+        for section, key, value in entries:
+            knowledge_base.setdefault(section, {})[key] = json.loads(value)
+        return knowledge_base
 
     def generate_issue_signature(self, issue_data: Dict) -> str:
         """Generate a unique signature for an issue type."""
@@ -128,72 +538,164 @@ class AIMemory:
         signature_text = "|".join(signature_parts)
         return hashlib.md5(signature_text.encode()).hexdigest()[:16]
 
+    @_served
     def query_similar_issues(self, issue_data: Dict, limit: int = 5) -> List[Dict]:
         """Find similar issues from history."""
         issue_signature = self.generate_issue_signature(issue_data)
         model_name = issue_data.get('model', '')
         issue_type = issue_data.get('issue_type', '')
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Query for exact matches first
-        cursor.execute('''
-            SELECT * FROM fix_history 
-            WHERE issue_signature = ? 
-            ORDER BY timestamp DESC LIMIT ?
-        ''', (issue_signature, limit))
-        exact_matches = cursor.fetchall()
-        
-        # Query for same model + issue type
-        cursor.execute('''
-            SELECT * FROM fix_history 
-            WHERE model_name = ? AND issue_type = ? 
-            ORDER BY fix_success DESC, timestamp DESC LIMIT ?
-        ''', (model_name, issue_type, limit))
-        model_matches = cursor.fetchall()
-        
-        # Query for same issue type (any model)
-        cursor.execute('''
-            SELECT * FROM fix_history 
-            WHERE issue_type = ? 
-            ORDER BY fix_success DESC, timestamp DESC LIMIT ?
-        ''', (issue_type, limit))
-        type_matches = cursor.fetchall()
-        
-        conn.close()
-        
-        # Convert to dict format
-        columns = ['id', 'timestamp', 'model_name', 'issue_type', 'issue_signature', 
-                  'description', 'ai_analysis', 'fix_commands', 'fix_success', 
-                  'verification_success', 'execution_time_seconds', 'system_info', 'notes']
-        
-        def row_to_dict(row):
-            return dict(zip(columns, row))
+        with self._read_connection() as conn:
+            rows = conn.execute(SIMILAR_ISSUES_QUERY, (
+                issue_signature, limit,
+                model_name, issue_type, limit,
+                issue_type, limit
+            )).fetchall()
         
-        return {
-            'exact_matches': [row_to_dict(row) for row in exact_matches],
-            'model_matches': [row_to_dict(row) for row in model_matches],
-            'type_matches': [row_to_dict(row) for row in type_matches]
-        }
+        similar = {kind: [] for kind in SIMILAR_MATCH_KINDS}
+        for row in rows:
+            similar[SIMILAR_MATCH_KINDS[row[0]]].append(dict(zip(FIX_HISTORY_COLUMNS, row[1:])))
+        return similar
 
-    def get_model_insights(self, model_name: str) -> Dict:
-        """Get accumulated insights about a specific model."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _get_vector_index(self):
+        """Open the similarity index, or return None when numpy is unavailable."""
+        with self._vector_lock:
+            if self._vector_index is None:
+                # Imported on first use so commands that never search skip numpy
+                try:
+                    from memory_vectors import VectorIndex
+                except ImportError:
+                    # numpy is optional; similarity retrieval is disabled without it
+                    self._vector_index = False
+                else:
+                    self._vector_index = VectorIndex(os.path.join(self.memory_dir, "vectors"))
+        return None if self._vector_index is False else self._vector_index
+
+    @staticmethod
+    def _fix_text(description: str, error_output: str, analysis: str) -> str:
+        """Text embedded for a recorded fix."""
+        return "\n".join(part for part in (description, error_output, analysis) if part)
+
+    def _sync_vector_index(self):
+        """Embed fix_history rows the similarity index has not seen yet."""
+        index = self._get_vector_index()
+        if index is None:
+            return
+        while True:
+            with self._read_connection() as conn:
+                rows = conn.execute(VECTOR_SYNC_QUERY, (index.max_fix_id, VECTOR_SYNC_BATCH)).fetchall()
+            if not rows:
+                return
+            index.add([row[0] for row in rows], [self._fix_text(*row[1:]) for row in rows])
+            if len(rows) < VECTOR_SYNC_BATCH:
+                break
+        if index.needs_partitioning():
+            self._partition_in_background(index)
+
+    def _partition_in_background(self, index):
+        """Fold new rows into the index partitions without holding up the caller."""
+        with self._vector_lock:
+            if self._partition_thread is not None and self._partition_thread.is_alive():
+                return
+            self._partition_thread = threading.Thread(target=index.partition, name="memory-vector-partition",
+                                                      daemon=True)
+            self._partition_thread.start()
+
+    @_served
+    def find_similar_fixes_batch(self, issues: List[Dict], k: int = 5) -> List[List[Dict]]:
+        """Retrieve the k most similar past fixes for each issue in one batched search."""
+        index = self._get_vector_index()
+        if index is None or not issues:
+            return [[] for _ in issues]
+        self._sync_vector_index()
+        
+        queries = [self._fix_text(issue.get('description', ''), issue.get('error_output', ''),
+                                  issue.get('actual_response', '')) for issue in issues]
+        hits = index.search_texts(queries, k)
         
-        # Get model characteristics
-        cursor.execute('SELECT * FROM model_characteristics WHERE model_name = ?', (model_name,))
-        result = cursor.fetchone()
+        wanted = sorted({fix_id for issue_hits in hits for fix_id, _ in issue_hits})
+        rows = {}
+        if wanted:
+            placeholders = ', '.join('?' * len(wanted))
+            with self._read_connection() as conn:
+                for row in conn.execute(f"{FIX_HISTORY_SELECT} WHERE id IN ({placeholders})", wanted):
+                    rows[row[0]] = dict(zip(FIX_HISTORY_COLUMNS, row))
+        
+        return [[dict(rows[fix_id], similarity=score) for fix_id, score in issue_hits if fix_id in rows]
+                for issue_hits in hits]
+
+    @_served
+    def find_similar_fixes(self, issue_data: Dict, k: int = 5) -> List[Dict]:
+        """Retrieve the k most similar past fixes by description, error output and analysis."""
+        return self.find_similar_fixes_batch([issue_data], k)[0]
+
+    def rebuild_vector_index(self):
+        """Catch the similarity index up with history and retrain its partitions."""
+        index = self._get_vector_index()
+        if index is None:
+            raise RuntimeError("numpy is required for the similarity index: pip3 install numpy")
+        self._sync_vector_index()
+        index.rebuild()
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Turn free text such as a pasted error message into an FTS5 query.
+        
+        Every whitespace-separated term is quoted so punctuation is matched
+        literally; a trailing * keeps prefix matching.
+        """
+        terms = []
+        for term in query.split():
+            prefix = term.endswith('*') and len(term) > 1
+            term = term.rstrip('*') if prefix else term
+            terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+        return ' '.join(terms)
+
+    @_served
+    def search(self, query: str, filters: Optional[Dict] = None, limit: int = 20,
+               raw: bool = False) -> List[Dict]:
+        """Full-text search over past fixes, best BM25 matches first.
+        
+        All terms must match in description, AI analysis, notes or fix
+        commands. ``filters`` narrows results by any key of SEARCH_FILTERS;
+        pass ``raw=True`` to use FTS5 query syntax (OR, NEAR, column:term).
+        """
+        filters = filters or {}
+        unknown = set(filters) - set(SEARCH_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown search filters: {', '.join(sorted(unknown))}")
+        
+        match = query if raw else self._fts_query(query)
+        if not match:
+            return []
+        
+        conditions = ['fix_history_fts MATCH ?']
+        params: List = [match]
+        for key, value in filters.items():
+            if value is not None:
+                conditions.append(SEARCH_FILTERS[key])
+                params.append(value)
+        params.append(limit)
+        
+        with self._read_connection() as conn:
+            rows = conn.execute(_search_query(conditions), params).fetchall()
+        
+        results = []
+        for row in rows:
+            result = dict(zip(FIX_HISTORY_COLUMNS, row))
+            # bm25() is lower for better matches; report it as a positive score
+            result['score'] = -row[-2]
+            result['snippet'] = row[-1]
+            results.append(result)
+        return results
+
+    def _get_model_characteristics(self, model_name: str) -> Dict:
+        """Get the stored characteristics row for a model, or defaults."""
+        with self._read_connection() as conn:
+            result = conn.execute(MODEL_CHARACTERISTICS_QUERY, (model_name,)).fetchone()
         
         if result:
-            columns = ['model_name', 'total_tests', 'success_rate', 'common_issues', 
-                      'effective_fixes', 'last_updated', 'performance_notes']
-            model_data = dict(zip(columns, result))
-            
-            # Parse JSON fields
-            model_data['common_issues'] = json.loads(model_data['common_issues'] or '[]')
-            model_data['effective_fixes'] = json.loads(model_data['effective_fixes'] or '[]')
+            model_data = self._model_characteristics_row(result)
         else:
             model_data = {
                 'model_name': model_name,
@@ -204,40 +706,82 @@ class AIMemory:
                 'last_updated': None,
                 'performance_notes': None
             }
+        return model_data
+
+    @staticmethod
+    def _model_characteristics_row(row: tuple) -> Dict:
+        """Turn a model_characteristics row into a dict with its JSON fields parsed."""
+        model_data = dict(zip(MODEL_CHARACTERISTICS_COLUMNS, row))
+        model_data['common_issues'] = json.loads(model_data['common_issues'] or '[]')
+        model_data['effective_fixes'] = json.loads(model_data['effective_fixes'] or '[]')
+        return model_data
+
+    @_served
+    def get_issue_pattern(self, issue_data: Dict) -> Optional[Dict]:
+        """Get the aggregated pattern for an issue's signature, if one was recorded."""
+        with self._read_connection() as conn:
+            row = conn.execute(ISSUE_PATTERN_QUERY, (self.generate_issue_signature(issue_data),)).fetchone()
+        if not row:
+            return None
+        pattern = dict(zip(ISSUE_PATTERN_COLUMNS, row))
+        pattern['best_fix'] = json.loads(pattern['best_fix']) if pattern['best_fix'] else None
+        return pattern
+
+    @_served
+    def get_model_insights(self, model_name: str) -> Dict:
+        """Get accumulated insights about a specific model."""
+        model_data = self._get_model_characteristics(model_name)
         
-        # Get recent fix history for this model
-        cursor.execute('''
-            SELECT issue_type, fix_success, ai_analysis, timestamp 
-            FROM fix_history 
-            WHERE model_name = ? 
-            ORDER BY timestamp DESC LIMIT 10
-        ''', (model_name,))
-        recent_history = cursor.fetchall()
-        
-        conn.close()
+        # Per issue type counters, kept with the aggregates
+        with self._read_connection() as conn:
+            issue_counts = conn.execute(memory_aggregates.MODEL_ISSUES_QUERY, (model_name,)).fetchall()
         
-        model_data['recent_history'] = [
+        model_data['issue_history'] = [
             {
-                'issue_type': row[0],
-                'success': bool(row[1]),
-                'analysis': row[2],
-                'timestamp': row[3]
+                'issue_type': issue_type,
+                'attempts': attempts,
+                'successes': successes,
+                'success_rate': successes / attempts if attempts else 0.0
             }
-            for row in recent_history
+            for issue_type, attempts, successes in issue_counts
         ]
         
         return model_data
 
+    @_served
     def build_context_for_ai(self, issue_data: Dict) -> str:
         """Build rich historical context for AI analysis."""
         model_name = issue_data.get('model', '')
         issue_type = issue_data.get('issue_type', '')
         
+        # The signature only covers the model family, so the full model name
+        # is part of the key as well
+        with self._read_connection() as conn:
+            generation = (conn.execute(GENERATION_QUERY).fetchone() or (0,))[0]
+        cache_key = (self.generate_issue_signature(issue_data), model_name, issue_type, generation)
+        with self._context_cache_lock:
+            cached = self._context_cache.get(cache_key)
+            if cached is not None:
+                self._context_cache.move_to_end(cache_key)
+                return cached
+        
+        context = self._render_context(issue_data, model_name, issue_type)
+        
+        with self._context_cache_lock:
+            self._context_cache[cache_key] = context
+            while len(self._context_cache) > CONTEXT_CACHE_SIZE:
+                self._context_cache.popitem(last=False)
+        return context
+
+    def _render_context(self, issue_data: Dict, model_name: str, issue_type: str) -> str:
+        """Render the historical context string from memory."""
         # Get similar issues
         similar_issues = self.query_similar_issues(issue_data, limit=3)
         
-        # Get model insights
-        model_insights = self.get_model_insights(model_name)
+        # Get precomputed aggregates (recent history is not part of the context)
+        model_insights = self._get_model_characteristics(model_name)
+        issue_pattern = self.get_issue_pattern(issue_data)
+        similar_fixes = self.find_similar_fixes(issue_data, k=SIMILAR_FIXES_IN_CONTEXT * 2)
         
         # Build context string
         context_parts = []
@@ -260,6 +804,17 @@ class AIMemory:
             if model_insights['performance_notes']:
                 context_parts.append(f"- Notes: {model_insights['performance_notes']}")
         
+        # Add the aggregated pattern for this exact issue signature
+        if issue_pattern:
+            context_parts.append(
+                f"\n🧩 Known issue pattern: {issue_pattern['success_count']} verified fixes, "
+                f"{issue_pattern['failure_count']} failures "
+                f"(confidence {issue_pattern['confidence_score']:.0%})")
+            best_fix = issue_pattern['best_fix']
+            if best_fix and best_fix['fix_commands']:
+                context_parts.append(f"- Best fix ({best_fix['successes']}x verified): "
+                                     f"{'; '.join(str(c) for c in best_fix['fix_commands'])}")
+        
         # Add similar issue patterns
         if similar_issues['exact_matches']:
             context_parts.append(f"\n🎯 Exact matches found ({len(similar_issues['exact_matches'])}):")
@@ -285,11 +840,29 @@ class AIMemory:
                 success_str = "✅ SUCCESS" if match['fix_success'] else "❌ FAILED"
                 context_parts.append(f"- {success_str}: {match['description'][:80]}...")
         
+        # Add semantically similar fixes not already shown as exact matches
+        shown = {match['id'] for match in similar_issues['exact_matches'][:2]}
+        similar_fixes = [fix for fix in similar_fixes
+                         if fix['id'] not in shown and fix['similarity'] >= SIMILAR_FIX_MIN_SCORE]
+        if similar_fixes:
+            context_parts.append(f"\n🔎 Similar past fixes:")
+            for fix in similar_fixes[:SIMILAR_FIXES_IN_CONTEXT]:
+                success_str = "✅ SUCCESS" if fix['fix_success'] and fix['verification_success'] else "❌ FAILED"
+                context_parts.append(f"- {success_str} ({fix['similarity']:.2f}, {fix['model_name']}): "
+                                     f"{(fix['ai_analysis'] or '')[:100]}...")
+                try:
+                    commands = json.loads(fix['fix_commands'] or '[]')
+                except json.JSONDecodeError:
+                    commands = []
+                if commands:
+                    context_parts.append(f"  Fix: {commands[0]}")
+        
         # Add knowledge base insights
-        if issue_type in self.knowledge_base.get('successful_strategies', {}):
-            strategies = self.knowledge_base['successful_strategies'][issue_type]
+        with self._read_connection() as conn:
+            strategies = conn.execute(KB_STRATEGIES_QUERY, (issue_type,)).fetchall()
+        if strategies:
             context_parts.append(f"\n💡 Known successful strategies for {issue_type}:")
-            for strategy in strategies[:3]:
+            for (strategy,) in strategies:
                 context_parts.append(f"- {strategy}")
         
         context_parts.append("\n=== END HISTORICAL CONTEXT ===\n")
@@ -300,94 +873,339 @@ class AIMemory:
                           fix_success: bool, verification_success: bool, 
                           execution_time: float, notes: str = None, fixer_type: str = "claude") -> int:
         """Record a fix attempt in the history."""
+        return self.record_fix_attempts_bulk([{
+            'issue_data': issue_data,
+            'ai_response': ai_response,
+            'fix_success': fix_success,
+            'verification_success': verification_success,
+            'execution_time': execution_time,
+            'notes': notes,
+            'fixer_type': fixer_type
+        }])[0]
+
+    @_served
+    def record_fix_attempts_bulk(self, attempts: List[Dict]) -> List[int]:
+        """Record many fix attempts in a single transaction.
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Insert fix record
-        analysis = ai_response.get('analysis', '')
-        cursor.execute('''
-            INSERT INTO fix_history 
-            (timestamp, model_name, issue_type, issue_signature, description, 
-             fixer_type, ai_analysis, fix_commands, fix_success, verification_success, 
-             execution_time_seconds, system_info, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            issue_data.get('model', ''),
-            issue_data.get('issue_type', ''),
-            self.generate_issue_signature(issue_data),
-            issue_data.get('description', ''),
-            fixer_type,
-            analysis,
-            json.dumps(ai_response.get('fix_commands', [])),
-            fix_success,
-            verification_success,
-            execution_time,
-            json.dumps(issue_data.get('test_environment', {})),
-            notes
-        ))
-        
-        fix_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        # Update knowledge base
-        self._update_knowledge_base(issue_data, ai_response, fix_success)
-        
-        return fix_id
-
-    def _update_knowledge_base(self, issue_data: Dict, ai_response: Dict, success: bool):
-        """Update the knowledge base with new learnings."""
-        issue_type = issue_data.get('issue_type', '')
-        model_name = issue_data.get('model', '')
+        Each attempt is a dict holding the record_fix_attempt arguments:
+        issue_data, ai_response, fix_success, verification_success,
+        execution_time and optionally notes and fixer_type (default "claude").
+        Returns the new fix_history IDs in the order given.
+        """
+        if not attempts:
+            return []
+        
+        timestamp = datetime.now().isoformat()
+        rows = []
+        aggregates = []
+        for attempt in attempts:
+            issue_data = attempt['issue_data']
+            ai_response = attempt['ai_response']
+            issue_signature = self.generate_issue_signature(issue_data)
+            fix_commands = ai_response.get('fix_commands', [])
+            rows.append((
+                timestamp,
+                issue_data.get('model', ''),
+                issue_data.get('issue_type', ''),
+                issue_signature,
+                issue_data.get('description', ''),
+                attempt.get('fixer_type') or "claude",
+                ai_response.get('analysis', ''),
+                json.dumps(fix_commands),
+                attempt['fix_success'],
+                attempt['verification_success'],
+                attempt['execution_time'],
+                json.dumps(issue_data.get('test_environment', {})),
+                attempt.get('notes'),
+                issue_data.get('error_output', '')
+            ))
+            aggregates.append({
+                'issue_signature': issue_signature,
+                'model_name': issue_data.get('model', ''),
+                'issue_type': issue_data.get('issue_type', ''),
+                'fix_commands': fix_commands if isinstance(fix_commands, list) else [fix_commands],
+                'analysis': ai_response.get('analysis', ''),
+                'success': bool(attempt['fix_success'] and attempt['verification_success']),
+                'timestamp': timestamp
+            })
         
-        # Update successful strategies
-        if success:
-            if issue_type not in self.knowledge_base['successful_strategies']:
-                self.knowledge_base['successful_strategies'][issue_type] = []
+        with self._write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO fix_history 
+                (timestamp, model_name, issue_type, issue_signature, description, 
+                 fixer_type, ai_analysis, fix_commands, fix_success, verification_success, 
+                 execution_time_seconds, system_info, notes, error_output)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            
+            # AUTOINCREMENT IDs are allocated contiguously while this
+            # transaction holds the write lock
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'fix_history'")
+            last_id = cursor.fetchone()[0]
+            fix_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            
+            # Update knowledge base and aggregates once for the whole batch,
+            # in the same transaction
+            self._update_knowledge_base(cursor, attempts)
+            memory_aggregates.record_attempts(cursor, aggregates)
+        
+        try:
+            self._sync_vector_index()
+        except Exception as e:
+            # The attempts are committed; the next sync or `reindex` catches the index up
+            print(f"⚠️ Similarity index sync failed: {e}", file=sys.stderr)
+        
+        return fix_ids
+
+    def _update_knowledge_base(self, cursor: sqlite3.Cursor, attempts: List[Dict]):
+        """Update the knowledge base with new learnings (inside the caller's transaction)."""
+        now = datetime.now().isoformat()
+        strategies = []
+        tips = []
+        for attempt in attempts:
+            issue_type = attempt['issue_data'].get('issue_type', '')
+            model_name = attempt['issue_data'].get('model', '')
+            analysis = attempt['ai_response'].get('analysis', '')
+            success = attempt['fix_success']
             
-            strategy = ai_response.get('analysis', '')[:100]
-            if strategy not in self.knowledge_base['successful_strategies'][issue_type]:
-                self.knowledge_base['successful_strategies'][issue_type].append(strategy)
+            if success:
+                strategies.append((issue_type, analysis[:100], now))
+            tip = f"{issue_type}: {'Success' if success else 'Failed'} - {analysis[:80]}"
+            tips.append((model_name, tip, now))
+        
+        # Update successful strategies; the unique index deduplicates
+        cursor.executemany(
+            'INSERT OR IGNORE INTO kb_strategies (issue_type, strategy, created_at) VALUES (?, ?, ?)',
+            strategies)
         
         # Update model-specific tips
-        if model_name not in self.knowledge_base['model_specific_tips']:
-            self.knowledge_base['model_specific_tips'][model_name] = []
+        cursor.executemany(
+            'INSERT OR IGNORE INTO kb_model_tips (model_name, tip, created_at) VALUES (?, ?, ?)',
+            tips)
         
-        tip = f"{issue_type}: {'Success' if success else 'Failed'} - {ai_response.get('analysis', '')[:80]}"
-        if tip not in self.knowledge_base['model_specific_tips'][model_name]:
-            self.knowledge_base['model_specific_tips'][model_name].append(tip)
+        # Keep only recent tips (last 10) for every model touched by the batch
+        for model_name in {tip[0] for tip in tips}:
+            cursor.execute(KB_TIP_CUTOFF_QUERY, (model_name, KB_TIPS_PER_MODEL - 1))
+            oldest_kept = cursor.fetchone()
+            if oldest_kept:
+                cursor.execute(KB_TRIM_TIPS_QUERY, (model_name, oldest_kept[0]))
         
-        # Keep only recent tips (last 10)
-        self.knowledge_base['model_specific_tips'][model_name] = \
-            self.knowledge_base['model_specific_tips'][model_name][-10:]
+        cursor.execute("INSERT OR REPLACE INTO kb_meta (key, value) VALUES ('last_updated', ?)", (now,))
+
+    def analysis_cache_key(self, fixer_type: str, fixer_model: str, issue_data: Dict) -> str:
+        """Cache key for a fixer's analysis of an issue; see memory_cache for why history is left out."""
+        return memory_cache.cache_key(fixer_type, fixer_model or '', self.generate_issue_signature(issue_data),
+                                      memory_cache.issue_hash(issue_data))
+
+    @_served
+    def get_cached_analysis(self, cache_key: str) -> Optional[Dict]:
+        """Return a cached, unexpired analysis and count the hit or miss."""
+        with self._write_connection() as conn:
+            return memory_cache.lookup(conn.cursor(), cache_key, datetime.now())
+
+    @_served
+    def cache_analysis(self, cache_key: str, fixer_type: str, fixer_model: str, issue_data: Dict,
+                       ai_response: Dict, ttl: Optional[float] = None,
+                       max_entries: int = memory_cache.MAX_ENTRIES):
+        """Cache an analysis for ``ttl`` seconds ($AI_FIX_CACHE_TTL by default).
         
-        self._save_knowledge_base()
+        Expired entries are dropped and the least recently used are evicted
+        beyond ``max_entries``.
+        """
+        ttl = memory_cache.resolve_ttl(ttl)
+        if ttl <= 0:
+            return
+        with self._write_connection() as conn:
+            memory_cache.store(conn.cursor(), cache_key, fixer_type, fixer_model or '',
+                               self.generate_issue_signature(issue_data), memory_cache.issue_hash(issue_data),
+                               ai_response, ttl, datetime.now(), max_entries)
 
-    def get_memory_stats(self) -> Dict:
-        """Get statistics about the memory system."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @_served
+    def invalidate_cached_analysis(self, fixer_type: str, fixer_model: str, issue_data: Dict,
+                                   ai_response: Dict) -> int:
+        """Stop serving a fix that failed; returns the cache entries removed."""
+        with self._write_connection() as conn:
+            return memory_cache.invalidate(conn.cursor(), fixer_type, fixer_model or '',
+                                           self.generate_issue_signature(issue_data), ai_response)
+
+    def clear_analysis_cache(self) -> int:
+        """Remove every cached analysis; returns the entries removed."""
+        with self._write_connection() as conn:
+            return memory_cache.clear(conn.cursor())
+
+    def get_analysis_cache_stats(self) -> Dict:
+        """Hit, miss, store, expiry, eviction and invalidation counters plus the entry count."""
+        with self._read_connection() as conn:
+            return memory_cache.stats(conn.cursor())
+
+    @_served
+    def record_race(self, issue_data: Dict, entrants: List[Dict]) -> str:
+        """Record one race between fixers and return its id.
         
-        cursor.execute('SELECT COUNT(*) FROM fix_history')
-        total_fixes = cursor.fetchone()[0]
+        Each entrant holds fixer_type, outcome (won, lost, error or
+        cancelled), latency_seconds and optionally confidence.
+        """
+        timestamp = datetime.now().isoformat()
+        race_id = uuid.uuid4().hex[:16]
+        with self._write_connection() as conn:
+            conn.executemany('''
+                INSERT INTO provider_races
+                (race_id, timestamp, model_name, issue_type, fixer_type, outcome, latency_seconds, confidence)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(race_id, timestamp, issue_data.get('model', ''), issue_data.get('issue_type', ''),
+                   entrant['fixer_type'], entrant['outcome'], entrant['latency_seconds'],
+                   entrant.get('confidence')) for entrant in entrants])
+        return race_id
+
+    def get_race_stats(self, days: int = 30) -> List[Dict]:
+        """Per-fixer race outcomes and answer latency percentiles over the last ``days`` days."""
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._read_connection() as conn:
+            rows = conn.execute(RACE_STATS_QUERY, (since,)).fetchall()
         
-        cursor.execute('SELECT COUNT(*) FROM fix_history WHERE fix_success = 1')
-        successful_fixes = cursor.fetchone()[0]
+        fixers = {}
+        for fixer_type, outcome, latency in rows:
+            entry = fixers.setdefault(fixer_type, {'outcomes': {}, 'latencies': []})
+            entry['outcomes'][outcome] = entry['outcomes'].get(outcome, 0) + 1
+            # Cancelled entrants never answered, so they say nothing about latency
+            if outcome != 'cancelled':
+                entry['latencies'].append(latency)
         
-        cursor.execute('SELECT COUNT(DISTINCT model_name) FROM fix_history')
-        models_seen = cursor.fetchone()[0]
+        stats = []
+        for fixer_type, entry in sorted(fixers.items()):
+            outcomes = entry['outcomes']
+            latencies = sorted(entry['latencies'])
+            races = sum(outcomes.values())
+            stats.append({
+                'fixer_type': fixer_type,
+                'races': races,
+                'won': outcomes.get('won', 0),
+                'lost': outcomes.get('lost', 0),
+                'error': outcomes.get('error', 0),
+                'cancelled': outcomes.get('cancelled', 0),
+                'win_rate': outcomes.get('won', 0) / races if races else 0.0,
+                'p50_latency_seconds': _percentile(latencies, 0.5),
+                'p95_latency_seconds': _percentile(latencies, 0.95),
+            })
+        return stats
+
+    @_served
+    def record_command_runs(self, runs: List[Dict]):
+        """Record executed fix commands in one transaction.
         
-        cursor.execute('SELECT COUNT(DISTINCT issue_type) FROM fix_history')
-        issue_types_seen = cursor.fetchone()[0]
+        Each run holds command, scope, status, exit_code, duration_seconds
+        and shared_by (how many fixes asked for it).
+        """
+        if not runs:
+            return
+        timestamp = datetime.now().isoformat()
+        with self._write_connection() as conn:
+            conn.executemany('''
+                INSERT INTO command_runs
+                (timestamp, command, scope, status, exit_code, duration_seconds, shared_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(timestamp, run['command'], run['scope'], run['status'], run.get('exit_code'),
+                   run['duration_seconds'], run.get('shared_by', 1)) for run in runs])
+
+    @_served
+    def record_verification(self, issue_data: Dict, result: Dict):
+        """Record one fix verification (a fix_verifier.verify_model result)."""
+        checks = result.get('checks', [])
+        with self._write_connection() as conn:
+            conn.execute('''
+                INSERT INTO fix_verifications
+                (timestamp, model_name, issue_type, checks, passed_checks, passed, load_seconds,
+                 latency_seconds, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (datetime.now().isoformat(), issue_data.get('model', ''), issue_data.get('issue_type', ''),
+                  len(checks), sum(1 for check in checks if check['passed']), result['passed'],
+                  result.get('load_seconds'), result['latency_seconds'], result.get('error')))
+
+    def get_verification_stats(self, days: int = 30) -> List[Dict]:
+        """Per-model verification pass rates, load times and latency over the last ``days`` days."""
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._read_connection() as conn:
+            rows = conn.execute(VERIFICATION_STATS_QUERY, (since,)).fetchall()
         
-        # Get recent activity (last 7 days)
-        week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-        cursor.execute('SELECT COUNT(*) FROM fix_history WHERE timestamp > ?', (week_ago,))
-        recent_activity = cursor.fetchone()[0]
+        models = {}
+        for model_name, passed, load_seconds, latency in rows:
+            entry = models.setdefault(model_name, {'passed': 0, 'loads': [], 'latencies': []})
+            entry['passed'] += bool(passed)
+            entry['latencies'].append(latency)
+            if load_seconds is not None:
+                entry['loads'].append(load_seconds)
         
-        conn.close()
+        stats = []
+        for model_name, entry in sorted(models.items()):
+            latencies = sorted(entry['latencies'])
+            stats.append({
+                'model_name': model_name,
+                'verifications': len(latencies),
+                'passed': entry['passed'],
+                'pass_rate': entry['passed'] / len(latencies),
+                'p50_load_seconds': _percentile(sorted(entry['loads']), 0.5),
+                'p50_latency_seconds': _percentile(latencies, 0.5),
+                'p95_latency_seconds': _percentile(latencies, 0.95),
+            })
+        return stats
+
+    def get_command_stats(self, days: int = 30, limit: int = 20) -> List[Dict]:
+        """Fix commands run over the last ``days`` days, most total time first."""
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._read_connection() as conn:
+            rows = conn.execute(COMMAND_STATS_QUERY, (since,)).fetchall()
+        
+        commands = {}
+        for command, status, duration in rows:
+            entry = commands.setdefault(command, {'statuses': {}, 'durations': []})
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            if status != 'skipped':
+                entry['durations'].append(duration)
+        
+        stats = []
+        for command, entry in commands.items():
+            statuses = entry['statuses']
+            durations = sorted(entry['durations'])
+            stats.append({
+                'command': command,
+                'runs': len(durations),
+                'ok': statuses.get('ok', 0),
+                'failed': statuses.get('failed', 0) + statuses.get('error', 0),
+                'timeout': statuses.get('timeout', 0),
+                'skipped': statuses.get('skipped', 0),
+                'total_seconds': sum(durations),
+                'p50_seconds': _percentile(durations, 0.5),
+                'p95_seconds': _percentile(durations, 0.95),
+            })
+        stats.sort(key=lambda row: row['total_seconds'], reverse=True)
+        return stats[:limit]
+
+    @_served
+    def get_memory_stats(self) -> Dict:
+        """Get statistics about the memory system."""
+        # Summary rows are maintained by triggers on fix_history, so this is a
+        # constant-time read regardless of history size. Counts include
+        # history that has been pruned into the archive.
+        week_ago = (datetime.now() - timedelta(days=7)).date().isoformat()
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(STATS_SUMMARY_QUERY)
+            total_fixes, successful_fixes, models_seen, issue_types_seen = cursor.fetchone() or (0, 0, 0, 0)
+            
+            # Get recent activity (last 7 days, by daily bucket)
+            cursor.execute(STATS_RECENT_QUERY, (week_ago,))
+            recent_activity = cursor.fetchone()[0]
+            
+            cursor.execute('''
+                SELECT (SELECT COUNT(*) FROM kb_strategies) + (SELECT COUNT(*) FROM kb_model_tips)
+                       + (SELECT COUNT(*) FROM kb_entries)
+            ''')
+            knowledge_base_entries = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT rows_archived FROM retention_state WHERE id = 1')
+            archived = (cursor.fetchone() or (0,))[0]
         
         return {
             'total_fixes_attempted': total_fixes,
@@ -396,73 +1214,523 @@ class AIMemory:
             'models_encountered': models_seen,
             'issue_types_seen': issue_types_seen,
             'recent_activity_7days': recent_activity,
-            'knowledge_base_size': len(str(self.knowledge_base)),
+            'knowledge_base_size': knowledge_base_entries,
+            'archived_fixes': archived,
             'memory_directory': self.memory_dir
         }
 
-    def export_insights(self, output_file: str):
-        """Export all accumulated insights to a readable report."""
-        stats = self.get_memory_stats()
+    def prune_history(self, days: int = memory_retention.DEFAULT_DAYS,
+                      success_days: int = memory_retention.DEFAULT_SUCCESS_DAYS,
+                      batch_size: int = memory_retention.PRUNE_BATCH, vacuum: bool = True) -> Dict:
+        """Roll up, archive and delete fix history past its retention tier.
         
-        report = {
-            'generated_at': datetime.now().isoformat(),
-            'statistics': stats,
-            'knowledge_base': self.knowledge_base,
-            'model_insights': {}
-        }
+        Failed attempts older than ``days`` and verified fixes older than
+        ``success_days`` are folded into history_rollups, appended to
+        AIMemory/archive/fix_history-YYYY-MM.jsonl.gz and removed. Each
+        batch is staged beside the archives and appended only after its
+        delete commits, so a failed commit never archives rows twice. Statistics
+        and learned patterns are kept. Pruned fixes are dropped from the
+        similarity index, and free pages are released afterwards with
+        incremental vacuum.
+        """
+        now = datetime.now()
+        cutoff = (now - timedelta(days=days)).isoformat()
+        success_cutoff = (now - timedelta(days=max(days, success_days))).isoformat()
+        archive_dir = os.path.join(self.memory_dir, "archive")
         
-        # Get insights for all models
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT DISTINCT model_name FROM fix_history')
-        models = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        pruned = 0
+        pruned_ids = []
+        archives = set()
+        while True:
+            with self._write_connection() as conn:
+                cursor = conn.cursor()
+                # Other pruners wait here, so no two read the same batch
+                cursor.execute('BEGIN IMMEDIATE')
+                # Append the previous batch, or whatever an interrupted run left
+                archives.update(memory_retention.settle_archives(cursor, archive_dir))
+                cursor.execute(PRUNE_BATCH_QUERY, (cutoff, success_cutoff, batch_size))
+                rows = [dict(zip(FIX_HISTORY_COLUMNS, row)) for row in cursor.fetchall()]
+                if not rows:
+                    break
+                
+                # Durable before the delete; appended once it has committed
+                batch = uuid.uuid4().hex
+                memory_retention.stage_archive(archive_dir, rows, batch)
+                memory_retention.rollup(cursor, rows)
+                cursor.execute('UPDATE retention_state SET pruning = 1 WHERE id = 1')
+                cursor.executemany('DELETE FROM fix_history WHERE id = ?', [(row['id'],) for row in rows])
+                cursor.execute('''
+                    UPDATE retention_state SET pruning = 0, rows_archived = rows_archived + ?, last_pruned_at = ?,
+                                               archive_batch = ?
+                    WHERE id = 1
+                ''', (len(rows), now.isoformat(), batch))
+                pruned += len(rows)
+                pruned_ids.extend(row['id'] for row in rows)
+            if len(rows) < batch_size:
+                if rows:
+                    with self._write_connection() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute('BEGIN IMMEDIATE')
+                        archives.update(memory_retention.settle_archives(cursor, archive_dir))
+                break
         
-        for model in models:
-            report['model_insights'][model] = self.get_model_insights(model)
+        index = self._get_vector_index() if pruned_ids else None
+        if index is not None:
+            index.remove(pruned_ids)
         
-        with open(output_file, 'w') as f:
-            json.dump(report, f, indent=2)
+        pages_freed = 0
+        if vacuum:
+            # No statement has been issued, so no transaction is open for VACUUM
+            with self._write_connection() as conn:
+                memory_retention.enable_incremental_vacuum(conn)
+                pages_freed = memory_retention.incremental_vacuum(conn)
         
-        print(f"📊 Insights exported to: {output_file}")
+        return {
+            'rows_pruned': pruned,
+            'archives': sorted(archives),
+            'pages_freed': pages_freed,
+            'database_bytes': os.path.getsize(self.db_path)
+        }
 
+    def get_success_trends(self, model_name: str = None, issue_type: str = None) -> List[Dict]:
+        """Monthly attempt and success counts over archived and live history, oldest first."""
+        with self._read_connection() as conn:
+            rows = conn.execute('''
+                SELECT substr(day, 1, 7) AS month, SUM(attempts), SUM(fixes_applied), SUM(fixes_verified)
+                FROM (
+                    SELECT day, model_name, issue_type, attempts, fixes_applied, fixes_verified
+                    FROM history_rollups
+                    UNION ALL
+                    SELECT substr(timestamp, 1, 10), model_name, issue_type, 1,
+                           fix_success = 1, fix_success = 1 AND verification_success = 1
+                    FROM fix_history
+                )
+                WHERE (:model IS NULL OR model_name = :model) AND (:issue_type IS NULL OR issue_type = :issue_type)
+                GROUP BY month ORDER BY month
+            ''', {'model': model_name, 'issue_type': issue_type}).fetchall()
+        return [{'month': month, 'attempts': attempts, 'fixes_applied': applied, 'fixes_verified': verified,
+                 'verified_rate': verified / attempts if attempts else 0.0}
+                for month, attempts, applied, verified in rows]
 
-if __name__ == "__main__":
-    """CLI interface for memory management."""
-    import sys
+    def get_daily_activity(self, days: int = 30) -> List[Dict]:
+        """Get per-day attempt and success counts, newest first."""
+        since = (datetime.now() - timedelta(days=days)).date().isoformat()
+        with self._read_connection() as conn:
+            rows = conn.execute(DAILY_ACTIVITY_QUERY, (since,)).fetchall()
+        return [{'day': day, 'attempts': attempts, 'successful': successful}
+                for day, attempts, successful in rows]
+
+    def get_recent_fixes(self, days: int = 7) -> List[Dict]:
+        """Get fix attempts from the last ``days`` days, newest first."""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._read_connection() as conn:
+            rows = conn.execute(RECENT_FIXES_QUERY, (cutoff,)).fetchall()
+        return [{'timestamp': timestamp, 'model_name': model, 'issue_type': issue_type,
+                 'fix_success': bool(fix_success), 'verification_success': bool(verification_success),
+                 'analysis': analysis}
+                for timestamp, model, issue_type, fix_success, verification_success, analysis in rows]
+
+    def get_successful_strategies(self, limit: int = 10) -> List[Dict]:
+        """Get the analyses behind the most verified fixes, per issue type."""
+        with self._read_connection() as conn:
+            rows = conn.execute(SUCCESSFUL_STRATEGIES_QUERY, (limit,)).fetchall()
+        return [{'issue_type': pattern_name.rsplit(':', 1)[0], 'successful': successful, 'analysis': analysis}
+                for pattern_name, successful, analysis in rows]
+
+    def get_recurring_issues(self) -> List[Dict]:
+        """Get issue types seen more than once per model with their verified fix rate."""
+        with self._read_connection() as conn:
+            rows = conn.execute(RECURRING_ISSUES_QUERY).fetchall()
+        return [{'issue_type': issue_type, 'model_name': model, 'occurrences': occurrences,
+                 'success_rate': success_rate}
+                for issue_type, model, occurrences, success_rate in rows]
+
+    def export_insights(self, output_file: str, since_id: int = 0, compress: Optional[bool] = None) -> Dict:
+        """Stream insights and fix history to a JSON Lines report in one pass.
+        
+        The report holds a header line (statistics and knowledge base), one
+        line per model, one line per fix_history row with an id above
+        ``since_id`` in id order, and a footer whose ``last_id`` is the
+        watermark for the next incremental export. Output is gzip-compressed
+        when ``compress`` is set or the file name ends in .gz, and only
+        replaces ``output_file`` once complete. Returns the footer.
+        """
+        if compress is None:
+            compress = output_file.endswith('.gz')
+        stats = self.get_memory_stats()
+        knowledge_base = self.knowledge_base
+        
+        fd, tmp_path = tempfile.mkstemp(prefix='.export-', dir=os.path.dirname(os.path.abspath(output_file)))
+        os.close(fd)
+        footer = {'type': 'footer', 'since_id': since_id, 'last_id': since_id, 'models': 0, 'fixes': 0}
+        try:
+            if compress:
+                out = gzip.open(tmp_path, 'wt', compresslevel=EXPORT_GZIP_LEVEL, encoding='utf-8')
+            else:
+                out = open(tmp_path, 'w', encoding='utf-8')
+            with out, self._read_connection() as conn:
+                # One read transaction so every section comes from the same snapshot
+                conn.execute('BEGIN')
+                try:
+                    out.write(json.dumps({
+                        'type': 'header',
+                        'format_version': EXPORT_FORMAT_VERSION,
+                        'generated_at': datetime.now().isoformat(),
+                        'since_id': since_id,
+                        'statistics': stats,
+                        'knowledge_base': knowledge_base
+                    }) + '\n')
+                    
+                    for row in conn.execute(EXPORT_MODELS_QUERY):
+                        out.write(json.dumps(dict(self._model_characteristics_row(row), type='model')) + '\n')
+                        footer['models'] += 1
+                    
+                    for row in conn.execute(EXPORT_FIXES_QUERY, (since_id,)):
+                        fix = dict(zip(FIX_HISTORY_COLUMNS, row), type='fix')
+                        for column in FIX_HISTORY_JSON_COLUMNS:
+                            try:
+                                fix[column] = json.loads(fix[column]) if fix[column] else None
+                            except json.JSONDecodeError:
+                                pass
+                        fix['fix_success'] = bool(fix['fix_success'])
+                        fix['verification_success'] = bool(fix['verification_success'])
+                        out.write(json.dumps(fix) + '\n')
+                        footer['fixes'] += 1
+                        footer['last_id'] = fix['id']
+                finally:
+                    conn.rollback()
+                
+                out.write(json.dumps(footer) + '\n')
+            os.replace(tmp_path, output_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        
+        return footer
+
+
+# Shared instances, one per (memory directory, read_only)
+_shared_memories: Dict[Tuple[str, bool], AIMemory] = {}
+_shared_memories_lock = threading.Lock()
+
+
+def get_memory(memory_dir: str = None, read_only: bool = False) -> AIMemory:
+    """Return the process-wide AIMemory for a memory directory, creating it on first use.
+    
+    The manager and every fixer in a process share the instance, so the
+    database is migrated and the knowledge base imported at most once, and
+    only when it is first queried.
+    """
+    memory_dir = memory_dir or os.path.join(os.path.dirname(__file__), "..", "AIMemory")
+    key = (os.path.realpath(memory_dir), read_only)
+    with _shared_memories_lock:
+        memory = _shared_memories.get(key)
+        if memory is None or memory._closed:
+            memory = AIMemory(memory_dir, read_only=read_only)
+            _shared_memories[key] = memory
+        return memory
+
+
+@atexit.register
+def _close_shared_memories():
+    with _shared_memories_lock:
+        for memory in _shared_memories.values():
+            try:
+                memory.close()
+            except sqlite3.Error:
+                pass
+        _shared_memories.clear()
+
+
+def _print_json(data):
+    print(json.dumps(data, indent=2, default=str))
+
+
+def _cmd_stats(memory: AIMemory, args) -> int:
+    stats = memory.get_memory_stats()
+    if args.json:
+        _print_json(stats)
+        return 0
+    print("🧠 AI Memory Statistics:")
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+    return 0
+
+
+def _cmd_model(memory: AIMemory, args) -> int:
+    insights = memory.get_model_insights(args.model_name)
+    if not args.json:
+        print(f"🤖 Insights for {args.model_name}:")
+    _print_json(insights)
+    return 0
+
+
+def _cmd_export(memory: AIMemory, args) -> int:
+    since_id = args.since
+    # The watermark file remembers the last exported row for nightly runs
+    if args.watermark and os.path.exists(args.watermark):
+        with open(args.watermark) as f:
+            since_id = int(f.read().strip() or 0)
     
-    memory = AIMemory()
+    footer = memory.export_insights(args.output_file, since_id, True if args.gzip else None)
+    if args.watermark:
+        with open(args.watermark, 'w') as f:
+            f.write(f"{footer['last_id']}\n")
+    if args.json:
+        _print_json(footer)
+    else:
+        print(f"📊 Insights exported to: {args.output_file} "
+              f"({footer['fixes']} fixes after id {since_id}, watermark {footer['last_id']})")
+    return 0
+
+
+def _cmd_search(memory: AIMemory, args) -> int:
+    filters = {'model_name': args.model, 'issue_type': args.type, 'fixer_type': args.fixer}
+    if args.successful:
+        filters['fix_success'] = 1
+        filters['verification_success'] = 1
+    query = ' '.join(args.query)
+    results = memory.search(query, filters, args.limit)
+    if args.json:
+        _print_json(results)
+        return 0
+    print(f"🔍 {len(results)} matches for: {query}")
+    for result in results:
+        status = "✅" if result['fix_success'] and result['verification_success'] else "❌"
+        print(f"{status} #{result['id']} {result['timestamp'][:19]} {result['model_name']} "
+              f"{result['issue_type']} (score {result['score']:.2f})")
+        print(f"   {result['snippet']}")
+    return 0
+
+
+def _cmd_recent(memory: AIMemory, args) -> int:
+    fixes = memory.get_recent_fixes(args.days)
+    if args.json:
+        _print_json(fixes)
+    elif fixes:
+        print(f"Found {len(fixes)} recent fix attempts:")
+        for fix in fixes:
+            status = "✅" if fix['fix_success'] and fix['verification_success'] else "❌"
+            print(f"{status} {fix['timestamp'][:16]} | {fix['model_name']:20} | {fix['issue_type']:20} | "
+                  f"{(fix['analysis'] or '')[:50]}...")
+    else:
+        print("No recent activity found")
+    return 0
+
+
+def _cmd_successful(memory: AIMemory, args) -> int:
+    strategies = memory.get_successful_strategies(args.limit)
+    if args.json:
+        _print_json(strategies)
+    elif strategies:
+        print("Top successful strategies:")
+        for i, strategy in enumerate(strategies, 1):
+            print(f"{i:2}. {strategy['issue_type']:20} | {strategy['successful']:2}x verified | "
+                  f"{(strategy['analysis'] or '')[:60]}...")
+    else:
+        print("No successful strategies recorded yet")
+    return 0
+
+
+def _cmd_patterns(memory: AIMemory, args) -> int:
+    patterns = memory.get_recurring_issues()
+    if args.json:
+        _print_json(patterns)
+    elif patterns:
+        print("Issue patterns (recurring issues):")
+        for pattern in patterns:
+            status = "⚠️" if pattern['success_rate'] < 0.5 else "✅"
+            print(f"{status} {pattern['model_name']:20} | {pattern['issue_type']:20} | "
+                  f"{pattern['occurrences']:2}x | {pattern['success_rate'] * 100:4.1f}% success")
+    else:
+        print("No recurring patterns identified yet")
+    return 0
+
+
+def _cmd_prune(memory: AIMemory, args) -> int:
+    result = memory.prune_history(args.days, args.success_days)
+    if args.json:
+        _print_json(result)
+        return 0
+    print(f"🗄️ Archived and removed {result['rows_pruned']} records")
+    for path in result['archives']:
+        print(f"  → {path}")
+    print(f"  Freed {result['pages_freed']} pages, database is now {result['database_bytes'] / 1024:.0f} KB")
+    return 0
+
+
+def _cmd_trends(memory: AIMemory, args) -> int:
+    trends = memory.get_success_trends(args.model_name or None, args.type)
+    if args.json:
+        _print_json(trends)
+        return 0
+    for row in trends:
+        print(f"  {row['month']}: {row['attempts']:6} attempts, {row['fixes_verified']:6} verified "
+              f"({row['verified_rate']:.1%})")
+    return 0
+
+
+def _cmd_reindex(memory: AIMemory, args) -> int:
+    memory.rebuild_vector_index()
+    print("✅ Similarity index rebuilt")
+    return 0
+
+
+def _cmd_check_plans(memory: AIMemory, args) -> int:
+    scans = memory.find_table_scans()
+    if args.json:
+        _print_json(scans)
+    elif scans:
+        print("❌ Hot queries falling back to a table scan:")
+        for name, details in scans.items():
+            print(f"  {name}: {'; '.join(details)}")
+    else:
+        print("✅ All hot queries are served by indexes")
+        print(f"   Full scans allowed by design: {', '.join(sorted(FULL_SCANS_ALLOWED))}")
+    return 1 if scans else 0
+
+
+def _cmd_races(memory: AIMemory, args) -> int:
+    stats = memory.get_race_stats(args.days)
+    if args.json:
+        _print_json(stats)
+    elif stats:
+        print(f"🏁 Fixer races (last {args.days} days):")
+        for row in stats:
+            p50 = f"{row['p50_latency_seconds']:.1f}s" if row['p50_latency_seconds'] is not None else "-"
+            p95 = f"{row['p95_latency_seconds']:.1f}s" if row['p95_latency_seconds'] is not None else "-"
+            print(f"  {row['fixer_type']:10} | {row['won']:4} won | {row['lost']:4} lost | {row['error']:4} failed | "
+                  f"{row['cancelled']:4} cancelled | p50 {p50:>6} | p95 {p95:>6}")
+    else:
+        print("No fixer races recorded yet")
+    return 0
+
+
+def _cmd_commands(memory: AIMemory, args) -> int:
+    stats = memory.get_command_stats(args.days)
+    if args.json:
+        _print_json(stats)
+    elif stats:
+        print(f"🔨 Fix commands by total time (last {args.days} days):")
+        for row in stats:
+            p95 = f"{row['p95_seconds']:.1f}s" if row['p95_seconds'] is not None else "-"
+            print(f"  {row['runs']:4} runs | {row['failed']:3} failed | {row['timeout']:3} timed out | "
+                  f"{row['total_seconds']:8.1f}s total | p95 {p95:>7} | {row['command'][:60]}")
+    else:
+        print("No fix commands recorded yet")
+    return 0
+
+
+def _cmd_verifications(memory: AIMemory, args) -> int:
+    stats = memory.get_verification_stats(args.days)
+    if args.json:
+        _print_json(stats)
+    elif stats:
+        print(f"🔍 Fix verifications (last {args.days} days):")
+        for row in stats:
+            load = f"{row['p50_load_seconds']:.1f}s" if row['p50_load_seconds'] is not None else "-"
+            print(f"  {row['model_name']:30} | {row['passed']:3}/{row['verifications']:<3} passed | "
+                  f"load p50 {load:>6} | p50 {row['p50_latency_seconds']:5.1f}s | "
+                  f"p95 {row['p95_latency_seconds']:5.1f}s")
+    else:
+        print("No fix verifications recorded yet")
+    return 0
+
+
+def _cmd_cache(memory: AIMemory, args) -> int:
+    stats = memory.get_analysis_cache_stats()
+    if args.json:
+        _print_json(stats)
+        return 0
+    print(f"♻️ Analysis cache: {stats['entries']} entries, {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.1%} hit rate)")
+    print(f"  {stats['stores']} stored, {stats['expirations']} expired, {stats['evictions']} evicted, "
+          f"{stats['invalidations']} invalidated after failing")
+    return 0
+
+
+def _cmd_cache_clear(memory: AIMemory, args) -> int:
+    removed = memory.clear_analysis_cache()
+    print(f"🧹 Removed {removed} cached analyses")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the ai_memory.py command line parser."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    common.add_argument("--memory-dir", help="Memory directory (default: AIMemory next to Scripts)")
     
-    if len(sys.argv) < 2:
-        print("Usage: ai_memory.py <command> [args]")
-        print("Commands:")
-        print("  stats - Show memory statistics")
-        print("  export <file> - Export insights report")
-        print("  model <name> - Show model insights")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="AI memory management")
+    commands = parser.add_subparsers(dest="command", metavar="<command>", required=True)
     
-    command = sys.argv[1]
+    def command(name, func, help_text, writes=False, aliases=()):
+        sub = commands.add_parser(name, parents=[common], help=help_text, aliases=list(aliases))
+        sub.set_defaults(func=func, writes=writes)
+        return sub
     
-    if command == "stats":
-        stats = memory.get_memory_stats()
-        print("🧠 AI Memory Statistics:")
-        for key, value in stats.items():
-            print(f"  {key}: {value}")
+    command("stats", _cmd_stats, "Show memory statistics")
     
-    elif command == "export":
-        if len(sys.argv) < 3:
-            print("Usage: ai_memory.py export <output_file>")
-            sys.exit(1)
-        memory.export_insights(sys.argv[2])
+    sub = command("model", _cmd_model, "Show model insights")
+    sub.add_argument("model_name")
     
-    elif command == "model":
-        if len(sys.argv) < 3:
-            print("Usage: ai_memory.py model <model_name>")
-            sys.exit(1)
-        insights = memory.get_model_insights(sys.argv[2])
-        print(f"🤖 Insights for {sys.argv[2]}:")
-        print(json.dumps(insights, indent=2))
+    sub = command("export", _cmd_export, "Export insights and fix history as JSON Lines")
+    sub.add_argument("output_file")
+    sub.add_argument("--since", type=int, default=0, help="Only export fixes with a larger id")
+    sub.add_argument("--watermark", help="File holding the last exported id, updated after export")
+    sub.add_argument("--gzip", action="store_true", help="Compress even without a .gz suffix")
     
-    else:
-        print(f"Unknown command: {command}")
-        sys.exit(1)
\ No newline at end of file
+    sub = command("search", _cmd_search, "Full-text search of past fixes")
+    sub.add_argument("query", nargs="+")
+    sub.add_argument("--model", help="Only fixes for this model")
+    sub.add_argument("--type", help="Only fixes for this issue type")
+    sub.add_argument("--fixer", help="Only fixes by this fixer")
+    sub.add_argument("--successful", action="store_true", help="Only applied and verified fixes")
+    sub.add_argument("--limit", type=int, default=20)
+    
+    sub = command("recent", _cmd_recent, "Show recent fix activity")
+    sub.add_argument("days", nargs="?", type=int, default=7)
+    
+    sub = command("successful", _cmd_successful, "Show the most successful fix strategies")
+    sub.add_argument("--limit", type=int, default=10)
+    
+    command("patterns", _cmd_patterns, "Show recurring issue patterns")
+    
+    sub = command("prune", _cmd_prune, "Archive and delete old fix history", writes=True, aliases=["cleanup"])
+    sub.add_argument("days", nargs="?", type=int, default=memory_retention.DEFAULT_DAYS,
+                     help=f"Keep failed attempts this many days (default: {memory_retention.DEFAULT_DAYS})")
+    sub.add_argument("success_days", nargs="?", type=int, default=memory_retention.DEFAULT_SUCCESS_DAYS,
+                     help=f"Keep verified fixes this many days (default: {memory_retention.DEFAULT_SUCCESS_DAYS})")
+    
+    sub = command("trends", _cmd_trends, "Monthly success trends including archived history")
+    sub.add_argument("model_name", nargs="?")
+    sub.add_argument("--type", help="Only this issue type")
+    
+    sub = command("races", _cmd_races, "Show how fixers fared in race mode")
+    sub.add_argument("days", nargs="?", type=int, default=30)
+    
+    sub = command("commands", _cmd_commands, "Show fix command runs, failures and timeouts")
+    sub.add_argument("days", nargs="?", type=int, default=30)
+    
+    sub = command("verifications", _cmd_verifications, "Show fix verification pass rates and latency")
+    sub.add_argument("days", nargs="?", type=int, default=30)
+    
+    command("cache", _cmd_cache, "Show analysis cache counters")
+    command("cache-clear", _cmd_cache_clear, "Remove every cached analysis", writes=True)
+    command("reindex", _cmd_reindex, "Rebuild the similarity index over fix history")
+    command("check-plans", _cmd_check_plans, "Verify hot queries use indexes (EXPLAIN QUERY PLAN)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLI interface for memory management."""
+    args = build_parser().parse_args(argv)
+    # Read commands open the database read-only and skip migrations and the
+    # knowledge base import, so they start quickly
+    with AIMemory(args.memory_dir, reader_pool_size=1, read_only=not args.writes) as memory:
+        return args.func(memory, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
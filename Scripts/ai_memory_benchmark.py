@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+AI Memory Benchmark
+Measures per-call latency of the memory read paths used by the fixers against a
+synthetic fix history, comparing the legacy connect-per-call pattern with the
+pooled connections owned by AIMemory.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ai_memory import AIMemory, FIX_HISTORY_SELECT
+
+MODELS = [f"{family}:{size}" for family in ("llama3", "qwen2.5-coder", "deepseek-coder", "mistral",
+                                             "starcoder2", "codellama", "phi3", "gemma2")
+          for size in ("7b", "13b", "34b", "70b")]
+ISSUE_TYPES = ["UNEXPECTED_RESPONSE", "TIMEOUT", "MODEL_NOT_AVAILABLE", "EMPTY_RESPONSE", "ERROR_OUTPUT"]
+FIXERS = ["claude", "qwen", "deepseek"]
+
+
+def make_issue(rng: random.Random) -> Dict:
+    """Build a synthetic issue in the shape produced by test.sh."""
+    return {
+        'model': rng.choice(MODELS),
+        'issue_type': rng.choice(ISSUE_TYPES),
+        'description': f"Model failed test case {rng.randint(1, 500)}",
+        'test_prompt': rng.choice(["What is 2+2? Answer briefly.", "Translate 'hello' to French.",
+                                   "Write a Python function that adds two numbers."]),
+        'actual_response': "x" * rng.randint(0, 400),
+        'test_environment': {'os': 'linux', 'ollama_version': '0.3.0'},
+    }
+
+
+def populate(memory: AIMemory, rows: int, seed: int = 42):
+    """Insert synthetic fix history rows in large transactions."""
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    batch = []
+    with memory._write_connection() as conn:
+        for i in range(rows):
+            issue = make_issue(rng)
+            batch.append((
+                (start + timedelta(seconds=i * 300)).isoformat(),
+                issue['model'],
+                issue['issue_type'],
+                memory.generate_issue_signature(issue),
+                issue['description'],
+                rng.choice(FIXERS),
+                f"Synthetic analysis {i}: model responded verbosely",
+                json.dumps([f"ollama pull {issue['model']}"]),
+                rng.random() < 0.6,
+                rng.random() < 0.5,
+                rng.uniform(1.0, 60.0),
+                json.dumps(issue['test_environment']),
+                None,
+            ))
+            if len(batch) >= 10000:
+                _insert(conn, batch)
+                batch = []
+        if batch:
+            _insert(conn, batch)
+
+
+def _insert(conn: sqlite3.Connection, batch: List[tuple]):
+    conn.executemany('''
+        INSERT INTO fix_history
+        (timestamp, model_name, issue_type, issue_signature, description,
+         fixer_type, ai_analysis, fix_commands, fix_success, verification_success,
+         execution_time_seconds, system_info, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', batch)
+
+
+def legacy_context_queries(db_path: str, memory: AIMemory, issue: Dict):
+    """Replay the historical read pattern: a fresh connection per call."""
+    signature = memory.generate_issue_signature(issue)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(f"{FIX_HISTORY_SELECT} WHERE issue_signature = ? ORDER BY timestamp DESC LIMIT ?",
+                   (signature, 3))
+    cursor.fetchall()
+    cursor.execute(f"{FIX_HISTORY_SELECT} WHERE model_name = ? AND issue_type = ? "
+                   "ORDER BY fix_success DESC, timestamp DESC LIMIT ?", (issue['model'], issue['issue_type'], 3))
+    cursor.fetchall()
+    cursor.execute(f"{FIX_HISTORY_SELECT} WHERE issue_type = ? "
+                   "ORDER BY fix_success DESC, timestamp DESC LIMIT ?", (issue['issue_type'], 3))
+    cursor.fetchall()
+    conn.close()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM model_characteristics WHERE model_name = ?', (issue['model'],))
+    cursor.fetchone()
+    cursor.execute('''
+        SELECT issue_type, fix_success, ai_analysis, timestamp
+        FROM fix_history WHERE model_name = ? ORDER BY timestamp DESC LIMIT 10
+    ''', (issue['model'],))
+    cursor.fetchall()
+    conn.close()
+
+
+def time_calls(label: str, func: Callable[[Dict], None], issues: List[Dict]) -> Dict:
+    """Time one call per issue and summarise the latencies in milliseconds."""
+    latencies = []
+    for issue in issues:
+        started = time.perf_counter()
+        func(issue)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'label': label,
+        'calls': len(latencies),
+        'mean_ms': statistics.mean(latencies),
+        'p50_ms': latencies[len(latencies) // 2],
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def concurrent_readers(memory: AIMemory, issues: List[Dict], threads: int) -> Dict:
+    """Run readers on several threads while a writer keeps recording attempts."""
+    errors = []
+    stop = threading.Event()
+
+    def reader(chunk):
+        for issue in chunk:
+            try:
+                memory.query_similar_issues(issue, limit=3)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    def writer():
+        rng = random.Random(7)
+        while not stop.is_set():
+            try:
+                memory.record_fix_attempt(make_issue(rng), {'analysis': 'bench', 'fix_commands': []},
+                                          False, False, 0.1, fixer_type="bench")
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    workers = [threading.Thread(target=reader, args=(issues[i::threads],)) for i in range(threads)]
+    write_thread = threading.Thread(target=writer)
+    started = time.perf_counter()
+    write_thread.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    write_thread.join()
+    return {'threads': threads, 'calls': len(issues), 'elapsed_s': elapsed, 'lock_errors': len(errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AI memory read latency")
+    parser.add_argument("--rows", type=int, default=100000, help="Synthetic fix_history rows (default: 100000)")
+    parser.add_argument("--calls", type=int, default=200, help="Context builds to time (default: 200)")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent reader threads (default: 4)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="ai_memory_bench_")
+    try:
+        with AIMemory(memory_dir=work_dir) as memory:
+            print(f"🧪 Populating {args.rows} fix_history rows in {work_dir}")
+            started = time.perf_counter()
+            populate(memory, args.rows)
+            print(f"   done in {time.perf_counter() - started:.1f}s")
+
+            rng = random.Random(1)
+            issues = [make_issue(rng) for _ in range(args.calls)]
+
+            def pooled(issue):
+                memory.query_similar_issues(issue, limit=3)
+                memory.get_model_insights(issue['model'])
+
+            results = [
+                time_calls("connect-per-call (before)",
+                           lambda issue: legacy_context_queries(memory.db_path, memory, issue), issues),
+                time_calls("pooled connections (after)", pooled, issues),
+                time_calls("build_context_for_ai (cold)", memory.build_context_for_ai, issues),
+                time_calls("build_context_for_ai (cached)", memory.build_context_for_ai, issues),
+                time_calls("get_memory_stats", lambda issue: memory.get_memory_stats(), issues),
+            ]
+
+            print(f"\n📊 Per-call latency over {args.calls} calls:")
+            for result in results:
+                print(f"  {result['label']:30} mean {result['mean_ms']:8.2f} ms | "
+                      f"p50 {result['p50_ms']:8.2f} ms | p95 {result['p95_ms']:8.2f} ms")
+
+            scans = memory.find_table_scans()
+            print(f"\n🔎 Query plan check: {'no table scans' if not scans else scans}")
+
+            concurrency = concurrent_readers(memory, issues, args.threads)
+            print(f"\n🔀 {concurrency['threads']} reader threads + 1 writer: {concurrency['calls']} similarity queries "
+                  f"in {concurrency['elapsed_s']:.2f}s, {concurrency['lock_errors']} lock errors")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
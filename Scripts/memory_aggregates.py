@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+AI Memory Aggregation Engine
+Incrementally maintains issue_patterns and model_characteristics from recorded
+fix attempts so insights never have to be re-derived from raw fix_history.
+A fix counts as successful when it was applied and verified.
+"""
+
+import hashlib
+import json
+import math
+import sqlite3
+from typing import Dict, Iterable, List
+
+# Entries kept in the model_characteristics JSON arrays
+TOP_ITEMS = 3
+
+# z-score for the Wilson lower bound used as pattern confidence (95%)
+CONFIDENCE_Z = 1.96
+
+# Lookups run for every signature and model a recorded batch touches;
+# HOT_QUERIES in ai_memory.py checks their plans
+BEST_FIX_QUERY = '''
+    SELECT fix_commands, analysis, successes, failures FROM pattern_fixes
+    WHERE issue_signature = ? AND successes > 0
+    ORDER BY successes DESC, failures ASC LIMIT 1
+'''
+SIGNATURE_PATTERNS_QUERY = '''
+    SELECT pattern_name, success_count, failure_count FROM issue_patterns
+    WHERE issue_signature = ?
+'''
+MODEL_ISSUES_QUERY = '''
+    SELECT issue_type, attempts, successes FROM model_issue_counts
+    WHERE model_name = ? ORDER BY attempts DESC, issue_type
+'''
+MODEL_FIXES_QUERY = '''
+    SELECT fix_command FROM model_fix_counts
+    WHERE model_name = ? ORDER BY successes DESC LIMIT ?
+'''
+
+
+def fix_key(fix_commands: List[str]) -> str:
+    """Identify a fix by its command list."""
+    return hashlib.md5(json.dumps(fix_commands).encode()).hexdigest()[:16]
+
+
+def confidence_score(successes: int, failures: int) -> float:
+    """Wilson score lower bound of the success rate."""
+    total = successes + failures
+    if total == 0:
+        return 0.0
+    rate = successes / total
+    z2 = CONFIDENCE_Z ** 2
+    centre = rate + z2 / (2 * total)
+    margin = CONFIDENCE_Z * math.sqrt((rate * (1 - rate) + z2 / (4 * total)) / total)
+    return max(0.0, (centre - margin) / (1 + z2 / total))
+
+
+def record_attempts(cursor: sqlite3.Cursor, attempts: Iterable[Dict]):
+    """Fold fix attempts into the counters and refresh the affected aggregates.
+
+    Each attempt holds issue_signature, model_name, issue_type, fix_commands
+    (list), analysis, success and timestamp.
+    """
+    attempts = list(attempts)
+    if not attempts:
+        return
+
+    pattern_rows = []
+    fix_rows = []
+    issue_rows = []
+    model_fix_rows = []
+    for attempt in attempts:
+        success = 1 if attempt['success'] else 0
+        key = fix_key(attempt['fix_commands'])
+        pattern_rows.append((
+            f"{attempt['issue_type']}:{attempt['issue_signature']}",
+            attempt['issue_signature'], success, 1 - success, attempt['timestamp']
+        ))
+        fix_rows.append((
+            attempt['issue_signature'], key, json.dumps(attempt['fix_commands']),
+            attempt['analysis'], success, 1 - success
+        ))
+        issue_rows.append((attempt['model_name'], attempt['issue_type'], success))
+        if success and attempt['fix_commands']:
+            model_fix_rows.append((attempt['model_name'], str(attempt['fix_commands'][0])))
+
+    cursor.executemany('''
+        INSERT INTO issue_patterns (pattern_name, issue_signature, success_count, failure_count, last_seen)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (pattern_name) DO UPDATE SET
+            success_count = success_count + excluded.success_count,
+            failure_count = failure_count + excluded.failure_count,
+            last_seen = excluded.last_seen
+    ''', pattern_rows)
+    cursor.executemany('''
+        INSERT INTO pattern_fixes (issue_signature, fix_key, fix_commands, analysis, successes, failures)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (issue_signature, fix_key) DO UPDATE SET
+            successes = successes + excluded.successes,
+            failures = failures + excluded.failures,
+            analysis = COALESCE(excluded.analysis, analysis)
+    ''', fix_rows)
+    cursor.executemany('''
+        INSERT INTO model_issue_counts (model_name, issue_type, attempts, successes)
+        VALUES (?, ?, 1, ?)
+        ON CONFLICT (model_name, issue_type) DO UPDATE SET
+            attempts = attempts + 1,
+            successes = successes + excluded.successes
+    ''', issue_rows)
+    cursor.executemany('''
+        INSERT INTO model_fix_counts (model_name, fix_command, successes)
+        VALUES (?, ?, 1)
+        ON CONFLICT (model_name, fix_command) DO UPDATE SET successes = successes + 1
+    ''', model_fix_rows)
+
+    timestamps = {}
+    for attempt in attempts:
+        timestamps[attempt['model_name']] = attempt['timestamp']
+    refresh_patterns(cursor, {row[1] for row in pattern_rows})
+    refresh_models(cursor, timestamps)
+
+
+def refresh_patterns(cursor: sqlite3.Cursor, signatures: Iterable[str]):
+    """Recompute best fix and confidence for the given issue signatures."""
+    for signature in signatures:
+        cursor.execute(BEST_FIX_QUERY, (signature,))
+        best = cursor.fetchone()
+        best_fix = json.dumps({
+            'fix_commands': json.loads(best[0]),
+            'analysis': best[1],
+            'successes': best[2],
+            'failures': best[3]
+        }) if best else None
+
+        cursor.execute(SIGNATURE_PATTERNS_QUERY, (signature,))
+        for pattern_name, successes, failures in cursor.fetchall():
+            cursor.execute('''
+                UPDATE issue_patterns SET best_fix = ?, confidence_score = ?
+                WHERE pattern_name = ?
+            ''', (best_fix, confidence_score(successes, failures), pattern_name))
+
+
+def refresh_models(cursor: sqlite3.Cursor, models: Dict[str, str]):
+    """Recompute model_characteristics for the given {model_name: last_updated}."""
+    for model_name, last_updated in models.items():
+        cursor.execute(MODEL_ISSUES_QUERY, (model_name,))
+        issue_counts = cursor.fetchall()
+        total = sum(row[1] for row in issue_counts)
+        successes = sum(row[2] for row in issue_counts)
+
+        cursor.execute(MODEL_FIXES_QUERY, (model_name, TOP_ITEMS))
+        effective_fixes = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute('''
+            INSERT INTO model_characteristics
+            (model_name, total_tests, success_rate, common_issues, effective_fixes, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (model_name) DO UPDATE SET
+                total_tests = excluded.total_tests,
+                success_rate = excluded.success_rate,
+                common_issues = excluded.common_issues,
+                effective_fixes = excluded.effective_fixes,
+                last_updated = excluded.last_updated
+        ''', (
+            model_name, total, successes / total if total else 0.0,
+            json.dumps([row[0] for row in issue_counts[:TOP_ITEMS]]),
+            json.dumps(effective_fixes), last_updated
+        ))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+AI Memory Analysis Cache
+Fixer responses kept in ai_memory.db, so a failure the same fixer and model
+already analyzed is answered without another model call. Entries expire after
+a TTL, the least recently used are evicted past a size bound, and a cached fix
+is dropped once it fails.
+
+The key covers the issue itself but not the historical context shown with it:
+every recorded attempt changes that context, so keying on it made the next
+iteration's lookup for the same failure miss. A fix that fails is invalidated,
+which sends the next lookup back to the model with the failure in its
+context; a fix that has not failed yet is reused until the TTL runs out.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+# Seconds a cached analysis is served; $AI_FIX_CACHE_TTL overrides it and 0
+# turns the cache off
+DEFAULT_TTL_SECONDS = 3 * 24 * 3600
+TTL_ENV = "AI_FIX_CACHE_TTL"
+
+# Entries kept before the least recently used are evicted
+MAX_ENTRIES = 1000
+
+# Issue fields rendered into the fixer prompt; the issue signature only
+# covers a few of them, so the key hashes them all
+KEY_ISSUE_FIELDS = ('model', 'issue_type', 'description', 'test_prompt', 'expected_pattern',
+                    'error_output', 'actual_response')
+
+# Captured output fields; their numbers, hex ids and spacing change from run
+# to run (timestamps, durations, pids, addresses), so they are hashed with
+# those normalized away
+VOLATILE_ISSUE_FIELDS = ('error_output', 'actual_response')
+_HEX_IDS = re.compile(r'\b(?:0x)?(?=[0-9a-f]*\d)[0-9a-f]{4,}\b', re.IGNORECASE)
+_NUMBERS = re.compile(r'\d+')
+_SPACES = re.compile(r'\s+')
+
+COUNTERS = ('hits', 'misses', 'stores', 'expirations', 'evictions', 'invalidations')
+
+# Statements run on every lookup or store; HOT_QUERIES in ai_memory.py checks
+# their plans
+LOOKUP_QUERY = 'SELECT response, expires_at FROM analysis_cache WHERE cache_key = ?'
+EXPIRE_QUERY = 'DELETE FROM analysis_cache WHERE expires_at <= ?'
+# Everything used no later than the first entry past the bound goes
+EVICT_QUERY = '''
+    DELETE FROM analysis_cache WHERE last_used_at <= (
+        SELECT last_used_at FROM analysis_cache ORDER BY last_used_at DESC LIMIT 1 OFFSET ?)
+'''
+INVALIDATE_QUERY = '''
+    DELETE FROM analysis_cache
+    WHERE issue_signature = ? AND fixer_type = ? AND fixer_model = ? AND response_hash = ?
+'''
+
+
+def resolve_ttl(ttl: Optional[float] = None) -> float:
+    """TTL in seconds: the argument, else $AI_FIX_CACHE_TTL, else the default."""
+    if ttl is None:
+        try:
+            ttl = float(os.environ.get(TTL_ENV, DEFAULT_TTL_SECONDS))
+        except ValueError:
+            ttl = DEFAULT_TTL_SECONDS
+    return max(0.0, ttl)
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def issue_hash(issue_data: Dict) -> str:
+    """Fingerprint of the issue details the fixer prompt shows."""
+    return _digest([normalize_output(str(issue_data.get(field, ''))) if field in VOLATILE_ISSUE_FIELDS
+                    else str(issue_data.get(field, '')) for field in KEY_ISSUE_FIELDS])
+
+
+def normalize_output(text: str) -> str:
+    """Captured output with its run-specific numbers, hex ids and spacing collapsed."""
+    text = _HEX_IDS.sub('#', text)
+    text = _NUMBERS.sub('#', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def cache_key(fixer_type: str, fixer_model: str, issue_signature: str, issue_digest: str) -> str:
+    return _digest([fixer_type, fixer_model, issue_signature, issue_digest])
+
+
+def response_hash(response: Dict) -> str:
+    """Identify a fix by its content, so a failed fix can be found again."""
+    return _digest(response)
+
+
+def _count(cursor: sqlite3.Cursor, **increments):
+    assignments = ', '.join(f'{counter} = {counter} + :{counter}' for counter in increments)
+    cursor.execute(f'UPDATE analysis_cache_stats SET {assignments} WHERE id = 1', increments)
+
+
+def lookup(cursor: sqlite3.Cursor, key: str, now: datetime) -> Optional[Dict]:
+    """Return the cached response for key and mark it used, or None on a miss."""
+    row = cursor.execute(LOOKUP_QUERY, (key,)).fetchone()
+    if row is None:
+        _count(cursor, misses=1)
+        return None
+    response, expires_at = row
+    if expires_at <= now.isoformat():
+        cursor.execute('DELETE FROM analysis_cache WHERE cache_key = ?', (key,))
+        _count(cursor, misses=1, expirations=1)
+        return None
+    cursor.execute('UPDATE analysis_cache SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?',
+                   (now.isoformat(), key))
+    _count(cursor, hits=1)
+    return json.loads(response)
+
+
+def store(cursor: sqlite3.Cursor, key: str, fixer_type: str, fixer_model: str, issue_signature: str,
+          issue_digest: str, response: Dict, ttl: float, now: datetime,
+          max_entries: int = MAX_ENTRIES):
+    """Cache a response, then drop expired entries and evict down to max_entries."""
+    cursor.execute('''
+        INSERT OR REPLACE INTO analysis_cache
+        (cache_key, fixer_type, fixer_model, issue_signature, issue_hash, response, response_hash,
+         created_at, expires_at, last_used_at, hits)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+    ''', (key, fixer_type, fixer_model, issue_signature, issue_digest, json.dumps(response),
+          response_hash(response), now.isoformat(), (now + timedelta(seconds=ttl)).isoformat(),
+          now.isoformat()))
+    cursor.execute(EXPIRE_QUERY, (now.isoformat(),))
+    expired = cursor.rowcount
+    cursor.execute(EVICT_QUERY, (max_entries,))
+    _count(cursor, stores=1, expirations=expired, evictions=cursor.rowcount)
+
+
+def invalidate(cursor: sqlite3.Cursor, fixer_type: str, fixer_model: str, issue_signature: str,
+               response: Dict) -> int:
+    """Drop every cached copy of a fix for this issue; returns the entries removed."""
+    cursor.execute(INVALIDATE_QUERY, (issue_signature, fixer_type, fixer_model, response_hash(response)))
+    removed = cursor.rowcount
+    if removed:
+        _count(cursor, invalidations=removed)
+    return removed
+
+
+def clear(cursor: sqlite3.Cursor) -> int:
+    """Remove every entry, keeping the counters; returns the entries removed."""
+    cursor.execute('DELETE FROM analysis_cache')
+    return cursor.rowcount
+
+
+def stats(cursor: sqlite3.Cursor) -> Dict:
+    """Counters plus the current entry count and hit rate."""
+    row = cursor.execute(f'SELECT {", ".join(COUNTERS)} FROM analysis_cache_stats WHERE id = 1').fetchone()
+    result = dict(zip(COUNTERS, row or (0,) * len(COUNTERS)))
+    result['entries'] = cursor.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+    lookups = result['hits'] + result['misses']
+    result['hit_rate'] = result['hits'] / lookups if lookups else 0.0
+    return result
@@ -14,20 +14,21 @@ YELLOW='\033[1;33m'
 RED='\033[0;31m'
 NC='\033[0m'
 
+# Log lines go to stderr so --json output can be piped
 log_info() {
-    echo -e "${BLUE}[INFO]${NC} $*"
+    echo -e "${BLUE}[INFO]${NC} $*" >&2
 }
 
 log_success() {
-    echo -e "${GREEN}[SUCCESS]${NC} $*"
+    echo -e "${GREEN}[SUCCESS]${NC} $*" >&2
 }
 
 log_warning() {
-    echo -e "${YELLOW}[WARNING]${NC} $*"
+    echo -e "${YELLOW}[WARNING]${NC} $*" >&2
 }
 
 log_error() {
-    echo -e "${RED}[ERROR]${NC} $*"
+    echo -e "${RED}[ERROR]${NC} $*" >&2
 }
 
 show_help() {
@@ -38,23 +39,46 @@ show_help() {
     echo "Commands:"
     echo "  stats                    - Show memory statistics"
     echo "  model <name>             - Show insights for specific model"
-    echo "  export [file]            - Export complete insights report"
+    echo "  export [file] [opts]     - Export insights and fix history as JSON Lines"
+    echo "                             (--since ID, --watermark FILE, --gzip; .gz files are compressed)"
     echo "  recent [days]            - Show recent fix activity"
     echo "  successful               - Show most successful fix strategies"
     echo "  patterns                 - Show identified issue patterns"
-    echo "  cleanup [days]           - Clean up old records (default: 30 days)"
+    echo "  cleanup [days] [success_days]"
+    echo "                           - Archive old records (default: failures 30 days,"
+    echo "                             verified fixes 180 days)"
+    echo "  trends [model]           - Show monthly success trends, including archived history"
+    echo "  races [days]             - Show race mode wins, losses and latency per fixer"
+    echo "  commands [days]          - Show fix commands by total time, failures and timeouts"
+    echo "  verifications [days]     - Show fix verification pass rates and latency per model"
+    echo "  cache [clear]            - Show analysis cache counters, or clear the cache"
+    echo "  search <query> [opts]    - Full-text search of past fixes"
+    echo "                             (--model M, --type T, --fixer F, --successful, --limit N)"
+    echo "  service <start|stop|status>"
+    echo "                           - Run the shared memory service (start runs in the foreground)"
     echo "  help                     - Show this help"
     echo ""
+    echo "Query commands accept --json for machine-readable output."
+    echo ""
     echo "Examples:"
     echo "  $0 stats"
     echo "  $0 model deepseek-r1:7b"
-    echo "  $0 export claude_insights.json"
+    echo "  $0 export claude_insights.jsonl.gz"
+    echo "  $0 export nightly_\$(date +%F).jsonl.gz --watermark export.watermark"
     echo "  $0 recent 7"
+    echo "  $0 search \"connection refused\" --model llama3:8b"
+}
+
+# Run an ai_memory.py subcommand. Importing the module instead of running the
+# script lets Python reuse its cached bytecode, so read commands start fast.
+memory_py() {
+    python3 -c 'import sys; sys.path.insert(0, sys.argv.pop(1)); import ai_memory; sys.exit(ai_memory.main())' \
+        "$HERE" "$@"
 }
 
 show_stats() {
     log_info "📊 AI Memory Statistics"
-    python3 "$HERE/ai_memory.py" stats
+    memory_py stats "$@"
 }
 
 show_model_insights() {
@@ -66,191 +90,147 @@ show_model_insights() {
     fi
     
     log_info "🤖 Model Insights: $model_name"
-    python3 "$HERE/ai_memory.py" model "$model_name"
+    memory_py model "$@"
 }
 
 export_insights() {
-    local output_file="${1:-ai_insights_$(date +%Y%m%d_%H%M%S).json}"
+    local output_file="ai_insights_$(date +%Y%m%d_%H%M%S).jsonl.gz"
+    if [ -n "$1" ] && [[ "$1" != -* ]]; then
+        output_file="$1"
+        shift
+    fi
     log_info "📋 Exporting insights to: $output_file"
-    python3 "$HERE/ai_memory.py" export "$output_file"
+    memory_py export "$output_file" "$@"
 }
 
 show_recent_activity() {
-    local days="${1:-7}"
+    local days=7
+    if [[ "$1" =~ ^[0-9]+$ ]]; then
+        days="$1"
+        shift
+    fi
     log_info "📈 Recent activity (last $days days)"
-    
-    # Use Python to query recent activity
-    python3 << EOF
-import sys
-sys.path.append('$HERE')
-from ai_memory import AIMemory
-from datetime import datetime, timedelta
-import sqlite3
-
-memory = AIMemory()
-conn = sqlite3.connect(memory.db_path)
-cursor = conn.cursor()
-
-# Get recent fixes
-cutoff_date = (datetime.now() - timedelta(days=$days)).isoformat()
-cursor.execute('''
-    SELECT timestamp, model_name, issue_type, fix_success, verification_success, claude_analysis
-    FROM fix_history 
-    WHERE timestamp > ? 
-    ORDER BY timestamp DESC
-''', (cutoff_date,))
-
-results = cursor.fetchall()
-if results:
-    print(f"Found {len(results)} recent fix attempts:")
-    for row in results:
-        timestamp, model, issue_type, fix_success, verify_success, analysis = row
-        status = "✅" if fix_success and verify_success else "❌"
-        print(f"{status} {timestamp[:16]} | {model:20} | {issue_type:20} | {analysis[:50]}...")
-else:
-    print("No recent activity found")
-
-conn.close()
-EOF
+    memory_py recent "$days" "$@"
 }
 
 show_successful_strategies() {
     log_info "🎯 Most Successful Fix Strategies"
-    
-    python3 << EOF
-import sys
-sys.path.append('$HERE')
-from ai_memory import AIMemory
-import sqlite3
-
-memory = AIMemory()
-conn = sqlite3.connect(memory.db_path)
-cursor = conn.cursor()
-
-# Get most successful strategies by issue type
-cursor.execute('''
-    SELECT issue_type, COUNT(*) as total, 
-           SUM(CASE WHEN fix_success = 1 AND verification_success = 1 THEN 1 ELSE 0 END) as successful,
-           claude_analysis
-    FROM fix_history 
-    WHERE fix_success = 1 AND verification_success = 1
-    GROUP BY issue_type, claude_analysis
-    ORDER BY successful DESC, total DESC
-    LIMIT 10
-''')
-
-results = cursor.fetchall()
-if results:
-    print("Top successful strategies:")
-    for i, (issue_type, total, successful, analysis) in enumerate(results, 1):
-        success_rate = (successful / total) * 100 if total > 0 else 0
-        print(f"{i:2}. {issue_type:20} | {successful:2}/{total:2} ({success_rate:4.1f}%) | {analysis[:60]}...")
-else:
-    print("No successful strategies recorded yet")
-
-conn.close()
-EOF
+    memory_py successful "$@"
 }
 
 show_patterns() {
     log_info "🔍 Identified Issue Patterns"
-    
-    python3 << EOF
-import sys
-sys.path.append('$HERE')
-from ai_memory import AIMemory
-import sqlite3
-
-memory = AIMemory()
-conn = sqlite3.connect(memory.db_path)
-cursor = conn.cursor()
-
-# Get issue patterns
-cursor.execute('''
-    SELECT issue_type, model_name, COUNT(*) as occurrences,
-           AVG(CASE WHEN fix_success = 1 AND verification_success = 1 THEN 1.0 ELSE 0.0 END) as success_rate
-    FROM fix_history 
-    GROUP BY issue_type, model_name
-    HAVING occurrences > 1
-    ORDER BY occurrences DESC, success_rate ASC
-''')
-
-results = cursor.fetchall()
-if results:
-    print("Issue patterns (recurring issues):")
-    for issue_type, model, count, success_rate in results:
-        rate_str = f"{success_rate*100:4.1f}%" if success_rate is not None else "N/A"
-        status = "⚠️" if success_rate < 0.5 else "✅"
-        print(f"{status} {model:20} | {issue_type:20} | {count:2}x | {rate_str} success")
-else:
-    print("No recurring patterns identified yet")
-
-conn.close()
-EOF
+    memory_py patterns "$@"
 }
 
 cleanup_old_records() {
-    local days="${1:-30}"
-    log_warning "🧹 Cleaning up records older than $days days"
+    local days=30
+    local success_days=180
+    if [[ "$1" =~ ^[0-9]+$ ]]; then
+        days="$1"
+        shift
+        if [[ "$1" =~ ^[0-9]+$ ]]; then
+            success_days="$1"
+            shift
+        fi
+    fi
+    log_warning "🧹 Archiving failed attempts older than $days days and verified fixes older than $success_days days"
+    
+    memory_py prune "$days" "$success_days" "$@" || exit 1
     
-    python3 << EOF
-import sys
-sys.path.append('$HERE')
-from ai_memory import AIMemory
-from datetime import datetime, timedelta
-import sqlite3
+    log_success "Cleanup completed"
+}
 
-memory = AIMemory()
-conn = sqlite3.connect(memory.db_path)
-cursor = conn.cursor()
+show_trends() {
+    log_info "📉 Monthly success trends${1:+ for $1}"
+    memory_py trends "$@"
+}
 
-# Count records to be deleted
-cutoff_date = (datetime.now() - timedelta(days=$days)).isoformat()
-cursor.execute('SELECT COUNT(*) FROM fix_history WHERE timestamp < ?', (cutoff_date,))
-old_count = cursor.fetchone()[0]
+search_history() {
+    if [ -z "$1" ]; then
+        log_error "Search query required"
+        echo "Usage: $0 search <query> [--model M] [--type T] [--fixer F] [--successful] [--limit N]"
+        exit 1
+    fi
 
-if old_count > 0:
-    print(f"Found {old_count} records older than $days days")
-    
-    # Delete old records
-    cursor.execute('DELETE FROM fix_history WHERE timestamp < ?', (cutoff_date,))
-    deleted = cursor.rowcount
-    
-    conn.commit()
-    print(f"Deleted {deleted} old records")
-else:
-    print("No old records to clean up")
+    log_info "🔎 Searching fix history: $1"
+    memory_py search "$@"
+}
 
-conn.close()
-EOF
-    
-    log_success "Cleanup completed"
+show_cache() {
+    if [ "$1" = "clear" ]; then
+        shift
+        log_warning "🧹 Clearing cached fixer analyses"
+        memory_py cache-clear "$@"
+    else
+        log_info "♻️ Analysis cache"
+        memory_py cache "$@"
+    fi
+}
+
+memory_service() {
+    case "$1" in
+        start|stop|status)
+            python3 "$HERE/memory_service.py" "$@"
+            ;;
+        *)
+            log_error "Usage: $0 service <start|stop|status> [--memory-dir DIR] [--socket PATH]"
+            exit 1
+            ;;
+    esac
 }
 
 # Main command handling
-case "${1:-help}" in
+command="${1:-help}"
+shift
+
+case "$command" in
     "stats")
-        show_stats
+        show_stats "$@"
         ;;
     "model")
-        show_model_insights "$2"
+        show_model_insights "$@"
         ;;
     "export")
-        export_insights "$2"
+        export_insights "$@"
         ;;
     "recent")
-        show_recent_activity "$2"
+        show_recent_activity "$@"
         ;;
     "successful")
-        show_successful_strategies
+        show_successful_strategies "$@"
         ;;
     "patterns")
-        show_patterns
+        show_patterns "$@"
         ;;
     "cleanup")
-        cleanup_old_records "$2"
+        cleanup_old_records "$@"
+        ;;
+    "trends")
+        show_trends "$@"
+        ;;
+    "search")
+        search_history "$@"
+        ;;
+    "races")
+        log_info "🏁 Fixer race results"
+        memory_py races "$@"
+        ;;
+    "commands")
+        log_info "🔨 Fix command runs"
+        memory_py commands "$@"
+        ;;
+    "verifications")
+        log_info "🔍 Fix verifications"
+        memory_py verifications "$@"
+        ;;
+    "cache")
+        show_cache "$@"
+        ;;
+    "service")
+        memory_service "$@"
         ;;
     "help"|*)
         show_help
         ;;
-esac
\ No newline at end of file
+esac
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+AI Memory Retention
+Keeps ai_memory.db small. fix_history rows past their retention tier are rolled
+up into per-day, per-model, per-issue-type aggregates, appended to compressed
+monthly archives and deleted; the freed pages are then returned to the
+filesystem with incremental vacuum.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+from typing import Dict, List
+
+# Retention tiers: failed attempts are kept for DEFAULT_DAYS, verified fixes
+# (the ones worth showing to the fixers) for DEFAULT_SUCCESS_DAYS
+DEFAULT_DAYS = 30
+DEFAULT_SUCCESS_DAYS = 180
+
+# Rows archived and deleted per write transaction
+PRUNE_BATCH = 5000
+
+ARCHIVE_FILE_PATTERN = "fix_history-{month}.jsonl.gz"
+
+# Archive members staged until their delete commits, and appends in progress
+PENDING_SUFFIX = ".pending"
+APPEND_SUFFIX = ".append"
+
+
+def rollup(cursor: sqlite3.Cursor, rows: List[Dict]):
+    """Fold fix_history rows into history_rollups."""
+    buckets = {}
+    for row in rows:
+        key = (row['timestamp'][:10], row['model_name'], row['issue_type'])
+        bucket = buckets.setdefault(key, [0, 0, 0, 0.0])
+        bucket[0] += 1
+        bucket[1] += 1 if row['fix_success'] else 0
+        bucket[2] += 1 if row['fix_success'] and row['verification_success'] else 0
+        bucket[3] += row['execution_time_seconds'] or 0.0
+
+    cursor.executemany('''
+        INSERT INTO history_rollups
+        (day, model_name, issue_type, attempts, fixes_applied, fixes_verified, total_execution_seconds)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day, model_name, issue_type) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            fixes_applied = fixes_applied + excluded.fixes_applied,
+            fixes_verified = fixes_verified + excluded.fixes_verified,
+            total_execution_seconds = total_execution_seconds + excluded.total_execution_seconds
+    ''', [key + tuple(bucket) for key, bucket in buckets.items()])
+
+
+def stage_archive(archive_dir: str, rows: List[Dict], batch: str) -> List[str]:
+    """Write rows as gzip members beside their monthly archives and return the staged files.
+
+    A staged file is named <archive>.<batch>.pending and fsynced before
+    returning, so rows are never deleted from the database before they are
+    durable on disk. settle_archives() appends it to the archive once the
+    transaction recording ``batch`` in retention_state has committed.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row['timestamp'][:7], []).append(row)
+
+    staged = []
+    for month, month_rows in sorted(by_month.items()):
+        path = os.path.join(archive_dir, f"{ARCHIVE_FILE_PATTERN.format(month=month)}.{batch}{PENDING_SUFFIX}")
+        with open(path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                for row in month_rows:
+                    archive.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        staged.append(path)
+    return staged
+
+
+def settle_archives(cursor: sqlite3.Cursor, archive_dir: str) -> List[str]:
+    """Append the committed batch's staged members to their archives; returns the archives written.
+
+    Run under the write lock. Staged files of any other batch belong to a
+    prune whose transaction never committed, so their rows are still in the
+    database and the files are dropped. Each append first renames the staged
+    file to <archive>.<size>.append, recording the archive's size, so an
+    append cut short is redone from that size instead of duplicating rows.
+    Each call appends a new gzip member, which gzip readers concatenate
+    transparently.
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    committed = cursor.execute('SELECT archive_batch FROM retention_state WHERE id = 1').fetchone()[0]
+    written = []
+    for name in sorted(os.listdir(archive_dir)):
+        path = os.path.join(archive_dir, name)
+        if name.endswith(APPEND_SUFFIX):
+            archive, size = name[:-len(APPEND_SUFFIX)].rsplit('.', 1)
+        elif name.endswith(PENDING_SUFFIX):
+            archive, batch = name[:-len(PENDING_SUFFIX)].rsplit('.', 1)
+            if batch != committed:
+                os.remove(path)
+                continue
+            archive_path = os.path.join(archive_dir, archive)
+            size = os.path.getsize(archive_path) if os.path.exists(archive_path) else 0
+            staged, path = path, f"{archive_path}.{size}{APPEND_SUFFIX}"
+            os.replace(staged, path)
+        else:
+            continue
+        archive_path = os.path.join(archive_dir, archive)
+        with open(archive_path, 'ab') as raw, open(path, 'rb') as member:
+            raw.truncate(int(size))
+            shutil.copyfileobj(member, raw)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.remove(path)
+        written.append(archive_path)
+    return written
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """Switch the database to incremental auto-vacuum, rebuilding it once if needed.
+
+    Returns True when the one-time VACUUM was run. Must be called outside a
+    transaction.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages: int = 0) -> int:
+    """Release up to ``pages`` free pages (0 for all) and return how many were freed."""
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    # executescript steps the pragma to completion; execute() frees one page
+    conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+    return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
@@ -0,0 +1,816 @@
+#!/usr/bin/env python3
+"""
+AI Memory Schema Migrations
+Versioned, run-once migrations for ai_memory.db plus a query plan check that
+verifies hot queries are served by an index.
+"""
+
+import hashlib
+import json
+import math
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+def _columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    """Return the column names of a table."""
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _migrate_base_tables(cursor: sqlite3.Cursor):
+    """Create the original fix history, pattern and model tables."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fix_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            issue_type TEXT NOT NULL,
+            issue_signature TEXT NOT NULL,  -- Hash of issue characteristics
+            description TEXT NOT NULL,
+            fixer_type TEXT NOT NULL,       -- Type of AI fixer used (claude, qwen, etc.)
+            ai_analysis TEXT NOT NULL,      -- AI analysis from any provider
+            fix_commands TEXT NOT NULL,     -- JSON array
+            fix_success BOOLEAN NOT NULL,
+            verification_success BOOLEAN NOT NULL,
+            execution_time_seconds REAL,
+            system_info TEXT NOT NULL,     -- JSON
+            notes TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS issue_patterns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pattern_name TEXT UNIQUE NOT NULL,
+            issue_signature TEXT NOT NULL,
+            success_count INTEGER DEFAULT 0,
+            failure_count INTEGER DEFAULT 0,
+            best_fix TEXT,              -- JSON of most successful fix
+            last_seen TEXT,
+            confidence_score REAL DEFAULT 0.0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS model_characteristics (
+            model_name TEXT PRIMARY KEY,
+            total_tests INTEGER DEFAULT 0,
+            success_rate REAL DEFAULT 0.0,
+            common_issues TEXT,         -- JSON array
+            effective_fixes TEXT,       -- JSON array
+            last_updated TEXT,
+            performance_notes TEXT
+        )
+    ''')
+
+
+def _migrate_fixer_type(cursor: sqlite3.Cursor):
+    """Add fixer_type to databases created before multiple fixers existed."""
+    if 'fixer_type' not in _columns(cursor, 'fix_history'):
+        cursor.execute("ALTER TABLE fix_history ADD COLUMN fixer_type TEXT NOT NULL DEFAULT 'claude'")
+
+
+def _migrate_ai_analysis(cursor: sqlite3.Cursor):
+    """Add ai_analysis and backfill it from the legacy claude_analysis column."""
+    columns = _columns(cursor, 'fix_history')
+    if 'ai_analysis' not in columns:
+        cursor.execute('ALTER TABLE fix_history ADD COLUMN ai_analysis TEXT')
+    if 'claude_analysis' in columns:
+        # claude_analysis is kept for backward compatibility
+        cursor.execute('UPDATE fix_history SET ai_analysis = claude_analysis WHERE ai_analysis IS NULL')
+
+
+def _migrate_fix_history_indexes(cursor: sqlite3.Cursor):
+    """Index every lookup, ordering and aggregate used against fix_history."""
+    # Exact signature matches, newest first
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fix_history_signature
+        ON fix_history(issue_signature, timestamp)
+    ''')
+    # Same model + issue type, successful fixes first; also covers the
+    # per-model/per-type pattern aggregate
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fix_history_model_type
+        ON fix_history(model_name, issue_type, fix_success, timestamp, verification_success)
+    ''')
+    # Same issue type across models; also covers COUNT(DISTINCT issue_type)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fix_history_type
+        ON fix_history(issue_type, fix_success, timestamp)
+    ''')
+    # Recent history per model; also covers COUNT(DISTINCT model_name)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fix_history_model_time
+        ON fix_history(model_name, timestamp, issue_type, fix_success)
+    ''')
+    # Time range scans: recent activity, cleanup
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fix_history_timestamp
+        ON fix_history(timestamp)
+    ''')
+    # Success counters and successful strategy listing
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fix_history_success
+        ON fix_history(fix_success, verification_success, issue_type)
+    ''')
+
+
+def _migrate_knowledge_base_tables(cursor: sqlite3.Cursor):
+    """Store the knowledge base as indexed tables instead of a rewritten JSON file."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kb_strategies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            issue_type TEXT NOT NULL,
+            strategy TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE (issue_type, strategy)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kb_strategies_type
+        ON kb_strategies(issue_type, id)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kb_model_tips (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_name TEXT NOT NULL,
+            tip TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE (model_name, tip)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_kb_model_tips_model
+        ON kb_model_tips(model_name, id)
+    ''')
+    # Free-form sections (general_patterns, failure_patterns)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kb_entries (
+            section TEXT NOT NULL,
+            entry_key TEXT NOT NULL,
+            value TEXT NOT NULL,        -- JSON
+            PRIMARY KEY (section, entry_key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kb_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+
+def _migrate_memory_stats(cursor: sqlite3.Cursor):
+    """Keep fix_history statistics current with triggers instead of full-table COUNTs."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS memory_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_fixes INTEGER NOT NULL DEFAULT 0,
+            successful_fixes INTEGER NOT NULL DEFAULT 0,
+            models_seen INTEGER NOT NULL DEFAULT 0,
+            issue_types_seen INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Per-value row counts back the distinct counters
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_models (
+            model_name TEXT PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_issue_types (
+            issue_type TEXT PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT PRIMARY KEY,           -- YYYY-MM-DD
+            attempts INTEGER NOT NULL DEFAULT 0,
+            successful INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Backfill from existing history
+    cursor.execute('DELETE FROM memory_stats')
+    cursor.execute('DELETE FROM stats_models')
+    cursor.execute('DELETE FROM stats_issue_types')
+    cursor.execute('DELETE FROM stats_daily')
+    cursor.execute('''
+        INSERT INTO stats_models (model_name, attempts)
+        SELECT model_name, COUNT(*) FROM fix_history GROUP BY model_name
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_issue_types (issue_type, attempts)
+        SELECT issue_type, COUNT(*) FROM fix_history GROUP BY issue_type
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_daily (day, attempts, successful)
+        SELECT substr(timestamp, 1, 10), COUNT(*), SUM(fix_success = 1)
+        FROM fix_history GROUP BY substr(timestamp, 1, 10)
+    ''')
+    cursor.execute('''
+        INSERT INTO memory_stats (id, total_fixes, successful_fixes, models_seen, issue_types_seen)
+        SELECT 1,
+               (SELECT COUNT(*) FROM fix_history),
+               (SELECT COUNT(*) FROM fix_history WHERE fix_success = 1),
+               (SELECT COUNT(*) FROM stats_models),
+               (SELECT COUNT(*) FROM stats_issue_types)
+    ''')
+
+    # New distinct values are counted before their row count is bumped, and
+    # values whose count drops to zero are uncounted after it is lowered
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fix_history_stats_insert
+        AFTER INSERT ON fix_history
+        BEGIN
+            UPDATE memory_stats SET
+                total_fixes = total_fixes + 1,
+                successful_fixes = successful_fixes + (NEW.fix_success = 1),
+                models_seen = models_seen + NOT EXISTS (
+                    SELECT 1 FROM stats_models WHERE model_name = NEW.model_name AND attempts > 0),
+                issue_types_seen = issue_types_seen + NOT EXISTS (
+                    SELECT 1 FROM stats_issue_types WHERE issue_type = NEW.issue_type AND attempts > 0)
+            WHERE id = 1;
+            INSERT INTO stats_models (model_name, attempts) VALUES (NEW.model_name, 1)
+                ON CONFLICT (model_name) DO UPDATE SET attempts = attempts + 1;
+            INSERT INTO stats_issue_types (issue_type, attempts) VALUES (NEW.issue_type, 1)
+                ON CONFLICT (issue_type) DO UPDATE SET attempts = attempts + 1;
+            INSERT INTO stats_daily (day, attempts, successful)
+                VALUES (substr(NEW.timestamp, 1, 10), 1, NEW.fix_success = 1)
+                ON CONFLICT (day) DO UPDATE SET
+                    attempts = attempts + 1,
+                    successful = successful + (NEW.fix_success = 1);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fix_history_stats_delete
+        AFTER DELETE ON fix_history
+        BEGIN
+            UPDATE stats_models SET attempts = attempts - 1 WHERE model_name = OLD.model_name;
+            UPDATE stats_issue_types SET attempts = attempts - 1 WHERE issue_type = OLD.issue_type;
+            UPDATE stats_daily SET
+                attempts = attempts - 1,
+                successful = successful - (OLD.fix_success = 1)
+            WHERE day = substr(OLD.timestamp, 1, 10);
+            UPDATE memory_stats SET
+                total_fixes = total_fixes - 1,
+                successful_fixes = successful_fixes - (OLD.fix_success = 1),
+                models_seen = models_seen - EXISTS (
+                    SELECT 1 FROM stats_models WHERE model_name = OLD.model_name AND attempts = 0),
+                issue_types_seen = issue_types_seen - EXISTS (
+                    SELECT 1 FROM stats_issue_types WHERE issue_type = OLD.issue_type AND attempts = 0)
+            WHERE id = 1;
+            DELETE FROM stats_models WHERE model_name = OLD.model_name AND attempts = 0;
+            DELETE FROM stats_issue_types WHERE issue_type = OLD.issue_type AND attempts = 0;
+            DELETE FROM stats_daily WHERE day = substr(OLD.timestamp, 1, 10) AND attempts = 0;
+        END
+    ''')
+    # Updates of counted columns are rare (manual corrections); treat them as
+    # a delete of the old row followed by an insert of the new one
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fix_history_stats_update
+        AFTER UPDATE OF model_name, issue_type, fix_success, timestamp ON fix_history
+        BEGIN
+            UPDATE stats_models SET attempts = attempts - 1 WHERE model_name = OLD.model_name;
+            UPDATE stats_issue_types SET attempts = attempts - 1 WHERE issue_type = OLD.issue_type;
+            UPDATE stats_daily SET
+                attempts = attempts - 1,
+                successful = successful - (OLD.fix_success = 1)
+            WHERE day = substr(OLD.timestamp, 1, 10);
+            UPDATE memory_stats SET
+                successful_fixes = successful_fixes - (OLD.fix_success = 1) + (NEW.fix_success = 1),
+                models_seen = models_seen
+                    - EXISTS (SELECT 1 FROM stats_models WHERE model_name = OLD.model_name AND attempts = 0)
+                    + NOT EXISTS (SELECT 1 FROM stats_models WHERE model_name = NEW.model_name AND attempts > 0),
+                issue_types_seen = issue_types_seen
+                    - EXISTS (SELECT 1 FROM stats_issue_types WHERE issue_type = OLD.issue_type AND attempts = 0)
+                    + NOT EXISTS (SELECT 1 FROM stats_issue_types WHERE issue_type = NEW.issue_type AND attempts > 0)
+            WHERE id = 1;
+            DELETE FROM stats_models WHERE model_name = OLD.model_name AND attempts = 0;
+            DELETE FROM stats_issue_types WHERE issue_type = OLD.issue_type AND attempts = 0;
+            DELETE FROM stats_daily WHERE day = substr(OLD.timestamp, 1, 10) AND attempts = 0;
+            INSERT INTO stats_models (model_name, attempts) VALUES (NEW.model_name, 1)
+                ON CONFLICT (model_name) DO UPDATE SET attempts = attempts + 1;
+            INSERT INTO stats_issue_types (issue_type, attempts) VALUES (NEW.issue_type, 1)
+                ON CONFLICT (issue_type) DO UPDATE SET attempts = attempts + 1;
+            INSERT INTO stats_daily (day, attempts, successful)
+                VALUES (substr(NEW.timestamp, 1, 10), 1, NEW.fix_success = 1)
+                ON CONFLICT (day) DO UPDATE SET
+                    attempts = attempts + 1,
+                    successful = successful + (NEW.fix_success = 1);
+        END
+    ''')
+
+
+def _migrate_aggregates(cursor: sqlite3.Cursor):
+    """Start maintaining issue_patterns and model_characteristics, backfilled from history."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pattern_fixes (
+            issue_signature TEXT NOT NULL,
+            fix_key TEXT NOT NULL,
+            fix_commands TEXT NOT NULL,     -- JSON array
+            analysis TEXT,
+            successes INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (issue_signature, fix_key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS model_issue_counts (
+            model_name TEXT NOT NULL,
+            issue_type TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            successes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (model_name, issue_type)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS model_fix_counts (
+            model_name TEXT NOT NULL,
+            fix_command TEXT NOT NULL,      -- First command of the fix
+            successes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (model_name, fix_command)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_issue_patterns_signature
+        ON issue_patterns(issue_signature)
+    ''')
+    _backfill_aggregates(cursor)
+
+
+def _wilson_lower_bound(successes: int, failures: int, z: float = 1.96) -> float:
+    total = successes + failures
+    if total == 0:
+        return 0.0
+    rate = successes / total
+    centre = rate + z * z / (2 * total)
+    margin = z * math.sqrt((rate * (1 - rate) + z * z / (4 * total)) / total)
+    return max(0.0, (centre - margin) / (1 + z * z / total))
+
+
+def _backfill_aggregates(cursor: sqlite3.Cursor):
+    """Fold the existing fix history into the aggregates as version 7 defined them.
+
+    A fix succeeds when it was applied and verified and is identified by an
+    MD5 of its command list; pattern confidence is the 95% Wilson lower
+    bound; models keep their three most frequent issue types and most
+    successful first commands.
+    """
+    patterns = {}       # pattern_name -> [signature, successes, failures, last_seen]
+    fixes = {}          # (signature, fix_key) -> [commands JSON, analysis, successes, failures]
+    model_issues = {}   # (model_name, issue_type) -> [attempts, successes]
+    model_fixes = {}    # (model_name, first command) -> successes
+    model_updated = {}  # model_name -> timestamp of its latest attempt
+    for table in ('pattern_fixes', 'model_issue_counts', 'model_fix_counts', 'issue_patterns'):
+        cursor.execute(f'DELETE FROM {table}')
+    for signature, model_name, issue_type, commands, analysis, success, timestamp in cursor.execute('''
+        SELECT issue_signature, model_name, issue_type, fix_commands, ai_analysis,
+               fix_success = 1 AND verification_success = 1, timestamp
+        FROM fix_history ORDER BY id
+    '''):
+        try:
+            commands = json.loads(commands or '[]')
+        except json.JSONDecodeError:
+            commands = []
+        if not isinstance(commands, list):
+            commands = [commands]
+        success = 1 if success else 0
+        commands_json = json.dumps(commands)
+
+        pattern = patterns.setdefault(f"{issue_type}:{signature}", [signature, 0, 0, None])
+        pattern[1] += success
+        pattern[2] += 1 - success
+        pattern[3] = timestamp
+        fix = fixes.setdefault((signature, hashlib.md5(commands_json.encode()).hexdigest()[:16]),
+                               [commands_json, None, 0, 0])
+        fix[1] = analysis if analysis is not None else fix[1]
+        fix[2] += success
+        fix[3] += 1 - success
+        counts = model_issues.setdefault((model_name, issue_type), [0, 0])
+        counts[0] += 1
+        counts[1] += success
+        if success and commands:
+            key = (model_name, str(commands[0]))
+            model_fixes[key] = model_fixes.get(key, 0) + 1
+        model_updated[model_name] = timestamp
+
+    best_fixes = {}
+    for (signature, key), (commands_json, analysis, successes, failures) in sorted(fixes.items()):
+        best = best_fixes.get(signature)
+        if successes and (best is None or (successes, -failures) > (best['successes'], -best['failures'])):
+            best_fixes[signature] = {'fix_commands': json.loads(commands_json), 'analysis': analysis,
+                                     'successes': successes, 'failures': failures}
+
+    cursor.executemany('''
+        INSERT INTO issue_patterns
+        (pattern_name, issue_signature, success_count, failure_count, best_fix, last_seen, confidence_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(name, signature, successes, failures,
+           json.dumps(best_fixes[signature]) if signature in best_fixes else None,
+           last_seen, _wilson_lower_bound(successes, failures))
+          for name, (signature, successes, failures, last_seen) in patterns.items()])
+    cursor.executemany('''
+        INSERT INTO pattern_fixes (issue_signature, fix_key, fix_commands, analysis, successes, failures)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [key + tuple(values) for key, values in fixes.items()])
+    cursor.executemany('''
+        INSERT INTO model_issue_counts (model_name, issue_type, attempts, successes) VALUES (?, ?, ?, ?)
+    ''', [key + tuple(values) for key, values in model_issues.items()])
+    cursor.executemany('''
+        INSERT INTO model_fix_counts (model_name, fix_command, successes) VALUES (?, ?, ?)
+    ''', [key + (successes,) for key, successes in model_fixes.items()])
+
+    models = []
+    for model_name, last_updated in model_updated.items():
+        issues = sorted(((issue_type, attempts, successes)
+                         for (name, issue_type), (attempts, successes) in model_issues.items()
+                         if name == model_name), key=lambda row: (-row[1], row[0]))
+        total = sum(row[1] for row in issues)
+        effective = sorted(((command, successes) for (name, command), successes in model_fixes.items()
+                            if name == model_name), key=lambda row: (-row[1], row[0]))
+        models.append((model_name, total, sum(row[2] for row in issues) / total if total else 0.0,
+                       json.dumps([row[0] for row in issues[:3]]),
+                       json.dumps([row[0] for row in effective[:3]]), last_updated))
+    cursor.executemany('''
+        INSERT INTO model_characteristics
+        (model_name, total_tests, success_rate, common_issues, effective_fixes, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (model_name) DO UPDATE SET
+            total_tests = excluded.total_tests,
+            success_rate = excluded.success_rate,
+            common_issues = excluded.common_issues,
+            effective_fixes = excluded.effective_fixes,
+            last_updated = excluded.last_updated
+    ''', models)
+
+
+def _migrate_error_output(cursor: sqlite3.Cursor):
+    """Keep the failing test's error output so fixes can be retrieved by similarity."""
+    if 'error_output' not in _columns(cursor, 'fix_history'):
+        cursor.execute('ALTER TABLE fix_history ADD COLUMN error_output TEXT')
+
+
+def _migrate_fix_history_fts(cursor: sqlite3.Cursor):
+    """Index fix text with FTS5, kept in sync with fix_history by triggers."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS fix_history_fts USING fts5(
+            description, ai_analysis, notes, fix_commands,
+            content = 'fix_history', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute("INSERT INTO fix_history_fts (fix_history_fts) VALUES ('rebuild')")
+
+    # External-content tables are updated by replaying the old row as a
+    # 'delete' command and inserting the new one
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fix_history_fts_insert
+        AFTER INSERT ON fix_history
+        BEGIN
+            INSERT INTO fix_history_fts (rowid, description, ai_analysis, notes, fix_commands)
+            VALUES (NEW.id, NEW.description, NEW.ai_analysis, NEW.notes, NEW.fix_commands);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fix_history_fts_delete
+        AFTER DELETE ON fix_history
+        BEGIN
+            INSERT INTO fix_history_fts (fix_history_fts, rowid, description, ai_analysis, notes, fix_commands)
+            VALUES ('delete', OLD.id, OLD.description, OLD.ai_analysis, OLD.notes, OLD.fix_commands);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fix_history_fts_update
+        AFTER UPDATE OF description, ai_analysis, notes, fix_commands ON fix_history
+        BEGIN
+            INSERT INTO fix_history_fts (fix_history_fts, rowid, description, ai_analysis, notes, fix_commands)
+            VALUES ('delete', OLD.id, OLD.description, OLD.ai_analysis, OLD.notes, OLD.fix_commands);
+            INSERT INTO fix_history_fts (rowid, description, ai_analysis, notes, fix_commands)
+            VALUES (NEW.id, NEW.description, NEW.ai_analysis, NEW.notes, NEW.fix_commands);
+        END
+    ''')
+
+
+def _migrate_retention(cursor: sqlite3.Cursor):
+    """Add history rollups and keep lifetime statistics when old rows are pruned."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history_rollups (
+            day TEXT NOT NULL,              -- YYYY-MM-DD
+            model_name TEXT NOT NULL,
+            issue_type TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            fixes_applied INTEGER NOT NULL DEFAULT 0,
+            fixes_verified INTEGER NOT NULL DEFAULT 0,
+            total_execution_seconds REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, model_name, issue_type)
+        )
+    ''')
+    # pruning is only ever set inside a pruning transaction, so other
+    # connections never observe it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS retention_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            pruning INTEGER NOT NULL DEFAULT 0,
+            rows_archived INTEGER NOT NULL DEFAULT 0,
+            last_pruned_at TEXT
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO retention_state (id) VALUES (1)')
+    # Pruned rows stay counted in the statistics; only manual deletes
+    # uncount them
+    cursor.execute('DROP TRIGGER IF EXISTS trg_fix_history_stats_delete')
+    cursor.execute('''
+        CREATE TRIGGER trg_fix_history_stats_delete
+        AFTER DELETE ON fix_history
+        WHEN NOT (SELECT pruning FROM retention_state WHERE id = 1)
+        BEGIN
+            UPDATE stats_models SET attempts = attempts - 1 WHERE model_name = OLD.model_name;
+            UPDATE stats_issue_types SET attempts = attempts - 1 WHERE issue_type = OLD.issue_type;
+            UPDATE stats_daily SET
+                attempts = attempts - 1,
+                successful = successful - (OLD.fix_success = 1)
+            WHERE day = substr(OLD.timestamp, 1, 10);
+            UPDATE memory_stats SET
+                total_fixes = total_fixes - 1,
+                successful_fixes = successful_fixes - (OLD.fix_success = 1),
+                models_seen = models_seen - EXISTS (
+                    SELECT 1 FROM stats_models WHERE model_name = OLD.model_name AND attempts = 0),
+                issue_types_seen = issue_types_seen - EXISTS (
+                    SELECT 1 FROM stats_issue_types WHERE issue_type = OLD.issue_type AND attempts = 0)
+            WHERE id = 1;
+            DELETE FROM stats_models WHERE model_name = OLD.model_name AND attempts = 0;
+            DELETE FROM stats_issue_types WHERE issue_type = OLD.issue_type AND attempts = 0;
+            DELETE FROM stats_daily WHERE day = substr(OLD.timestamp, 1, 10) AND attempts = 0;
+        END
+    ''')
+
+
+def _analysis_cache_table(cursor: sqlite3.Cursor, issue_column: str):
+    """The analysis_cache table and its indexes, keyed by issue_column."""
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            cache_key TEXT PRIMARY KEY,
+            fixer_type TEXT NOT NULL,
+            fixer_model TEXT NOT NULL,
+            issue_signature TEXT NOT NULL,
+            {issue_column} TEXT NOT NULL,
+            response TEXT NOT NULL,         -- JSON fix recommendation
+            response_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            last_used_at TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # LRU eviction order
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used
+        ON analysis_cache(last_used_at)
+    ''')
+    # Expiry sweep
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires
+        ON analysis_cache(expires_at)
+    ''')
+    # Invalidating a failed fix
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_analysis_cache_signature
+        ON analysis_cache(issue_signature, fixer_type, fixer_model, response_hash)
+    ''')
+
+
+def _migrate_analysis_cache(cursor: sqlite3.Cursor):
+    """Cache fixer responses across runs."""
+    _analysis_cache_table(cursor, 'context_hash')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_cache_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,
+            stores INTEGER NOT NULL DEFAULT 0,
+            expirations INTEGER NOT NULL DEFAULT 0,
+            evictions INTEGER NOT NULL DEFAULT 0,
+            invalidations INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO analysis_cache_stats (id) VALUES (1)')
+
+
+def _migrate_provider_races(cursor: sqlite3.Cursor):
+    """Record how each fixer fared when several raced on one issue."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS provider_races (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            race_id TEXT NOT NULL,          -- Entrants of one race share it
+            timestamp TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            issue_type TEXT NOT NULL,
+            fixer_type TEXT NOT NULL,
+            outcome TEXT NOT NULL,          -- won, lost, error or cancelled
+            latency_seconds REAL NOT NULL,  -- Until the answer, or until cancelled
+            confidence REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_provider_races_time
+        ON provider_races(timestamp, fixer_type)
+    ''')
+
+
+def _migrate_command_runs(cursor: sqlite3.Cursor):
+    """Record every fix command executed, with its duration and exit status."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS command_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            command TEXT NOT NULL,
+            scope TEXT NOT NULL,            -- read_only, model or global
+            status TEXT NOT NULL,           -- ok, failed, timeout, skipped or error
+            exit_code INTEGER,              -- NULL unless the command exited
+            duration_seconds REAL NOT NULL,
+            shared_by INTEGER NOT NULL      -- Fixes the run was coalesced from
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_command_runs_time
+        ON command_runs(timestamp, command)
+    ''')
+
+
+def _migrate_fix_verifications(cursor: sqlite3.Cursor):
+    """Record each fix verification with its model load time and latency."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fix_verifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            issue_type TEXT NOT NULL,
+            checks INTEGER NOT NULL,        -- Prompts sent
+            passed_checks INTEGER NOT NULL,
+            passed BOOLEAN NOT NULL,
+            load_seconds REAL,              -- NULL when the model did not load
+            latency_seconds REAL NOT NULL,  -- Load plus every check
+            error TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fix_verifications_time
+        ON fix_verifications(timestamp, model_name)
+    ''')
+
+
+def _migrate_analysis_cache_issue_key(cursor: sqlite3.Cursor):
+    """Key cached analyses on the issue instead of the historical context.
+
+    Entries under the old keys can never be hit again, so the table is
+    recreated; the counters are kept.
+    """
+    cursor.execute('DROP TABLE IF EXISTS analysis_cache')
+    _analysis_cache_table(cursor, 'issue_hash')
+
+
+def _migrate_memory_generation(cursor: sqlite3.Cursor):
+    """Count changes to the history the fixer context is built from.
+
+    Triggers bump the counter in the writing transaction, so every process
+    sees writes made by any other one (CLI prune, fallback clients, test.sh).
+    """
+    cursor.execute('ALTER TABLE memory_stats ADD COLUMN generation INTEGER NOT NULL DEFAULT 0')
+    for name, event in (('insert', 'INSERT'), ('delete', 'DELETE'), ('update', 'UPDATE')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_fix_history_generation_{name}
+            AFTER {event} ON fix_history
+            BEGIN
+                UPDATE memory_stats SET generation = generation + 1 WHERE id = 1;
+            END
+        ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_kb_strategies_generation_insert
+        AFTER INSERT ON kb_strategies
+        BEGIN
+            UPDATE memory_stats SET generation = generation + 1 WHERE id = 1;
+        END
+    ''')
+
+
+def _migrate_aggregate_report_indexes(cursor: sqlite3.Cursor):
+    """Index the counters the successful and patterns reports rank by."""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pattern_fixes_successes
+        ON pattern_fixes(successes)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_model_issue_counts_attempts
+        ON model_issue_counts(attempts)
+    ''')
+
+
+def _migrate_retention_archive_batch(cursor: sqlite3.Cursor):
+    """Remember which prune batch last committed, so only its staged archive members are kept."""
+    cursor.execute('ALTER TABLE retention_state ADD COLUMN archive_batch TEXT')
+
+
+# Ordered migrations: (version, name, step). Never renumber or edit an applied
+# step; append a new one instead. Steps spell out their own DDL and data
+# changes rather than calling into the modules that use the tables, so later
+# changes to those modules cannot alter what an old step does.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, 'base_tables', _migrate_base_tables),
+    (2, 'fixer_type_column', _migrate_fixer_type),
+    (3, 'ai_analysis_column', _migrate_ai_analysis),
+    (4, 'fix_history_indexes', _migrate_fix_history_indexes),
+    (5, 'knowledge_base_tables', _migrate_knowledge_base_tables),
+    (6, 'memory_stats_summary', _migrate_memory_stats),
+    (7, 'pattern_and_model_aggregates', _migrate_aggregates),
+    (8, 'error_output_column', _migrate_error_output),
+    (9, 'fix_history_fts', _migrate_fix_history_fts),
+    (10, 'retention', _migrate_retention),
+    (11, 'analysis_cache', _migrate_analysis_cache),
+    (12, 'provider_races', _migrate_provider_races),
+    (13, 'command_runs', _migrate_command_runs),
+    (14, 'fix_verifications', _migrate_fix_verifications),
+    (15, 'analysis_cache_issue_key', _migrate_analysis_cache_issue_key),
+    (16, 'memory_generation', _migrate_memory_generation),
+    (17, 'aggregate_report_indexes', _migrate_aggregate_report_indexes),
+    (18, 'retention_archive_batch', _migrate_retention_archive_batch),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the applied schema version (0 for an unversioned database)."""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> List[str]:
+    """Apply pending migrations exactly once and return the names applied."""
+    if get_schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    # Take the write lock before re-reading the version so concurrent
+    # processes cannot apply the same step twice
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        ''')
+        current = get_schema_version(conn)
+        applied = []
+        for version, name, step in MIGRATIONS:
+            if version <= current:
+                continue
+            step(cursor)
+            cursor.execute('INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                           (version, name, datetime.now().isoformat()))
+            applied.append(name)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return applied
+
+
+def _is_table_scan(detail: str) -> bool:
+    """A plan step is a full scan if it reads a whole table, even through an index.
+
+    SCAN ... USING [COVERING] INDEX still visits every row; only SEARCH
+    steps narrow the read. Virtual tables such as FTS5 report their own
+    index as VIRTUAL TABLE INDEX, which is a lookup. Scanning a subquery
+    reads the rows it produced, which its own plan steps account for.
+    """
+    return (detail.startswith('SCAN ') and ' VIRTUAL TABLE INDEX ' not in detail
+            and not detail.startswith('SCAN (subquery-'))
+
+
+def check_query_plans(conn: sqlite3.Connection, queries: Dict[str, Tuple[str, tuple]],
+                      allowed: Iterable[str] = ()) -> Dict[str, List[str]]:
+    """EXPLAIN every query and return the ones that fall back to a full scan.
+
+    ``queries`` maps names to (sql, sample parameters); names in ``allowed``
+    read whole tables by design and are skipped.
+    """
+    allowed = set(allowed)
+    scans = {}
+    for name, (sql, params) in queries.items():
+        if name in allowed:
+            continue
+        plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        offending = [row[3] for row in plan if _is_table_scan(row[3])]
+        if offending:
+            scans[name] = offending
+    return scans
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+AI Memory Service
+Optional long-running process that owns ai_memory.db for every fixer on the
+machine. Clients talk newline-delimited JSON over a Unix socket; reads are
+served concurrently from the pooled connections and the context cache, and
+writes from all clients are group-committed by a single writer thread.
+
+AIMemory switches to this service automatically when its socket exists and
+falls back to direct SQLite access otherwise. Fix attempts are group-committed;
+the other writes of the fix loop (analysis cache lookups, stores and
+invalidations, race, command and verification rows) run on the service's
+writer one call at a time. Maintenance writes are not routed: prune_history,
+clear_analysis_cache, rebuild_vector_index and the one-time knowledge base
+import always write to SQLite directly from the calling process.
+"""
+
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from ai_memory import AIMemory
+
+# Seconds a client waits for a reply; covers a write queued behind a busy commit
+CLIENT_TIMEOUT_SECONDS = 60.0
+
+# Upper bound on fix attempts folded into one group commit
+GROUP_COMMIT_MAX_ATTEMPTS = 512
+
+SOCKET_ENV = "AI_MEMORY_SOCKET"
+SOCKET_NAME = "memory.sock"
+
+# AIMemory methods clients may call; everything else is rejected
+READ_METHODS = {
+    'build_context_for_ai', 'query_similar_issues', 'get_model_insights', 'get_issue_pattern',
+    'get_memory_stats', 'search', 'find_similar_fixes', 'find_similar_fixes_batch',
+}
+WRITE_METHODS = {'record_fix_attempts_bulk'}
+# Writes run as they arrive; AIMemory's write lock orders them with the group commits
+SINGLE_WRITE_METHODS = {
+    'get_cached_analysis', 'cache_analysis', 'invalidate_cached_analysis', 'record_race',
+    'record_command_runs', 'record_verification',
+}
+
+# Exceptions re-raised with their own type on the client
+PASSTHROUGH_ERRORS = {'ValueError': ValueError, 'KeyError': KeyError, 'TypeError': TypeError}
+
+
+class MemoryServiceError(Exception):
+    """The service reported an error or stopped answering mid-request."""
+
+
+class ServiceUnavailable(MemoryServiceError):
+    """No service is listening; callers fall back to direct SQLite access."""
+
+
+def default_socket_path(memory_dir: str) -> str:
+    """Socket for a memory directory, overridable with $AI_MEMORY_SOCKET."""
+    return os.environ.get(SOCKET_ENV) or os.path.join(memory_dir, SOCKET_NAME)
+
+
+class GroupCommitter:
+    """Serialize writes through one thread, committing everything queued meanwhile together."""
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.commits = 0
+        self.attempts = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="memory-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, attempts: List[Dict]) -> List[int]:
+        """Queue attempts for the next commit and wait for their fix IDs."""
+        slot = {'attempts': attempts, 'done': threading.Event()}
+        self._queue.put(slot)
+        slot['done'].wait()
+        if 'error' in slot:
+            raise slot['error']
+        return slot['ids']
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            slot = self._queue.get()
+            if slot is None:
+                return
+            batch = [slot]
+            count = len(slot['attempts'])
+            # Requests that arrived while the previous commit ran share this one
+            while count < GROUP_COMMIT_MAX_ATTEMPTS:
+                try:
+                    slot = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if slot is None:
+                    self._queue.put(None)
+                    break
+                batch.append(slot)
+                count += len(slot['attempts'])
+            self._commit(batch)
+
+    def _commit(self, batch: List[Dict]):
+        attempts = [attempt for slot in batch for attempt in slot['attempts']]
+        try:
+            ids = self.memory.record_fix_attempts_bulk(attempts)
+        except Exception:
+            # Commit requests one by one so a bad attempt only fails its sender
+            for slot in batch:
+                try:
+                    slot['ids'] = self.memory.record_fix_attempts_bulk(slot['attempts'])
+                    self.commits += 1
+                    self.attempts += len(slot['attempts'])
+                except Exception as e:
+                    slot['error'] = e
+                slot['done'].set()
+            return
+
+        self.commits += 1
+        self.attempts += len(attempts)
+        offset = 0
+        for slot in batch:
+            slot['ids'] = ids[offset:offset + len(slot['attempts'])]
+            offset += len(slot['attempts'])
+            slot['done'].set()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """One client connection: a request per line, answered in order."""
+
+    def handle(self):
+        service = self.server.service
+        with service.lock:
+            service.clients += 1
+        try:
+            for line in self.rfile:
+                self.wfile.write(json.dumps(service.dispatch(line)).encode('utf-8') + b'\n')
+                self.wfile.flush()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with service.lock:
+                service.clients -= 1
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MemoryService:
+    """Serve one AIMemory over a Unix socket."""
+
+    def __init__(self, memory_dir: str = None, socket_path: str = None, reader_pool_size: int = 8):
+        self.memory = AIMemory(memory_dir, reader_pool_size=reader_pool_size, use_service=False)
+        self.socket_path = socket_path or default_socket_path(self.memory.memory_dir)
+        self.committer = GroupCommitter(self.memory)
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.clients = 0
+        self._server = None
+
+    def dispatch(self, line: bytes) -> Dict:
+        """Run one request and build its reply."""
+        with self.lock:
+            self.requests += 1
+        try:
+            request = json.loads(line)
+            method = request['method']
+            args = request.get('args', [])
+            kwargs = request.get('kwargs', {})
+            if method in WRITE_METHODS:
+                result = self.committer.submit(*args, **kwargs)
+            elif method in READ_METHODS or method in SINGLE_WRITE_METHODS:
+                result = getattr(self.memory, method)(*args, **kwargs)
+            elif method == 'status':
+                result = self.status()
+            elif method == 'shutdown':
+                threading.Thread(target=self.shutdown, daemon=True).start()
+                result = True
+            else:
+                raise ValueError(f"Unknown memory service method: {method}")
+            return {'result': result}
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            return {'error': {'type': type(e).__name__, 'message': str(e)}}
+
+    def status(self) -> Dict:
+        """Service counters: requests, connected clients and group commit batching."""
+        commits = self.committer.commits
+        return {
+            'pid': os.getpid(),
+            'socket': self.socket_path,
+            'memory_directory': self.memory.memory_dir,
+            'uptime_seconds': time.time() - self.started_at,
+            'clients': self.clients,
+            'requests': self.requests,
+            'errors': self.errors,
+            'commits': commits,
+            'attempts_committed': self.committer.attempts,
+            'attempts_per_commit': self.committer.attempts / commits if commits else 0.0,
+        }
+
+    def serve_forever(self):
+        """Bind the socket and serve until shutdown() or SIGTERM/SIGINT."""
+        if os.path.exists(self.socket_path):
+            try:
+                MemoryClient(self.socket_path).call('status')
+            except ServiceUnavailable:
+                os.unlink(self.socket_path)  # left behind by a crashed service
+            else:
+                raise RuntimeError(f"A memory service is already listening on {self.socket_path}")
+
+        self._server = _Server(self.socket_path, _RequestHandler)
+        self._server.service = self
+        os.chmod(self.socket_path, 0o660)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: threading.Thread(target=self.shutdown, daemon=True).start())
+
+        # Bring the schema up to date before the first client arrives
+        self.memory.get_memory_stats()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.committer.stop()
+            self.memory.close()
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class MemoryClient:
+    """Blocking client with one connection per thread."""
+
+    def __init__(self, socket_path: str, timeout: float = CLIENT_TIMEOUT_SECONDS):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ServiceUnavailable(f"No memory service on {self.socket_path}: {e}") from e
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+            self._local.conn = None
+
+    def call(self, method: str, *args, **kwargs):
+        """Call a service method and return its result.
+
+        Raises ServiceUnavailable when the request could not be sent, so it is
+        safe to retry directly; any failure after that raises
+        MemoryServiceError because the service may already have applied it.
+        """
+        payload = json.dumps({'method': method, 'args': args, 'kwargs': kwargs}).encode('utf-8') + b'\n'
+        sock, reader = self._connection()
+        try:
+            sock.sendall(payload)
+        except OSError as e:
+            self.close()
+            raise ServiceUnavailable(f"Memory service connection lost: {e}") from e
+        try:
+            line = reader.readline()
+        except OSError as e:
+            self.close()
+            raise MemoryServiceError(f"Memory service did not answer {method}: {e}") from e
+        if not line:
+            self.close()
+            raise MemoryServiceError(f"Memory service closed the connection during {method}")
+
+        response = json.loads(line)
+        if 'error' in response:
+            error = response['error']
+            raise PASSTHROUGH_ERRORS.get(error['type'], MemoryServiceError)(error['message'])
+        return response['result']
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Shared AI memory service")
+    parser.add_argument("command", choices=["start", "stop", "status"])
+    parser.add_argument("--memory-dir", help="Memory directory (default: AIMemory next to Scripts)")
+    parser.add_argument("--socket", help=f"Socket path (default: ${SOCKET_ENV} or <memory-dir>/{SOCKET_NAME})")
+    args = parser.parse_args(argv)
+
+    memory_dir = args.memory_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "AIMemory")
+    socket_path = args.socket or default_socket_path(memory_dir)
+
+    if args.command == "start":
+        service = MemoryService(memory_dir, socket_path)
+        print(f"🧠 Memory service listening on {socket_path} (pid {os.getpid()})")
+        service.serve_forever()
+        print("🛑 Memory service stopped")
+        return 0
+
+    client = MemoryClient(socket_path, timeout=5.0)
+    try:
+        if args.command == "stop":
+            client.call('shutdown')
+            print("🛑 Memory service stopping")
+        else:
+            print(json.dumps(client.call('status'), indent=2))
+    except ServiceUnavailable:
+        print(f"❌ No memory service running on {socket_path}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+AI Memory Vector Index
+Similarity search over past fixes (RAG over fix_history). Each fix is embedded
+from its description, error output and AI analysis into a memory-mapped
+float32 matrix; queries are answered by cosine similarity, exactly for small
+histories and through an inverted-file (IVF) partition once the history grows.
+Requires numpy; AIMemory disables the index when it is not installed.
+"""
+
+import fcntl
+import json
+import math
+import os
+import re
+import time
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rows below this count are searched exhaustively; above it an IVF partition is trained
+IVF_MIN_ROWS = 20000
+
+# Rows appended since the last partitioning are scanned exhaustively by every
+# query; past this many they are folded into the partitions
+IVF_MAX_TAIL_ROWS = 8192
+
+# Retrain the centroids once the live row count drifts this far from the
+# count they were trained on, or once this share of partitioned rows is removed
+IVF_RETRAIN_FRACTION = 0.2
+
+# Partitions per square root of the row count, and partitions probed per query
+IVF_LISTS_PER_SQRT = 2
+IVF_NPROBE = 8
+
+# k-means iterations and training sample size per partition
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 32
+
+# Rows processed per chunk while assigning or rewriting the matrix
+CHUNK_ROWS = 16384
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+DIGITS_PATTERN = re.compile(r"\d+")
+
+
+class HashingEmbedder:
+    """Local, dependency-free embedder using the signed hashing trick.
+
+    Words and word bigrams are hashed into a fixed number of dimensions with
+    sublinear term weighting; digits are collapsed so that failures differing
+    only in counts, sizes or lengths land close together.
+    """
+
+    name = "hashing-v1"
+
+    def __init__(self, dim: int = 128):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = TOKEN_PATTERN.findall(DIGITS_PATTERN.sub("0", text.lower()))
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into L2-normalized float32 rows."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[int, float] = {}
+            for feature in self._features(text or ""):
+                hashed = zlib.crc32(feature.encode())
+                index = hashed % self.dim
+                sign = 1.0 if (hashed >> 31) & 1 else -1.0
+                counts[index] = counts.get(index, 0.0) + sign
+            for index, value in counts.items():
+                matrix[row, index] = math.copysign(1.0 + math.log(abs(value)), value) if value else 0.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class VectorIndex:
+    """Memory-mapped cosine similarity index keyed by fix_history row id.
+
+    Layout on disk (all in ``directory``):
+      meta.json     - dimensions, row counts, partition info and id watermark
+      matrix.f32    - float32 rows; rows [0, partitioned) are grouped by partition
+      ids.i64       - fix_history id of every row
+      ivf.npz       - partition centroids and row offsets (once trained)
+    """
+
+    def __init__(self, directory: str, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        os.makedirs(directory, exist_ok=True)
+
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._matrix_path = os.path.join(directory, "matrix.f32")
+        self._ids_path = os.path.join(directory, "ids.i64")
+        self._ivf_path = os.path.join(directory, "ivf.npz")
+        self._lock_path = os.path.join(directory, "lock")
+        self._build_lock_path = os.path.join(directory, "build.lock")
+
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+
+    def _default_meta(self) -> Dict:
+        return {
+            'embedder': self.embedder.name,
+            'dim': self.dim,
+            'count': 0,
+            'capacity': 0,
+            'partitioned': 0,
+            'max_fix_id': 0,
+            'trained': 0,       # Live rows the centroids were trained on
+            'deleted': 0,       # Removed rows not yet reclaimed
+            'generation': 0
+        }
+
+    def _load(self):
+        """(Re)load metadata and memory maps if another writer changed them."""
+        try:
+            mtime = os.stat(self._meta_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime == self._meta_mtime:
+            return
+
+        meta = self._default_meta()
+        if mtime is not None:
+            with open(self._meta_path, 'r') as f:
+                stored = json.load(f)
+            # An index built by another embedder is unusable; start over
+            if stored.get('embedder') == self.embedder.name and stored.get('dim') == self.dim:
+                meta.update(stored)
+        self.meta = meta
+        self._meta_mtime = mtime
+        self._matrix = None
+        self._ids = None
+        self._centroids = None
+        self._offsets = None
+        if meta['capacity']:
+            self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode='r+',
+                                     shape=(meta['capacity'], self.dim))
+            self._ids = np.memmap(self._ids_path, dtype=np.int64, mode='r+', shape=(meta['capacity'],))
+        if meta['partitioned'] and os.path.exists(self._ivf_path):
+            with np.load(self._ivf_path) as ivf:
+                self._centroids = ivf['centroids']
+                self._offsets = ivf['offsets']
+
+    def _save_meta(self):
+        self.meta['generation'] += 1
+        temp_path = f"{self._meta_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(temp_path, self._meta_path)
+        self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+
+    @contextmanager
+    def _exclusive(self):
+        """Serialize writers across threads and processes."""
+        with self._lock:
+            with open(self._lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._load()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _shared(self):
+        """Keep other processes from swapping files in while this one reads them."""
+        with self._lock:
+            with open(self._lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                try:
+                    self._load()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_capacity(self, rows: int):
+        capacity = self.meta['capacity']
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        for path, itemsize in ((self._matrix_path, 4 * self.dim), (self._ids_path, 8)):
+            with open(path, 'ab') as f:
+                f.truncate(new_capacity * itemsize)
+        self.meta['capacity'] = new_capacity
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode='r+',
+                                 shape=(new_capacity, self.dim))
+        self._ids = np.memmap(self._ids_path, dtype=np.int64, mode='r+', shape=(new_capacity,))
+
+    # -- writes ------------------------------------------------------------
+
+    @property
+    def max_fix_id(self) -> int:
+        """Highest fix_history id already indexed."""
+        self._load()
+        return self.meta['max_fix_id']
+
+    def __len__(self) -> int:
+        self._load()
+        return self.meta['count'] - self.meta['deleted']
+
+    def add(self, fix_ids: Sequence[int], texts: Sequence[str]):
+        """Embed and append rows; ids at or below the watermark are skipped.
+
+        Rows land in the unpartitioned tail; call partition() (AIMemory does
+        so from a background thread) once needs_partitioning() says so.
+        """
+        with self._exclusive():
+            pending = [(fix_id, text) for fix_id, text in zip(fix_ids, texts) if fix_id > self.meta['max_fix_id']]
+            if not pending:
+                return
+            vectors = self.embedder.embed_batch([text for _, text in pending])
+            start = self.meta['count']
+            self._ensure_capacity(start + len(pending))
+            self._matrix[start:start + len(pending)] = vectors
+            self._ids[start:start + len(pending)] = [fix_id for fix_id, _ in pending]
+            self._matrix.flush()
+            self._ids.flush()
+            self.meta['count'] = start + len(pending)
+            self.meta['max_fix_id'] = max(self.meta['max_fix_id'], pending[-1][0])
+            self._save_meta()
+
+    def remove(self, fix_ids: Sequence[int]) -> int:
+        """Drop the rows of deleted fixes; returns the rows dropped.
+
+        Rows are blanked in place and skipped by searches; the next
+        partitioning reclaims their slots.
+        """
+        with self._exclusive():
+            count = self.meta['count']
+            if not count or not len(fix_ids):
+                return 0
+            rows = np.flatnonzero(np.isin(self._ids[:count], np.asarray(fix_ids, dtype=np.int64)))
+            if not len(rows):
+                return 0
+            self._ids[rows] = -1
+            self._matrix[rows] = 0.0
+            self._matrix.flush()
+            self._ids.flush()
+            self.meta['deleted'] += len(rows)
+            self._save_meta()
+            return len(rows)
+
+    def needs_partitioning(self) -> bool:
+        """Whether the tail or the dropped rows have outgrown their bounds."""
+        self._load()
+        return self._needs_partitioning()
+
+    def _needs_partitioning(self) -> bool:
+        count = self.meta['count']
+        deleted = self.meta['deleted']
+        partitioned = self.meta['partitioned']
+        if not partitioned:
+            return count - deleted >= IVF_MIN_ROWS
+        return count - partitioned > IVF_MAX_TAIL_ROWS or deleted > partitioned * IVF_RETRAIN_FRACTION
+
+    def rebuild(self):
+        """Retrain the partitions over every indexed row, waiting for a running build."""
+        self.partition(force=True, wait=True)
+
+    def partition(self, force: bool = False, wait: bool = False) -> bool:
+        """Group rows by partition and fold the tail in; returns whether it ran.
+
+        The centroids are retrained once the live row count has drifted more
+        than IVF_RETRAIN_FRACTION from the count they were trained on;
+        otherwise only the tail rows are assigned. The grouped copy is written
+        without holding the write lock, which is taken only to carry over rows
+        added meanwhile and swap the files in. One process builds at a time:
+        without ``wait`` a build already running elsewhere makes this a no-op.
+        """
+        with open(self._build_lock_path, 'a') as build_lock:
+            try:
+                fcntl.flock(build_lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                with self._exclusive():
+                    count = self.meta['count']
+                    if not count or not (force or self._needs_partitioning()):
+                        return False
+                    matrix, ids = self._matrix, self._ids
+                    centroids, offsets = self._centroids, self._offsets
+                    partitioned = self.meta['partitioned'] if centroids is not None else 0
+                    trained = self.meta['trained']
+                order, centroids, offsets, retrained = self._layout(
+                    matrix, ids, count, centroids, offsets, partitioned, trained, force)
+                self._write_layout(matrix, ids, order)
+                with self._exclusive():
+                    self._swap_layout(count, order, centroids, offsets, retrained)
+                return True
+            finally:
+                fcntl.flock(build_lock, fcntl.LOCK_UN)
+
+    def _layout(self, matrix, ids, count: int, centroids, offsets, partitioned: int, trained: int,
+                retrain: bool):
+        """Row order grouped by partition over the live rows of [0, count).
+
+        Returns (order, centroids, offsets, retrained); centroids and offsets
+        are None when too few rows are live to partition.
+        """
+        live = np.flatnonzero(np.asarray(ids[:count]) >= 0)
+        if len(live) < IVF_MIN_ROWS:
+            return live, None, None, False
+        retrain = (retrain or centroids is None
+                   or abs(len(live) - trained) > trained * IVF_RETRAIN_FRACTION)
+
+        assignment = np.empty(count, dtype=np.int32)
+        if retrain:
+            centroids = self._train(matrix, live)
+            first = 0
+        else:
+            # Partitioned rows keep their partition; only the tail is assigned
+            assignment[:partitioned] = np.repeat(np.arange(len(centroids), dtype=np.int32), np.diff(offsets))
+            first = partitioned
+        for start in range(first, count, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, count)
+            assignment[start:end] = np.argmax(np.asarray(matrix[start:end]) @ centroids.T, axis=1)
+        assignment = assignment[live]
+        order = live[np.argsort(assignment, kind='stable')]
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+        return order, centroids, offsets, retrain
+
+    @staticmethod
+    def _train(matrix, live: np.ndarray) -> np.ndarray:
+        """Spherical k-means centroids over a sample of the live rows."""
+        nlist = max(16, int(IVF_LISTS_PER_SQRT * math.sqrt(len(live))))
+        rng = np.random.default_rng(len(live))
+        sample_size = min(len(live), nlist * KMEANS_SAMPLE_PER_LIST)
+        sample = np.asarray(matrix[np.sort(rng.choice(live, sample_size, replace=False))])
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Reseed empty partitions from random sample rows
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        return centroids
+
+    def _write_layout(self, matrix, ids, order: np.ndarray):
+        """Write the rows in ``order`` to the .new files next to the live ones."""
+        capacity = max(len(order), 1)
+        new_matrix = np.memmap(f"{self._matrix_path}.new", dtype=np.float32, mode='w+', shape=(capacity, self.dim))
+        new_ids = np.memmap(f"{self._ids_path}.new", dtype=np.int64, mode='w+', shape=(capacity,))
+        for start in range(0, len(order), CHUNK_ROWS):
+            rows = order[start:start + CHUNK_ROWS]
+            new_matrix[start:start + len(rows)] = matrix[rows]
+            new_ids[start:start + len(rows)] = ids[rows]
+        new_matrix.flush()
+        new_ids.flush()
+
+    def _swap_layout(self, count: int, order: np.ndarray, centroids, offsets, retrained: bool):
+        """Carry over what changed since the layout was computed and swap it in (write lock held)."""
+        grouped = len(order)
+        appended = self.meta['count'] - count
+        capacity = max(grouped + appended, 1024)
+        for path, itemsize in ((f"{self._matrix_path}.new", 4 * self.dim), (f"{self._ids_path}.new", 8)):
+            with open(path, 'ab') as f:
+                f.truncate(capacity * itemsize)
+        new_matrix = np.memmap(f"{self._matrix_path}.new", dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        new_ids = np.memmap(f"{self._ids_path}.new", dtype=np.int64, mode='r+', shape=(capacity,))
+        new_matrix[grouped:grouped + appended] = self._matrix[count:count + appended]
+        new_ids[grouped:grouped + appended] = self._ids[count:count + appended]
+        # Rows removed while the copy was written
+        dropped = np.flatnonzero(np.asarray(self._ids[:count])[order] < 0)
+        new_ids[dropped] = -1
+        new_matrix[dropped] = 0.0
+        deleted = len(dropped) + int(np.count_nonzero(new_ids[grouped:grouped + appended] < 0))
+        new_matrix.flush()
+        new_ids.flush()
+        del new_matrix, new_ids
+
+        if centroids is not None:
+            np.savez(f"{self._ivf_path}.tmp.npz", centroids=centroids, offsets=offsets)
+            os.replace(f"{self._ivf_path}.tmp.npz", self._ivf_path)
+        os.replace(f"{self._matrix_path}.new", self._matrix_path)
+        os.replace(f"{self._ids_path}.new", self._ids_path)
+        self.meta.update({
+            'count': grouped + appended,
+            'capacity': capacity,
+            'partitioned': grouped if centroids is not None else 0,
+            'deleted': deleted,
+        })
+        if retrained:
+            self.meta['trained'] = grouped
+        self._save_meta()
+        self._meta_mtime = None
+        self._load()
+
+    # -- reads -------------------------------------------------------------
+
+    def search(self, queries: np.ndarray, k: int = 5, nprobe: int = IVF_NPROBE) -> List[List[Tuple[int, float]]]:
+        """Return the top-k (fix_id, cosine) pairs for each query row."""
+        with self._shared():
+            queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+            count = self.meta['count']
+            if count == 0 or k <= 0:
+                return [[] for _ in range(len(queries))]
+            matrix = self._matrix
+            ids = self._ids
+            partitioned = self.meta['partitioned'] if self._centroids is not None else 0
+            deleted = self.meta['deleted']
+
+            if not partitioned:
+                row_ids = np.asarray(ids[:count])
+                return [self._top_k(self._skip_deleted(scores, row_ids, deleted), row_ids, k)
+                        for scores in (matrix[:count] @ queries.T).T]
+
+            offsets = self._offsets
+            nprobe = min(nprobe, len(self._centroids))
+            probes = np.argpartition(-(queries @ self._centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+            tail_scores = (matrix[partitioned:count] @ queries.T).T if count > partitioned else None
+            results = []
+            for q, query in enumerate(queries):
+                # Each partition is a contiguous slice of the matrix; remember
+                # where every scored slice starts to map positions back to rows
+                starts = [offsets[p] for p in probes[q]]
+                ends = [offsets[p + 1] for p in probes[q]]
+                parts = [matrix[start:end] @ query for start, end in zip(starts, ends)]
+                if tail_scores is not None:
+                    starts.append(partitioned)
+                    ends.append(count)
+                    parts.append(tail_scores[q])
+                scores = np.concatenate(parts)
+                if deleted:
+                    scores = self._skip_deleted(
+                        scores, np.concatenate([ids[start:end] for start, end in zip(starts, ends)]), deleted)
+                bounds = np.cumsum([0] + [len(part) for part in parts])
+                best = self._best_positions(scores, k)
+                segment = np.searchsorted(bounds, best, side='right') - 1
+                rows = np.asarray(starts)[segment] + (best - bounds[segment])
+                results.append([(int(ids[row]), float(scores[pos])) for row, pos in zip(rows, best)])
+            return results
+
+    @staticmethod
+    def _skip_deleted(scores: np.ndarray, row_ids: np.ndarray, deleted: int) -> np.ndarray:
+        """Scores with removed rows pushed out of reach of the top-k."""
+        return np.where(row_ids >= 0, scores, -np.inf) if deleted else scores
+
+    @staticmethod
+    def _best_positions(scores: np.ndarray, k: int) -> np.ndarray:
+        """Positions of the k highest scores, best first."""
+        if len(scores) == 0:
+            return np.empty(0, dtype=np.int64)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        # Fewer live rows than k leaves removed ones in the selection
+        return best[np.isfinite(scores[best])]
+
+    @classmethod
+    def _top_k(cls, scores: np.ndarray, row_ids: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        return [(int(row_ids[i]), float(scores[i])) for i in cls._best_positions(scores, k)]
+
+    def search_texts(self, texts: Sequence[str], k: int = 5) -> List[List[Tuple[int, float]]]:
+        """Embed query texts and search them as one batch."""
+        return self.search(self.embedder.embed_batch(texts), k)
+
+
+def benchmark(rows: int, dim: int = 128, queries: int = 200, k: int = 5, tail: int = IVF_MAX_TAIL_ROWS):
+    """Time top-k retrieval over a synthetic clustered matrix of the given size.
+
+    The last ``tail`` rows are left unpartitioned, which by default is the
+    worst case a query meets: the moment just before the tail is folded in.
+    """
+    import shutil
+    import tempfile
+
+    work_dir = tempfile.mkdtemp(prefix="memory_vectors_bench_")
+    try:
+        index = VectorIndex(work_dir, HashingEmbedder(dim))
+        rng = np.random.default_rng(0)
+        topics = rng.standard_normal((512, dim)).astype(np.float32)
+
+        def fill(start, end):
+            for chunk in range(start, end, CHUNK_ROWS):
+                size = min(CHUNK_ROWS, end - chunk)
+                block = topics[rng.integers(0, len(topics), size)] + \
+                    0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+                block /= np.linalg.norm(block, axis=1, keepdims=True)
+                index._ensure_capacity(chunk + size)
+                index._matrix[chunk:chunk + size] = block
+                index._ids[chunk:chunk + size] = np.arange(chunk + 1, chunk + size + 1)
+            index.meta['count'] = end
+            index.meta['max_fix_id'] = end
+            index._save_meta()
+
+        tail = min(tail, rows) if rows - tail >= IVF_MIN_ROWS else 0
+        started = time.perf_counter()
+        with index._exclusive():
+            fill(0, rows - tail)
+        index.partition()
+        print(f"🧪 Indexed {rows - tail} synthetic vectors ({dim}d) in {time.perf_counter() - started:.1f}s")
+        if tail:
+            with index._exclusive():
+                fill(rows - tail, rows)
+            print(f"   plus {tail} unpartitioned tail rows")
+
+        probe = topics[rng.integers(0, len(topics), queries)] + \
+            0.5 * rng.standard_normal((queries, dim)).astype(np.float32)
+        probe /= np.linalg.norm(probe, axis=1, keepdims=True)
+        index.search(probe[:1], k)
+        latencies = []
+        for query in probe:
+            started = time.perf_counter()
+            index.search(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        started = time.perf_counter()
+        index.search(probe, k)
+        batched = (time.perf_counter() - started) * 1000 / queries
+        print(f"📊 top-{k} search: p50 {latencies[len(latencies) // 2]:.3f} ms | "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms | batched {batched:.3f} ms/query")
+
+        if tail:
+            # One row more pushes the tail past its bound
+            with index._exclusive():
+                fill(rows, rows + 1)
+            started = time.perf_counter()
+            index.partition()
+            print(f"🔁 Folded the tail into the partitions in {time.perf_counter() - started:.1f}s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the AI memory vector index")
+    parser.add_argument("--rows", type=int, default=1000000, help="Synthetic vectors (default: 1000000)")
+    parser.add_argument("--dim", type=int, default=128, help="Embedding dimensions (default: 128)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to time (default: 200)")
+    parser.add_argument("--tail", type=int, default=IVF_MAX_TAIL_ROWS,
+                        help=f"Unpartitioned rows left at the end (default: {IVF_MAX_TAIL_ROWS}, the most allowed)")
+    args = parser.parse_args()
+    benchmark(args.rows, args.dim, args.queries, tail=args.tail)
@@ -40,6 +40,12 @@ FAILED_MODELS=0
 FIXED_MODELS=0
 CURRENT_ITERATION=1
 
+# Installed-model inventory shared with the fixers (see model_installed)
+INVENTORY_PY="$HERE/AutoFixers/model_inventory.py"
+# Streams test replies and stops generation at the first pattern match
+EVALUATOR_PY="$HERE/AutoFixers/response_evaluator.py"
+INVENTORY_NAMES=""
+
 # Parse arguments
 parse_arguments() {
     while [[ $# -gt 0 ]]; do
@@ -60,7 +66,7 @@ parse_arguments() {
             --help)
                 echo "Usage: $0 [--auto-fix] [--fixer=TYPE] [--date=YYYY-MM-DD] [--help]"
                 echo "  --auto-fix: Enable automatic fixing of detected issues"
-                echo "  --fixer=TYPE: Choose AI fixer (claude, qwen, deepseek) - default: deepseek"
+                echo "  --fixer=TYPE: Choose AI fixer (claude, qwen, deepseek, race) - default: deepseek"
                 echo "  --date=YYYY-MM-DD: Use specific date for test results"
                 echo "  --help: Show this help"
                 echo ""
@@ -167,9 +173,56 @@ EOF
     fi
     
     echo "$MODEL_SIZE" > "$TESTS_DIR/model_size.txt"
+    
+    # Locate the shared model inventory cache once, so the per-model checks
+    # below do not each start Python just to find it
+    if command -v python3 &> /dev/null; then
+        INVENTORY_NAMES=$(python3 "$INVENTORY_PY" path 2>/dev/null || true)
+    fi
+    
     log_success "Test environment ready at: $TESTS_DIR"
 }
 
+# Check whether a model is installed. Installed models come from
+# model_inventory.py: one /api/tags call, cached on disk for a few seconds
+# and shared with the Python fixers. Names match exactly; an untagged name
+# means its :latest tag.
+model_installed() {
+    local model_name="$1"
+    [[ "${model_name##*/}" == *:* ]] || model_name="$model_name:latest"
+    
+    if [ -z "$INVENTORY_NAMES" ]; then
+        # No python3: read the CLI listing, still matching whole names
+        ollama list 2>/dev/null | awk 'NR > 1 {print $1}' | grep -Fxq -- "$model_name"
+        return
+    fi
+    
+    # The names file starts with "# expires_at=<epoch>"; refresh once it is stale
+    local expires_at=0
+    if [ -f "$INVENTORY_NAMES" ]; then
+        expires_at=$(sed -n '1s/^# expires_at=\([0-9]*\).*/\1/p' "$INVENTORY_NAMES")
+    fi
+    if [ "$(date +%s)" -ge "${expires_at:-0}" ]; then
+        python3 "$INVENTORY_PY" refresh > /dev/null || return 1
+    fi
+    grep -Fxq -- "$model_name" "$INVENTORY_NAMES"
+}
+
+# Forget the cached inventory, e.g. after fixes pulled or removed models
+invalidate_model_inventory() {
+    if [ -n "$INVENTORY_NAMES" ]; then
+        python3 "$INVENTORY_PY" invalidate 2>/dev/null || true
+    fi
+}
+
+# Keep the prompt and pattern a model was tested with, so its fix is
+# verified against the same check
+save_test_check() {
+    local model_test_dir="$1"
+    printf '%s\n' "$2" > "$model_test_dir/test_prompt.txt"
+    printf '%s\n' "$3" > "$model_test_dir/expected_pattern.txt"
+}
+
 # Test a single model
 test_single_model() {
     local model_name="$1"
@@ -180,13 +233,12 @@ test_single_model() {
     
     local model_test_dir="$TESTS_DIR/$model_name"
     mkdir -p "$model_test_dir"/{Generated,Issues}
+    save_test_check "$model_test_dir" "$test_prompt" "$expected_pattern"
     
     # Check if model is available
     log_info "DEBUG: Checking availability of model: $model_name"
-    local ollama_output=$(ollama list)
-    log_info "DEBUG: Ollama list output contains: $(echo "$ollama_output" | grep "$model_name" || echo "NO MATCH")"
     
-    if ! echo "$ollama_output" | grep -q "$model_name"; then
+    if ! model_installed "$model_name"; then
         log_warning "Model $model_name not available"
         document_issue "$model_name" "MODEL_NOT_AVAILABLE" "Model not installed in Ollama"
         return 1
@@ -199,22 +251,21 @@ test_single_model() {
     local raw_output_file="$model_test_dir/Generated/test_response_raw.txt"
     local error_file="$model_test_dir/Issues/test_error.log"
     
-    if timeout $TIMEOUT_DURATION bash -c "
-        echo '$test_prompt' | ollama run '$model_name' 2>'$error_file' | 
-        tee '$raw_output_file' | 
-        sed 's/\x1b\[[0-9;]*[mGKH]//g' | 
-        sed 's/\[?[0-9]*[hlc]//g' |      
-        sed 's/\[[0-9]*G//g' |           
-        tr -d '\r' |                     
-        grep -v '^$' |                   
-        head -10 > '$output_file'
-    "; then
+    # Stream the reply, stopping the model as soon as the pattern matches
+    # (exit 0 matched, 1 mismatch, 2 no output, 3 timeout or failure)
+    local eval_status=0
+    local evaluation
+    evaluation=$(python3 "$EVALUATOR_PY" "$model_name" --prompt "$test_prompt" --pattern "$expected_pattern" \
+        --timeout "$TIMEOUT_DURATION" --output "$output_file" --raw-output "$raw_output_file" \
+        --error-file "$error_file") || eval_status=$?
+
+    if [ $eval_status -ne 3 ]; then
         
         if [ -s "$output_file" ]; then
             local response_content=$(cat "$output_file")
             local cleaned_response=$(echo "$response_content" | tr -d '\n\r' | sed 's/[[:space:]]\+/ /g')
             
-            if [[ "$cleaned_response" =~ $expected_pattern ]]; then
+            if [ $eval_status -eq 0 ]; then
                 log_success "✅ $model_name PASSED"
                 echo "PASSED" > "$model_test_dir/test_status.txt"
                 
@@ -495,6 +546,7 @@ apply_codebase_fixes() {
 # Apply Claude-powered intelligent fixes
 apply_ai_fixes() {
     local ai_fixes=0
+    local issue_files=()
     
     log_fix "🤖 Analyzing issues with $FIXER_TYPE..." >&2
     
@@ -511,24 +563,39 @@ apply_ai_fixes() {
                 log_fix "🔍 $FIXER_TYPE analyzing: $model_name" >&2
 
                 # Create issue data JSON for AI analysis
-                local issue_json="$model_dir/ai_issue.json"
+                local issue_json="${model_dir%/}/ai_issue.json"
                 create_ai_issue_json "$model_name" "$model_dir" "$issue_json"
-                
-                # Use AI to analyze and fix via the manager
-                if python3 "$HERE/AutoFixers/autofix_manager.py" fix "$issue_json" "$FIXER_TYPE" >&2; then
-                    log_success "✅ $FIXER_TYPE successfully fixed: $model_name" >&2
-                    ((ai_fixes++))
-                    
-                    # Remove issue files since AI fixed it
-                    rm -f "$model_dir/Issues"/*.md
-                    rm -f "$status_file"
-                else
-                    log_error "❌ $FIXER_TYPE could not fix: $model_name" >&2
-                fi
+                issue_files+=("$issue_json")
             fi
         fi
     done
     
+    # One manager process analyzes every issue concurrently, then applies and
+    # verifies the fixes one at a time; each result is a JSON line whose
+    # first field is the issue file it belongs to
+    if [ ${#issue_files[@]} -gt 0 ]; then
+        local result issue_json status model_dir model_name
+        while IFS= read -r result; do
+            [[ $result =~ \"id\":\ \"([^\"]*)\" ]] || continue
+            issue_json="${BASH_REMATCH[1]}"
+            [[ $result =~ \"status\":\ \"([a-z_]*)\" ]] && status="${BASH_REMATCH[1]}" || status="unknown"
+            model_dir=$(dirname "$issue_json")
+            model_name=$(basename "$model_dir")
+            model_name="${model_name#*_}"
+            
+            if [ "$status" = "fixed" ]; then
+                log_success "✅ $FIXER_TYPE successfully fixed: $model_name" >&2
+                ((ai_fixes++))
+                
+                # Remove issue files since AI fixed it
+                rm -f "$model_dir/Issues"/*.md
+                rm -f "$model_dir/test_status.txt"
+            else
+                log_error "❌ $FIXER_TYPE could not fix: $model_name ($status)" >&2
+            fi
+        done < <(python3 "$HERE/AutoFixers/autofix_manager.py" fix-batch "${issue_files[@]}" --fixer "$FIXER_TYPE")
+    fi
+    
     log_fix "$FIXER_TYPE applied $ai_fixes intelligent fixes" >&2
     echo $ai_fixes
 }
@@ -542,8 +609,6 @@ create_ai_issue_json() {
     # Collect issue information
     local issue_type="UNKNOWN"
     local description="Unknown issue"
-    local error_output=""
-    local actual_response=""
     
     # Read issue files to get details
     for issue_file in "$model_dir/Issues"/*.md; do
@@ -554,29 +619,39 @@ create_ai_issue_json() {
         fi
     done
     
-    # Get actual response if available
-    if [ -f "$model_dir/Generated/test_response.txt" ]; then
-        actual_response=$(cat "$model_dir/Generated/test_response.txt" || echo "")
-    fi
-    
-    # Get error output if available
-    if [ -f "$model_dir/Issues/test_error.log" ]; then
-        error_output=$(cat "$model_dir/Issues/test_error.log" || echo "")
-    fi
-    
-    # Create JSON using Python with safe string handling
+    # Create JSON using Python with safe string handling. The error log and
+    # the model response are read from their files and deduplicated and
+    # bounded there, so a runaway log cannot blow up the issue JSON (or the
+    # argument list)
     cat > "$output_file.tmp" << 'EOF'
 import json
+import os
 import sys
 from datetime import datetime
 
-# Read data from environment variables
+# Read data from arguments
 model_name = sys.argv[1]
 issue_type = sys.argv[2]
 description = sys.argv[3]
-error_output = sys.argv[4]
-actual_response = sys.argv[5]
-model_dir = sys.argv[6]
+model_dir = sys.argv[4]
+sys.path.insert(0, sys.argv[6])
+from prompt_builder import ISSUE_LOG_TOKENS, compact_log
+
+def read_log(path, dedupe_all=True):
+    if not os.path.isfile(path):
+        return ''
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return compact_log(f.read(), ISSUE_LOG_TOKENS, dedupe_all)
+
+def read_check(name, default):
+    path = os.path.join(model_dir, name)
+    if not os.path.isfile(path):
+        return default
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read().rstrip('\n') or default
+
+error_output = read_log(os.path.join(model_dir, 'Issues', 'test_error.log'))
+actual_response = read_log(os.path.join(model_dir, 'Generated', 'test_response.txt'), dedupe_all=False)
 
 # Create properly escaped JSON data
 data = {
@@ -584,8 +659,8 @@ data = {
     'issue_type': issue_type,
     'description': description,
     'error_output': error_output,
-    'test_prompt': 'What is 2+2? Answer briefly.',
-    'expected_pattern': '.*4.*',
+    'test_prompt': read_check('test_prompt.txt', 'What is 2+2? Answer briefly.'),
+    'expected_pattern': read_check('expected_pattern.txt', '.*4.*'),
     'actual_response': actual_response,
     'timestamp': datetime.now().isoformat(),
     'test_environment': {
@@ -596,7 +671,7 @@ data = {
 }
 
 try:
-    with open(sys.argv[7], 'w') as f:
+    with open(sys.argv[5], 'w') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 except Exception as e:
     print(f'Error creating JSON: {e}', file=sys.stderr)
@@ -604,7 +679,7 @@ except Exception as e:
 EOF
 
     # Execute Python script with arguments to avoid quote issues
-    python3 "$output_file.tmp" "$model_name" "$issue_type" "$description" "$error_output" "$actual_response" "$model_dir" "$output_file"
+    python3 "$output_file.tmp" "$model_name" "$issue_type" "$description" "$model_dir" "$output_file" "$HERE/AutoFixers"
     rm -f "$output_file.tmp"
 }
 
@@ -733,7 +808,7 @@ test_single_model_confirmation() {
     local expected_pattern="${3:-.*4.*}"
     
     # Quick availability check
-    if ! ollama list | grep -q "$model_name"; then
+    if ! model_installed "$model_name"; then
         return 1
     fi
     
@@ -756,6 +831,9 @@ run_test_iteration() {
     PASSED_MODELS=0
     FAILED_MODELS=0
 
+    # Fixes from the last iteration may have pulled models
+    invalidate_model_inventory
+
     local model_size=$(cat "$TESTS_DIR/model_size.txt")
 
     # Test General models
@@ -938,13 +1016,12 @@ test_single_model_with_dir() {
     write_log "  Test Directory: $model_test_dir"
 
     mkdir -p "$model_test_dir"/{Generated,Issues}
+    save_test_check "$model_test_dir" "$test_prompt" "$expected_pattern"
 
     # Check if model is available
     write_log "  Checking model availability..."
-    local ollama_output=$(ollama list 2>&1)
-    write_log "  Ollama list output: $(echo "$ollama_output" | wc -l) lines"
 
-    if ! echo "$ollama_output" | grep -q "$model_name"; then
+    if ! model_installed "$model_name"; then
         log_warning "Model $model_name not available"
         write_log "  Model not found in Ollama registry"
         document_issue_with_dir "$model_name" "MODEL_NOT_AVAILABLE" "Model not installed in Ollama" "$model_test_dir"
@@ -958,16 +1035,16 @@ test_single_model_with_dir() {
     local raw_output_file="$model_test_dir/Generated/test_response_raw.txt"
     local error_file="$model_test_dir/Issues/test_error.log"
 
-    if timeout $TIMEOUT_DURATION bash -c "
-        echo '$test_prompt' | ollama run '$model_name' 2>'$error_file' |
-        tee '$raw_output_file' |
-        sed 's/\x1b\[[0-9;]*[mGKH]//g' |
-        sed 's/\[?[0-9]*[hlc]//g' |
-        sed 's/\[[0-9]*G//g' |
-        tr -d '\r' |
-        grep -v '^$' |
-        head -10 > '$output_file'
-    "; then
+    # Stream the reply, stopping the model as soon as the pattern matches
+    # (exit 0 matched, 1 mismatch, 2 no output, 3 timeout or failure)
+    local eval_status=0
+    local evaluation
+    evaluation=$(python3 "$EVALUATOR_PY" "$model_name" --prompt "$test_prompt" --pattern "$expected_pattern" \
+        --timeout "$TIMEOUT_DURATION" --output "$output_file" --raw-output "$raw_output_file" \
+        --error-file "$error_file") || eval_status=$?
+    write_log "  Evaluation: $evaluation"
+
+    if [ $eval_status -ne 3 ]; then
 
         if [ -s "$output_file" ]; then
             local response_content=$(cat "$output_file")
@@ -976,7 +1053,7 @@ test_single_model_with_dir() {
             write_log "  Raw response length: ${#response_content} characters"
             write_log "  Cleaned response: $cleaned_response"
 
-            if [[ "$cleaned_response" =~ $expected_pattern ]]; then
+            if [ $eval_status -eq 0 ]; then
                 log_success "✅ $model_name PASSED"
                 write_log "  Pattern match successful"
                 echo "PASSED" > "$model_test_dir/test_status.txt"
@@ -1021,9 +1098,8 @@ EOF
             return 1
         fi
     else
-        local exit_code=$?
         log_error "❌ $model_name timed out or failed"
-        write_log "  Command failed with exit code: $exit_code"
+        write_log "  Evaluator failed with exit code: $eval_status"
         write_log "  Timeout: ${TIMEOUT_DURATION}s"
         document_issue_with_dir "$model_name" "TIMEOUT" "Model failed to respond within ${TIMEOUT_DURATION}s" "$model_test_dir"
         return 1
@@ -0,0 +1,56 @@
+"""Shared fixtures for the automated tests of Scripts/ and Scripts/AutoFixers/."""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SCRIPTS = os.path.join(ROOT, "Scripts")
+AUTOFIXERS = os.path.join(SCRIPTS, "AutoFixers")
+
+for path in (SCRIPTS, AUTOFIXERS):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from ai_memory import AIMemory  # noqa: E402
+
+
+@pytest.fixture
+def memory_dir(tmp_path):
+    """A fresh memory directory; the tracked AIMemory/ai_memory.db is never touched."""
+    path = tmp_path / "AIMemory"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def memory(memory_dir):
+    memory = AIMemory(memory_dir, use_service=False)
+    yield memory
+    memory.close()
+
+
+def issue(model="llama3:8b", issue_type="TIMEOUT", description="Model failed to respond within 30s",
+          error_output="context deadline exceeded", **extra):
+    """An ai_issue.json payload as test.sh writes it."""
+    return dict({
+        "model": model,
+        "issue_type": issue_type,
+        "description": description,
+        "error_output": error_output,
+        "actual_response": "",
+        "timestamp": "2025-01-01T00:00:00",
+    }, **extra)
+
+
+def fix(analysis="Model needs more time to load", commands=("echo restart",), confidence=0.8):
+    """A fixer reply in the shape the fixers return."""
+    return {
+        "analysis": analysis,
+        "fix_type": "model_config",
+        "fix_commands": list(commands),
+        "verification_steps": ["Re-run the test"],
+        "confidence": confidence,
+        "expected_outcome": "Model answers",
+    }
@@ -0,0 +1,211 @@
+"""AIMemory: recording, full-text search and similar-fix retrieval."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import fix, issue
+
+
+def test_record_and_search(memory):
+    fix_id = memory.record_fix_attempt(issue(description="Ollama server refused the connection"),
+                                       fix(analysis="Restart the ollama service"), True, True, 1.5,
+                                       fixer_type="qwen")
+    other = memory.record_fix_attempt(issue(model="mistral:7b", issue_type="NO_OUTPUT",
+                                            description="Model produced no output"),
+                                      fix(analysis="Pull the model again"), False, False, 0.5)
+
+    assert [row['id'] for row in memory.search("refused")] == [fix_id]
+    assert [row['id'] for row in memory.search("model", {'model_name': 'mistral:7b'})] == [other]
+    with pytest.raises(ValueError):
+        memory.search("model", {'no_such_filter': 1})
+
+
+def test_find_similar_fixes(memory):
+    pytest.importorskip("numpy")
+    fix_id = memory.record_fix_attempt(issue(description="CUDA out of memory while loading model"),
+                                       fix(analysis="Use a smaller quantization"), True, True, 2.0)
+    memory.record_fix_attempt(issue(issue_type="NO_OUTPUT", description="Empty reply from model",
+                                    error_output=""),
+                              fix(analysis="Increase num_predict"), True, True, 1.0)
+
+    similar = memory.find_similar_fixes(issue(description="CUDA out of memory", error_output=""))
+    assert similar and similar[0]['id'] == fix_id
+
+
+def test_rebuild_vector_index(memory):
+    pytest.importorskip("numpy")
+    memory.record_fix_attempt(issue(), fix(), True, True, 1.0)
+    memory.rebuild_vector_index()
+    assert memory.find_similar_fixes(issue())
+
+
+def test_concurrent_first_use(memory_dir, monkeypatch):
+    """A writer arriving while another thread migrates must not deadlock it."""
+    import ai_memory
+
+    init_database = ai_memory.AIMemory._init_database
+
+    def slow_init(self):
+        # Hold the initialization lock long enough for the writer to queue up
+        time.sleep(0.3)
+        init_database(self)
+
+    monkeypatch.setattr(ai_memory.AIMemory, "_init_database", slow_init)
+    # Keep a deadlocked instance away from the exit handler that closes shared ones
+    monkeypatch.setattr(ai_memory, "_shared_memories", {})
+    memory = ai_memory.get_memory(memory_dir)
+    errors = []
+
+    def run(call):
+        try:
+            call()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(lambda: memory.search("respond"),), daemon=True),
+               threading.Thread(target=run, daemon=True, args=(
+                   lambda: memory.record_fix_attempt(issue(), fix(), True, True, 1.0),))]
+    try:
+        threads[0].start()
+        time.sleep(0.1)
+        threads[1].start()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert not any(thread.is_alive() for thread in threads), "deadlocked"
+        assert not errors
+        assert len(memory.search("respond")) == 1
+    finally:
+        if not any(thread.is_alive() for thread in threads):
+            memory.close()
+
+
+def test_context_cache_sees_other_process_writes(memory_dir):
+    """A write made through another connection retires the cached context."""
+    from ai_memory import AIMemory
+
+    with AIMemory(memory_dir, use_service=False) as reader, AIMemory(memory_dir, use_service=False) as writer:
+        before = reader.build_context_for_ai(issue())
+        assert "Exact matches" not in before
+
+        writer.record_fix_attempt(issue(), fix(analysis="Raise the request timeout"), True, True, 1.0)
+        assert "Raise the request timeout" in reader.build_context_for_ai(issue())
+
+
+def test_pruned_fixes_leave_vector_index(memory):
+    pytest.importorskip("numpy")
+    memory.record_fix_attempt(issue(), fix(), False, False, 1.0)
+    assert memory.find_similar_fixes(issue())
+
+    memory.prune_history(days=-1, success_days=-1, vacuum=False)
+    assert len(memory._get_vector_index()) == 0
+    assert memory.find_similar_fixes(issue()) == []
+
+
+def test_vector_partitions_fold_tail_and_skip_removed(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    import memory_vectors
+
+    monkeypatch.setattr(memory_vectors, "IVF_MIN_ROWS", 64)
+    monkeypatch.setattr(memory_vectors, "IVF_MAX_TAIL_ROWS", 16)
+    index = memory_vectors.VectorIndex(str(tmp_path / "vectors"))
+    # The embedder collapses digits, so spell every id out in letters
+    texts = {fix_id: f"failure {''.join(chr(97 + int(d)) for d in str(fix_id))} topic {chr(97 + fix_id % 7)}"
+             for fix_id in range(1, 121)}
+
+    index.add(range(1, 101), [texts[i] for i in range(1, 101)])
+    assert index.needs_partitioning() and index.partition()
+    assert index.meta['partitioned'] == index.meta['trained'] == 100
+
+    # The new rows are assigned to the trained partitions, not retrained
+    index.add(range(101, 121), [texts[i] for i in range(101, 121)])
+    assert index.needs_partitioning() and index.partition()
+    assert (index.meta['partitioned'], index.meta['trained']) == (120, 100)
+
+    assert index.remove([5, 110]) == 2
+    hits = index.search_texts([texts[5], texts[110], texts[42]], k=3)
+    assert all(fix_id not in (5, 110) for query_hits in hits for fix_id, _ in query_hits)
+    assert hits[2][0][0] == 42
+    assert len(index) == 118
+
+
+def test_vector_partition_keeps_concurrent_writes(tmp_path, monkeypatch):
+    """Rows added or removed while the grouped copy is written survive the swap."""
+    pytest.importorskip("numpy")
+    import memory_vectors
+
+    monkeypatch.setattr(memory_vectors, "IVF_MIN_ROWS", 64)
+    index = memory_vectors.VectorIndex(str(tmp_path / "vectors"))
+    texts = {fix_id: f"failure {''.join(chr(97 + int(d)) for d in str(fix_id))}" for fix_id in range(1, 111)}
+    index.add(range(1, 101), [texts[i] for i in range(1, 101)])
+
+    write_layout = index._write_layout
+
+    def write_while_building(*args):
+        write_layout(*args)
+        index.add(range(101, 111), [texts[i] for i in range(101, 111)])
+        index.remove([7, 105])
+
+    monkeypatch.setattr(index, "_write_layout", write_while_building)
+    assert index.partition()
+    assert (index.meta['partitioned'], index.meta['count'], len(index)) == (100, 110, 108)
+    hits = index.search_texts([texts[103], texts[7], texts[105]], k=3)
+    assert hits[0][0][0] == 103
+    assert all(fix_id not in (7, 105) for query_hits in hits for fix_id, _ in query_hits)
+
+
+def read_archives(memory_dir):
+    import glob
+    import gzip
+    import json
+
+    ids = []
+    for path in glob.glob(os.path.join(memory_dir, "archive", "*.jsonl.gz")):
+        with gzip.open(path, 'rt') as archive:
+            ids.extend(json.loads(line)['id'] for line in archive)
+    return sorted(ids)
+
+
+def test_prune_archives_rows_once_after_failed_commit(memory, memory_dir, monkeypatch):
+    import sqlite3
+
+    import memory_retention
+
+    fix_ids = [memory.record_fix_attempt(issue(), fix(), False, False, 1.0) for _ in range(3)]
+
+    def fail(cursor, rows):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(memory_retention, "rollup", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            memory.prune_history(days=-1, success_days=-1, vacuum=False)
+
+    assert memory.prune_history(days=-1, success_days=-1, vacuum=False)['rows_pruned'] == 3
+    assert read_archives(memory_dir) == fix_ids
+    # The staged copy from the failed run was dropped, not appended
+    assert all(name.endswith(".jsonl.gz") for name in os.listdir(os.path.join(memory_dir, "archive")))
+
+
+def test_interrupted_archive_append_is_redone(memory, memory_dir):
+    import memory_retention
+
+    fix_ids = [memory.record_fix_attempt(issue(), fix(), False, False, 1.0) for _ in range(2)]
+    memory.prune_history(days=-1, success_days=-1, vacuum=False)
+    archive_dir = os.path.join(memory_dir, "archive")
+    [archive] = os.listdir(archive_dir)
+    archive_path = os.path.join(archive_dir, archive)
+    complete = open(archive_path, 'rb').read()
+
+    # A crash mid-append left half a member behind the recorded size
+    with open(f"{archive_path}.{len(complete)}{memory_retention.APPEND_SUFFIX}", 'wb') as f:
+        f.write(complete)
+    with open(archive_path, 'ab') as f:
+        f.write(complete[:len(complete) // 2])
+
+    with memory._write_connection() as conn:
+        assert memory_retention.settle_archives(conn.cursor(), archive_dir) == [archive_path]
+    assert os.listdir(archive_dir) == [archive]
+    assert read_archives(memory_dir) == sorted(fix_ids * 2)
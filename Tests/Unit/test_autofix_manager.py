@@ -0,0 +1,97 @@
+"""AutoFixManager batch fixing against the Ollama stub."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from ai_memory import AIMemory
+from conftest import AUTOFIXERS, fix, issue
+from ollama_stub import OllamaStub
+
+QWEN = "qwen2.5-coder:7b"
+
+
+@pytest.fixture
+def manager(memory_dir, tmp_path, monkeypatch):
+    stub = OllamaStub(models={QWEN: json.dumps(fix(commands=["true"]))}, chunk_delay=0.002).start()
+    monkeypatch.setenv("OLLAMA_HOST", stub.url)
+    monkeypatch.setenv("OLLAMA_INVENTORY_FILE", str(tmp_path / "inventory.json"))
+    monkeypatch.setenv("AI_FIX_CACHE_TTL", "0")
+
+    import autofix_manager
+    import model_inventory
+    import ollama_client
+    # Process-wide clients and inventories are keyed to the previous host
+    monkeypatch.setattr(ollama_client, "_clients", {})
+    monkeypatch.setattr(model_inventory, "_inventories", {})
+    memory = AIMemory(memory_dir, use_service=False)
+    monkeypatch.setattr(autofix_manager, "get_memory", lambda *args, **kwargs: memory)
+    yield autofix_manager.AutoFixManager("qwen")
+    memory.close()
+    stub.stop()
+
+
+def test_fix_many_keeps_usage_per_issue(manager):
+    from qwen_autofix import ANALYSIS_INSTRUCTIONS
+
+    issues = [issue(model=f"model{i}:latest", description="word " * (40 * i + 1)) for i in range(8)]
+    expected = [manager.fixer.prompt_builder.build(item, manager.memory.build_context_for_ai(item),
+                                                   ANALYSIS_INSTRUCTIONS)[1] for item in issues]
+
+    results = sorted(manager.fix_many(issues, concurrency=4), key=lambda result: result['index'])
+
+    assert [result['index'] for result in results] == list(range(len(issues)))
+    assert [result['error'] for result in results] == [None] * len(issues)
+    assert [result['prompt_usage'] for result in results] == expected
+    # Fixes apply, but the stub does not serve the broken models, so verification fails
+    assert {result['status'] for result in results} == {'verify_failed'}
+    assert len(manager.memory.get_recent_fixes()) == len(issues)
+
+
+def scripted_analyses(manager, monkeypatch, delays, commands):
+    """Analyses that take the given seconds and propose the given commands, with verification passing."""
+    def analysis(issue_data, use_cache=True):
+        index = int(issue_data['description'])
+        time.sleep(delays[index])
+        return {'fix_data': fix(commands=commands[index]), 'cache_hit': False, 'race': None,
+                'prompt_usage': None, 'call': None}
+
+    monkeypatch.setattr(manager, "_analysis", analysis)
+    monkeypatch.setattr(manager, "verify_fix", lambda issue_data, fix_data: True)
+    return [issue(description=str(index)) for index in range(len(delays))]
+
+
+def test_fix_many_streams_in_completion_order(manager, monkeypatch):
+    issues = scripted_analyses(manager, monkeypatch, [1.0, 0.0], [["true"], ["true"]])
+    started = time.monotonic()
+    results = manager.fix_many(issues, concurrency=2)
+
+    first = next(results)
+    assert (first['index'], first['status']) == (1, "fixed")
+    assert time.monotonic() - started < 1.0
+    assert [result['index'] for result in results] == [0]
+
+
+def test_fix_many_holds_global_commands_until_analyses_are_in(manager, monkeypatch, tmp_path):
+    marker = tmp_path / "restarted"
+    issues = scripted_analyses(manager, monkeypatch, [0.0, 0.5], [[f"touch {marker}"], ["true"]])
+
+    results = manager.fix_many(issues, concurrency=2)
+
+    assert next(results)['index'] == 1
+    assert not marker.exists()
+    assert next(results)['index'] == 0
+    assert marker.exists()
+
+
+def test_fix_batch_rejects_option_without_value(tmp_path):
+    issue_file = tmp_path / "issue.json"
+    issue_file.write_text(json.dumps(issue()))
+    result = subprocess.run([sys.executable, os.path.join(AUTOFIXERS, "autofix_manager.py"), "fix-batch",
+                             str(issue_file), "--concurrency"], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1
+    assert "Usage: autofix_manager.py fix-batch" in result.stdout
@@ -0,0 +1,56 @@
+"""ClaudeClient against the Messages API stub: cache breakpoints and call metrics."""
+
+import json
+
+import pytest
+
+from claude_client import ClaudeClient
+from claude_stub import ClaudeStub
+
+STATIC = "Respond only with the JSON, no other text."
+HISTORY = "=== HISTORY ===\n" + "- restart the ollama service and retry\n" * 150
+
+
+@pytest.fixture
+def stub():
+    stub = ClaudeStub().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def client(stub):
+    client = ClaudeClient("test", base_url=stub.url)
+    yield client
+    client.close()
+
+
+def test_one_breakpoint_closes_the_history(stub, client):
+    client.analyze(STATIC, HISTORY, "issue one")
+    client.analyze(STATIC, HISTORY, "issue two")
+
+    body = json.loads(stub.requests[-1]['body'])
+    assert 'cache_control' not in body['system'][0]
+    assert [block.get('cache_control') for block in body['messages'][0]['content']] == [
+        {'type': 'ephemeral'}, None]
+    assert client.last_call['cache_read_input_tokens'] > 0
+
+
+def test_short_instructions_are_not_marked(stub, client):
+    client.analyze(STATIC, "", "issue one")
+
+    body = json.loads(stub.requests[-1]['body'])
+    assert 'cache_control' not in body['system'][0]
+
+
+def test_failed_call_clears_the_last_call(client, monkeypatch):
+    client.analyze(STATIC, HISTORY, "issue one")
+    assert client.last_call is not None
+
+    def broken(*args, **kwargs):
+        raise ValueError("malformed request")
+
+    monkeypatch.setattr(client.session, "post", broken)
+    with pytest.raises(ValueError):
+        client.analyze(STATIC, HISTORY, "issue two")
+    assert client.last_call is None
@@ -0,0 +1,113 @@
+"""CommandRunner: per-fix ordering, deduplication and scheduling by scope."""
+
+import time
+
+import pytest
+
+import command_runner
+from command_runner import CommandRunner, classify, command_key
+
+
+@pytest.fixture
+def ran(monkeypatch):
+    """Replace run_command with a recorder; commands containing 'fail' fail."""
+    calls = []
+
+    def fake_run(command, timeout=None):
+        calls.append(('start', command))
+        time.sleep(0.05)
+        calls.append(('end', command))
+        status = 'failed' if 'fail' in command else 'ok'
+        return {'command': command, 'status': status, 'exit_code': 0 if status == 'ok' else 1,
+                'stdout': '', 'stderr': '', 'duration_seconds': 0.05}
+
+    monkeypatch.setattr(command_runner, "run_command", fake_run)
+    return calls
+
+
+def started(calls):
+    return [command for event, command in calls if event == 'start']
+
+
+def test_classify():
+    assert classify("ollama pull llama3") == ('model', 'llama3:latest')
+    assert classify("sudo ollama list") == ('read_only', None)
+    assert classify("systemctl restart ollama") == ('global', None)
+    assert classify("ollama pull llama3 && echo ok") == ('global', None)
+    assert command_key("ollama  pull llama3") == command_key("ollama pull llama3:latest")
+
+
+def test_single_fix_runs_in_order(ran):
+    commands = ['ollama pull llama3:8b', 'ollama create mymodel -f Modelfile', 'ollama run mymodel hi']
+    outcome = CommandRunner().run([commands])[0]
+    assert outcome['success']
+    assert started(ran) == commands
+    # Each command starts only after the previous one ended
+    assert ran == [(event, command) for command in commands for event in ('start', 'end')]
+
+
+def test_failure_skips_rest_of_fix(ran):
+    outcome = CommandRunner().run([['echo one', 'ollama pull fail', 'ollama rm llama3']])[0]
+    assert not outcome['success']
+    assert started(ran) == ['echo one', 'ollama pull fail']
+    assert [result['status'] for result in outcome['results']] == ['ok', 'failed', 'skipped']
+
+
+def test_shared_command_runs_once(ran):
+    outcomes = CommandRunner().run([['ollama pull llama3', 'echo a'], ['ollama pull llama3:latest', 'echo b']])
+    assert all(outcome['success'] for outcome in outcomes)
+    assert started(ran).count('ollama pull llama3') + started(ran).count('ollama pull llama3:latest') == 1
+    assert outcomes[0]['results'][0]['shared_by'] == 2
+
+
+def test_command_after_a_state_change_runs_again(ran):
+    outcomes = CommandRunner().run([['ollama pull llama3'], ['systemctl restart ollama', 'ollama pull llama3']])
+    assert all(outcome['success'] for outcome in outcomes)
+    assert started(ran).count('ollama pull llama3') == 2
+    # The second pull comes after its own fix's restart
+    restart = ran.index(('end', 'systemctl restart ollama'))
+    assert ('start', 'ollama pull llama3') in ran[restart:]
+    assert outcomes[1]['results'][1] is not outcomes[0]['results'][0]
+
+
+def test_read_only_steps_do_not_break_sharing(ran):
+    outcomes = CommandRunner().run([['ollama list', 'ollama pull llama3'], ['ollama pull llama3']])
+    assert started(ran).count('ollama pull llama3') == 1
+    assert outcomes[1]['results'][0] is outcomes[0]['results'][1]
+
+
+def test_later_run_reuses_earlier_results(ran):
+    runner = CommandRunner()
+    first = runner.run([['ollama pull llama3', 'echo a']])[0]
+    second = runner.run([['ollama pull llama3:latest', 'echo b']])[0]
+    assert started(ran) == ['ollama pull llama3', 'echo a', 'echo b']
+    assert second['results'][0] is first['results'][0]
+    assert first['results'][0]['shared_by'] == 2
+
+
+def test_skipped_command_still_runs_for_other_fix(ran):
+    outcomes = CommandRunner().run([['fail first', 'echo shared'], ['echo shared']])
+    assert not outcomes[0]['success'] and outcomes[1]['success']
+    assert 'echo shared' in started(ran)
+
+
+def test_fixes_run_in_parallel(ran):
+    CommandRunner().run([['ollama pull a'], ['ollama pull b']])
+    assert [event for event, _ in ran] == ['start', 'start', 'end', 'end']
+
+
+def test_global_command_runs_alone(ran):
+    CommandRunner().run([['ollama pull a', 'ollama pull c'], ['systemctl restart ollama'], ['ollama pull b']])
+    restart = ran.index(('start', 'systemctl restart ollama'))
+    assert ran[restart + 1] == ('end', 'systemctl restart ollama')
+
+
+def test_same_model_never_overlaps(ran):
+    CommandRunner().run([['ollama pull llama3'], ['ollama rm llama3']])
+    assert [event for event, _ in ran] == ['start', 'end', 'start', 'end']
+
+
+def test_timeout_kills_process_group():
+    result = command_runner.run_command("sleep 30 & sleep 30", timeout=0.5)
+    assert result['status'] == 'timeout'
+    assert result['duration_seconds'] < 10
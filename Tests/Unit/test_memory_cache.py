@@ -0,0 +1,54 @@
+"""Analysis cache: hits across iterations, invalidation and expiry."""
+
+import time
+
+from conftest import fix, issue
+
+
+def cache(memory, item, response, ttl=60):
+    key = memory.analysis_cache_key("qwen", "qwen2.5-coder:7b", item)
+    memory.cache_analysis(key, "qwen", "qwen2.5-coder:7b", item, response, ttl)
+    return key
+
+
+def test_hit_after_attempt_is_recorded(memory):
+    item, response = issue(), fix()
+    cache(memory, item, response)
+    # The next iteration records an attempt for another issue before retrying this one
+    memory.record_fix_attempt(issue(model="mistral:7b"), fix(), False, False, 1.0)
+
+    key = memory.analysis_cache_key("qwen", "qwen2.5-coder:7b", item)
+    assert memory.get_cached_analysis(key) == response
+    stats = memory.get_analysis_cache_stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 0, 1.0)
+
+
+def test_key_depends_on_fixer_model_and_issue(memory):
+    item = issue()
+    key = memory.analysis_cache_key("qwen", "qwen2.5-coder:7b", item)
+    assert key != memory.analysis_cache_key("deepseek", "qwen2.5-coder:7b", item)
+    assert key != memory.analysis_cache_key("qwen", "qwen2.5-coder:32b", item)
+    assert key != memory.analysis_cache_key("qwen", "qwen2.5-coder:7b", issue(error_output="out of memory"))
+
+
+def test_key_ignores_run_specific_output(memory):
+    first = issue(error_output="2026-10-18 12:00:01 pid 4411: context deadline exceeded after 30.2s",
+                  actual_response="request 3fa85f64 timed out")
+    second = issue(error_output="2026-10-19 08:14:55 pid 977: context deadline  exceeded after 31.7s",
+                   actual_response="request 9c01d2e7 timed out")
+    assert (memory.analysis_cache_key("qwen", "qwen2.5-coder:7b", first)
+            == memory.analysis_cache_key("qwen", "qwen2.5-coder:7b", second))
+
+
+def test_failed_fix_is_invalidated(memory):
+    item, response = issue(), fix()
+    key = cache(memory, item, response)
+    assert memory.invalidate_cached_analysis("qwen", "qwen2.5-coder:7b", item, response) == 1
+    assert memory.get_cached_analysis(key) is None
+
+
+def test_entries_expire(memory):
+    key = cache(memory, issue(), fix(), ttl=0.05)
+    time.sleep(0.1)
+    assert memory.get_cached_analysis(key) is None
+    assert memory.get_analysis_cache_stats()['expirations'] == 1
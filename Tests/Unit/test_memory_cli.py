@@ -0,0 +1,86 @@
+"""memory_cli.sh: every subcommand runs against a seeded memory directory."""
+
+import json
+import os
+import subprocess
+
+import pytest
+
+from conftest import SCRIPTS, fix, issue
+
+MEMORY_CLI = os.path.join(SCRIPTS, "memory_cli.sh")
+
+
+@pytest.fixture
+def seeded_dir(memory, memory_dir):
+    memory.record_fix_attempt(issue(description="Ollama server refused the connection"),
+                              fix(analysis="Restart the ollama service"), True, True, 1.5)
+    memory.record_fix_attempt(issue(model="mistral:7b", issue_type="NO_OUTPUT"), fix(), False, False, 0.5)
+    memory.close()
+    return memory_dir
+
+
+def run_cli(*args):
+    return subprocess.run(["bash", MEMORY_CLI, *args], capture_output=True, text=True, timeout=60)
+
+
+@pytest.mark.parametrize("args", [
+    ["stats"],
+    ["model", "llama3:8b"],
+    ["recent", "7"],
+    ["successful"],
+    ["patterns"],
+    ["trends"],
+    ["races"],
+    ["commands"],
+    ["verifications"],
+    ["cache"],
+    ["cache", "clear"],
+    ["cleanup", "30", "180"],
+])
+def test_subcommand(seeded_dir, args):
+    result = run_cli(*args, "--memory-dir", seeded_dir)
+    assert result.returncode == 0, result.stderr
+    assert "command not found" not in result.stderr
+
+
+def test_search(seeded_dir):
+    result = run_cli("search", "refused", "--memory-dir", seeded_dir, "--json")
+    assert result.returncode == 0, result.stderr
+    rows = json.loads(result.stdout)
+    assert [row['model_name'] for row in rows] == ["llama3:8b"]
+
+
+def test_search_requires_query(seeded_dir):
+    result = run_cli("search")
+    assert result.returncode == 1
+    assert "Search query required" in result.stderr
+
+
+def test_export(seeded_dir, tmp_path):
+    output = tmp_path / "insights.jsonl"
+    result = run_cli("export", str(output), "--memory-dir", seeded_dir)
+    assert result.returncode == 0, result.stderr
+    assert output.read_text().strip()
+
+
+def test_help():
+    result = run_cli("help")
+    assert result.returncode == 0
+    assert "search <query>" in result.stdout
+
+
+def test_reports_count_pruned_history(memory):
+    """The successful and patterns reports read the aggregates, which keep pruned attempts."""
+    memory.record_fix_attempt(issue(), fix(analysis="Raise the timeout"), True, True, 1.0)
+    memory.record_fix_attempt(issue(), fix(analysis="Raise the timeout"), True, True, 1.0)
+    memory.record_fix_attempt(issue(), fix(analysis="Restart", commands=["ollama stop"]), False, False, 1.0)
+    memory.prune_history(days=-1, success_days=-1, vacuum=False)
+
+    assert memory.get_successful_strategies() == [
+        {'issue_type': "TIMEOUT", 'successful': 2, 'analysis': "Raise the timeout"}]
+    [recurring] = memory.get_recurring_issues()
+    assert (recurring['model_name'], recurring['occurrences']) == ("llama3:8b", 3)
+    assert recurring['success_rate'] == pytest.approx(2 / 3)
+    assert memory.get_model_insights("llama3:8b")['issue_history'] == [
+        {'issue_type': "TIMEOUT", 'attempts': 3, 'successes': 2, 'success_rate': pytest.approx(2 / 3)}]
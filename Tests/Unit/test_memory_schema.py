@@ -0,0 +1,56 @@
+"""Schema migrations and the hot-query plan check."""
+
+import sqlite3
+
+from ai_memory import FULL_SCANS_ALLOWED, HOT_QUERIES
+from memory_schema import LATEST_VERSION, _is_table_scan, check_query_plans, get_schema_version, migrate
+
+
+def test_migrate_fresh_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "ai_memory.db"))
+    migrate(conn)
+    assert get_schema_version(conn) == LATEST_VERSION
+    # Running again is a no-op
+    assert not migrate(conn)
+
+
+def test_is_table_scan():
+    assert _is_table_scan('SCAN fix_history')
+    assert _is_table_scan('SCAN fix_history USING COVERING INDEX idx_fix_history_model_type')
+    assert not _is_table_scan('SEARCH fix_history USING INDEX idx_fix_history_signature (issue_signature=?)')
+    assert not _is_table_scan('SCAN fix_history_fts VIRTUAL TABLE INDEX 0:M4')
+    assert not _is_table_scan('SCAN (subquery-1)')
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "ai_memory.db"))
+    migrate(conn)
+    assert check_query_plans(conn, HOT_QUERIES, FULL_SCANS_ALLOWED) == {}
+
+    queries = dict(HOT_QUERIES, group_all=('SELECT model_name, COUNT(*) FROM fix_history GROUP BY model_name', ()))
+    assert 'group_all' in check_query_plans(conn, queries, FULL_SCANS_ALLOWED)
+
+
+def test_aggregate_backfill_matches_recording(memory):
+    """Migration 7's frozen backfill rebuilds what recording attempts maintains."""
+    from conftest import fix, issue
+    from memory_schema import _backfill_aggregates
+
+    memory.record_fix_attempt(issue(), fix(commands=["ollama pull llama3:8b"]), True, True, 1.0)
+    memory.record_fix_attempt(issue(), fix(commands=["ollama pull llama3:8b"]), True, False, 1.0)
+    memory.record_fix_attempt(issue(issue_type="NO_OUTPUT"), fix(analysis="", commands=[]), False, False, 1.0)
+    memory.record_fix_attempt(issue(model="mistral:7b"), fix(commands=["echo a", "echo b"]), True, True, 1.0)
+    tables = {
+        'issue_patterns': 'SELECT pattern_name, issue_signature, success_count, failure_count, best_fix, '
+                          'last_seen, confidence_score FROM issue_patterns ORDER BY pattern_name',
+        'pattern_fixes': 'SELECT * FROM pattern_fixes ORDER BY issue_signature, fix_key',
+        'model_issue_counts': 'SELECT * FROM model_issue_counts ORDER BY model_name, issue_type',
+        'model_fix_counts': 'SELECT * FROM model_fix_counts ORDER BY model_name, fix_command',
+        'model_characteristics': 'SELECT * FROM model_characteristics ORDER BY model_name',
+    }
+    conn = sqlite3.connect(memory.db_path)
+    recorded = {name: conn.execute(sql).fetchall() for name, sql in tables.items()}
+    _backfill_aggregates(conn.cursor())
+    assert {name: conn.execute(sql).fetchall() for name, sql in tables.items()} == recorded
+    conn.rollback()
+    conn.close()
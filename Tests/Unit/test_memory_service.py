@@ -0,0 +1,80 @@
+"""memory_service.py: group commit and the writes routed through the service."""
+
+import os
+import threading
+import time
+
+from conftest import fix, issue
+
+
+def attempt(**overrides):
+    return dict({
+        'issue_data': issue(),
+        'ai_response': fix(),
+        'fix_success': True,
+        'verification_success': True,
+        'execution_time': 1.0,
+        'notes': None,
+        'fixer_type': "qwen",
+    }, **overrides)
+
+
+def test_group_commit_survives_index_sync_failure(memory, monkeypatch):
+    """Attempts already committed are not inserted again when the index sync fails."""
+    from memory_service import GroupCommitter
+
+    def broken_sync():
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(memory, "_sync_vector_index", broken_sync)
+    committer = GroupCommitter(memory)
+    try:
+        ids = committer.submit([attempt(), attempt(fix_success=False)])
+    finally:
+        committer.stop()
+
+    assert len(ids) == 2
+    assert memory.get_memory_stats()['total_fixes_attempted'] == 2
+
+
+def test_fix_loop_writes_go_through_service(memory_dir, monkeypatch):
+    import memory_service
+    from ai_memory import AIMemory
+    from memory_service import MemoryClient, MemoryService, ServiceUnavailable
+
+    # Signal handlers can only be installed from the main thread
+    monkeypatch.setattr(memory_service.signal, "signal", lambda *args: None)
+    # Unix socket paths are short; keep it out of the deep pytest directory
+    socket_path = f"/tmp/memory-test-{os.getpid()}.sock"
+    service = MemoryService(memory_dir, socket_path)
+    server = threading.Thread(target=service.serve_forever, daemon=True)
+    server.start()
+    client = MemoryClient(socket_path, timeout=10.0)
+    try:
+        for _ in range(100):
+            try:
+                client.call('status')
+                break
+            except ServiceUnavailable:
+                time.sleep(0.05)
+        monkeypatch.setenv("AI_MEMORY_SOCKET", socket_path)
+        with AIMemory(memory_dir) as memory:
+            key = memory.analysis_cache_key("qwen", "qwen2.5:7b", issue())
+            memory.cache_analysis(key, "qwen", "qwen2.5:7b", issue(), fix())
+            assert memory.get_cached_analysis(key) == fix()
+            assert memory.invalidate_cached_analysis("qwen", "qwen2.5:7b", issue(), fix()) == 1
+            memory.record_race(issue(), [{'fixer_type': "qwen", 'outcome': "won", 'latency_seconds': 1.0}])
+            memory.record_command_runs([{'command': "ollama list", 'scope': "global", 'status': "ok",
+                                         'exit_code': 0, 'duration_seconds': 0.1}])
+            memory.record_verification(issue(), {'checks': [{'passed': True}], 'passed': True,
+                                                 'latency_seconds': 0.5})
+
+        status = client.call('status')
+        assert status["requests"] >= 8 and status['errors'] == 0
+        assert [row['races'] for row in service.memory.get_race_stats()] == [1]
+        assert service.memory.get_command_stats()[0]['command'] == "ollama list"
+        assert service.memory.get_verification_stats()
+    finally:
+        client.close()
+        service.shutdown()
+        server.join(timeout=10)
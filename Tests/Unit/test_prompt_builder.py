@@ -0,0 +1,26 @@
+"""Prompt builder: section order per provider and budget resolution."""
+
+from conftest import issue
+from prompt_builder import DEFAULT_TOKEN_BUDGET, TOKEN_BUDGET_ENV, PromptBuilder, resolve_token_budget
+
+INSTRUCTIONS = "Respond only with the JSON, no other text."
+
+
+def test_ollama_prompt_ends_with_the_instructions():
+    prompt, _ = PromptBuilder().build(issue(), "=== HISTORY ===", INSTRUCTIONS)
+    assert prompt.index("=== HISTORY ===") < prompt.index("Current Issue Details:")
+    assert prompt.endswith(INSTRUCTIONS)
+
+
+def test_cacheable_parts_lead_with_the_instructions():
+    parts, _ = PromptBuilder().build_parts(issue(), "=== HISTORY ===", INSTRUCTIONS)
+    assert list(parts) == ['static', 'history', 'issue']
+    assert parts['static'].endswith(INSTRUCTIONS)
+
+
+def test_budget_falls_back_on_a_bad_environment_value(monkeypatch):
+    monkeypatch.setenv(TOKEN_BUDGET_ENV, "lots")
+    assert resolve_token_budget() == DEFAULT_TOKEN_BUDGET
+    monkeypatch.setenv(TOKEN_BUDGET_ENV, "6000")
+    assert resolve_token_budget() == 6000
+    assert resolve_token_budget(2000) == 2000
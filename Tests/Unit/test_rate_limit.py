@@ -0,0 +1,64 @@
+"""Per-provider concurrency and start-rate limits."""
+
+import threading
+import time
+
+import rate_limit
+from ollama_client import CancelToken
+from rate_limit import ProviderLimiter, parse_limits
+
+
+def test_parse_limits():
+    assert parse_limits("claude=4/50, qwen=2,bad,deepseek=x") == {'claude': (4, 50.0), 'qwen': (2, None)}
+    assert parse_limits(None) == {}
+
+
+def test_concurrency_bound():
+    limiter = ProviderLimiter(concurrency=2)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work():
+        with limiter.slot():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+
+def test_starts_are_spaced():
+    limiter = ProviderLimiter(concurrency=4, per_minute=600)
+    started = time.monotonic()
+    for _ in range(3):
+        with limiter.slot():
+            pass
+    assert time.monotonic() - started >= 0.2
+
+
+def test_cancel_stops_waiting():
+    limiter = ProviderLimiter(concurrency=1)
+    cancel = CancelToken()
+    with limiter.slot():
+        threading.Timer(0.1, cancel.cancel).start()
+        started = time.monotonic()
+        with limiter.slot(cancel):
+            pass
+        assert time.monotonic() - started < 1.0
+
+
+def test_environment_overrides_defaults(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    monkeypatch.setenv(rate_limit.LIMITS_ENV, "claude=1")
+    monkeypatch.setenv("OLLAMA_NUM_PARALLEL", "3")
+    assert rate_limit.get_limiter("claude").concurrency == 1
+    assert rate_limit.get_limiter("claude").interval == 60.0 / 50
+    assert rate_limit.get_limiter("qwen").concurrency == 3
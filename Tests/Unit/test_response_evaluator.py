@@ -0,0 +1,85 @@
+"""Streaming response evaluator against the Ollama stub."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import AUTOFIXERS
+from ollama_client import OllamaClient
+from ollama_stub import OllamaStub
+from response_evaluator import ControlStripper, StreamEvaluator, evaluate
+
+LONG_REPLY = "The answer is 4.\n" + "More words follow here.\n" * 200
+
+
+@pytest.fixture
+def stub():
+    stub = OllamaStub(models={
+        'long:latest': LONG_REPLY,
+        'wrong:latest': "five\n",
+        'empty:latest': "",
+        'ansi:latest': "\x1b[32mhello\x1b[0m\r\n\n\x1b[?25lfour 4\n",
+    }, chunk_delay=0.01).start()
+    yield stub
+    stub.stop()
+
+
+def test_control_sequences_split_across_chunks():
+    stripper = ControlStripper()
+    assert stripper.feed("ab\x1b[3") + stripper.feed("2mcd\x1b") + stripper.feed("[0m") + stripper.flush() == "abcd"
+
+
+def test_keeps_first_non_empty_lines():
+    evaluator = StreamEvaluator("z", max_lines=2)
+    assert evaluator.feed("a\n\nb\nc\n")
+    assert evaluator.capped and evaluator.lines == ["a", "b"]
+
+
+def test_end_anchor_waits_for_whole_reply():
+    evaluator = StreamEvaluator("4$")
+    assert not evaluator.feed("4 and more")
+    assert not evaluator.finish()
+
+
+def test_match_stops_generation(stub):
+    result = evaluate('long:latest', 'q', r'.*4.*', OllamaClient(stub.url), timeout=30)
+    assert result['status'] == 'matched' and result['stopped_early']
+    assert result['response'] == "The answer is 4."
+    assert result['seconds'] < 1.0
+
+
+@pytest.mark.parametrize("model, status", [('wrong:latest', 'mismatch'), ('empty:latest', 'no_output'),
+                                           ('missing:latest', 'error')])
+def test_failures(stub, model, status):
+    assert evaluate(model, 'q', r'.*4.*', OllamaClient(stub.url), timeout=30)['status'] == status
+
+
+def test_timeout(stub):
+    result = evaluate('long:latest', 'q', r'never', OllamaClient(stub.url), timeout=0.2, max_lines=1000,
+                      max_bytes=10 ** 6)
+    assert result['status'] == 'timeout'
+
+
+def test_cleans_like_test_sh(stub):
+    result = evaluate('ansi:latest', 'q', r'^hellofour 4$', OllamaClient(stub.url), timeout=30)
+    assert result['status'] == 'matched'
+    assert result['lines'] == ["hello", "four 4"]
+
+
+def test_cli_exit_codes(stub, tmp_path):
+    env = dict(os.environ, OLLAMA_HOST=stub.url)
+    script = os.path.join(AUTOFIXERS, "response_evaluator.py")
+
+    def run(model, pattern):
+        return subprocess.run([sys.executable, script, model, '--prompt', 'q', '--pattern', pattern,
+                               '--output', str(tmp_path / 'out'), '--error-file', str(tmp_path / 'err')],
+                              env=env, capture_output=True, text=True, timeout=60).returncode
+
+    assert run('long:latest', '4') == 0
+    assert (tmp_path / 'out').read_text() == "The answer is 4.\n"
+    assert run('wrong:latest', '4') == 1
+    assert run('empty:latest', '4') == 2
+    assert run('missing:latest', '4') == 3
+    assert (tmp_path / 'err').read_text().strip()